@@ -0,0 +1,386 @@
+"""
+Ad-hoc Aggregation for NYC Taxi Data Explorer
+Whitelisted group-by/measure/filter requests planned onto rollups, columns or trips
+"""
+
+import sqlite3
+import time
+
+import numpy as np
+
+from database import AGGREGATE_MEASURES, DISTANCE_BUCKETS, bucket_case
+
+DISTANCE_LABELS = [label for _, label in DISTANCE_BUCKETS]
+
+# Dimension -> SQL expression over trips t (joined to pickup zone z), value
+# type, and whether an index leads with it (so a filter on it narrows the scan)
+DIMENSIONS = {
+    'hour': ('t.pickup_hour', int, True),
+    'borough': ('z.borough', str, False),
+    'payment': ('t.payment_type_id', int, True),
+    'dow': ('t.pickup_dow', int, True),
+    'distance_bucket': (bucket_case('t.trip_distance', DISTANCE_BUCKETS), str, False)
+}
+
+MEASURE_COLUMNS = {
+    'fare': 'total_amount',
+    'distance': 'trip_distance',
+    'tip': 'tip_amount',
+    'tip_pct': 'tip_percentage',
+    'duration': 'trip_duration_minutes'
+}
+
+# Rollups that can answer a request, smallest first: table -> (FROM clause,
+# {dimension: expression}). A request is covered when every grouped and
+# filtered dimension appears and every measure column is in AGGREGATE_MEASURES.
+ROLLUP_PLANS = [
+    ('agg_overview', 'agg_overview a', {}),
+    ('agg_hourly', 'agg_hourly a', {'hour': 'a.pickup_hour'}),
+    ('agg_borough', 'agg_borough a', {'borough': 'a.borough'}),
+    ('agg_payment', 'agg_payment a', {'payment': 'a.payment_type_id'}),
+    ('agg_day_of_week', 'agg_day_of_week a', {'dow': 'a.day_of_week'}),
+    ('agg_distance', 'agg_distance a', {'distance_bucket': 'a.distance_range'}),
+    ('agg_insights', 'agg_insights a',
+     {'hour': 'a.pickup_hour', 'payment': 'a.payment_type_id',
+      'borough': 'a.borough'}),
+    ('agg_od', 'agg_od a JOIN zones z ON a.pickup_location_id = z.location_id',
+     {'hour': 'a.pickup_hour', 'payment': 'a.payment_type_id',
+      'borough': 'z.borough'})
+]
+
+# Rollups with a row per location pair, hour and payment type; a column store
+# scan is faster than reading them
+LARGE_ROLLUPS = {'agg_od'}
+
+# Single-dimension rollups used to estimate filter selectivity
+SELECTIVITY_ROLLUPS = {table: dims for table, _, dims in ROLLUP_PLANS
+                       if len(dims) == 1 and table != 'agg_od'}
+
+
+class AggregateError(ValueError):
+    """Raised for a request outside the whitelist"""
+
+
+class BudgetExceeded(AggregateError):
+    """Raised when a request would read, or has read, more than its budget"""
+
+
+def _split(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def parse_request(args):
+    """Return (dimensions, measures, filters) from query arguments
+
+    group_by=hour,borough  measures=count,avg_fare,sum_distance
+    filters use the dimension names: borough=Manhattan&payment=1,2
+    """
+    dimensions = _split(args.get('group_by', ''))
+    for dimension in dimensions:
+        if dimension not in DIMENSIONS:
+            raise AggregateError(f"Unknown dimension: {dimension} "
+                                 f"(choose from {', '.join(DIMENSIONS)})")
+    if len(set(dimensions)) != len(dimensions):
+        raise AggregateError("Each dimension can only be grouped once")
+
+    measures = _split(args.get('measures', 'count'))
+    if not measures:
+        raise AggregateError("At least one measure is required")
+    for measure in measures:
+        if measure == 'count':
+            continue
+        function, _, name = measure.partition('_')
+        if function not in ('sum', 'avg') or name not in MEASURE_COLUMNS:
+            raise AggregateError(
+                f"Unknown measure: {measure} (count, or sum_/avg_ followed by "
+                f"{', '.join(MEASURE_COLUMNS)})")
+
+    filters = {}
+    for dimension, (_, kind, _) in DIMENSIONS.items():
+        raw = args.get(dimension)
+        if raw is None:
+            continue
+        try:
+            values = [kind(value) for value in _split(raw)]
+        except ValueError:
+            raise AggregateError(f"Invalid {dimension} filter: {raw}")
+        if dimension == 'distance_bucket':
+            for value in values:
+                if value not in DISTANCE_LABELS:
+                    raise AggregateError(f"Unknown distance bucket: {value}")
+        if values:
+            filters[dimension] = values
+
+    return dimensions, measures, filters
+
+
+def measure_columns(measures):
+    """Distinct trips columns the measures read"""
+    columns = []
+    for measure in measures:
+        if measure != 'count':
+            column = MEASURE_COLUMNS[measure.partition('_')[2]]
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def covering_rollup(conn, dimensions, measures, filters):
+    """(table, FROM clause, dimension expressions) of the smallest covering rollup"""
+    if not set(measure_columns(measures)) <= set(AGGREGATE_MEASURES):
+        return None
+    needed = set(dimensions) | set(filters)
+    existing = {row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'agg_%'")}
+    for table, source, dims in ROLLUP_PLANS:
+        if table in existing and needed <= set(dims):
+            return table, source, dims
+    return None
+
+
+def _grouped_sql(select_dims, count_expr, sum_exprs, source, where, params):
+    """SELECT dims, count, sum/non-null count per column ... GROUP BY dims"""
+    select = [f"{expr} AS {name}" for name, expr in select_dims]
+    select.append(f"{count_expr} AS trip_count")
+    for column, (sum_expr, n_expr) in sum_exprs.items():
+        select.append(f"{sum_expr} AS {column}_sum")
+        select.append(f"{n_expr} AS {column}_n")
+    sql = f"SELECT {', '.join(select)} FROM {source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    if select_dims:
+        sql += " GROUP BY " + ", ".join(str(i) for i in range(1, len(select_dims) + 1))
+    return sql, params
+
+
+def _filter_terms(expressions, filters):
+    """WHERE terms and parameters for dimension filters"""
+    where = []
+    params = []
+    for dimension, values in filters.items():
+        placeholders = ', '.join('?' for _ in values)
+        where.append(f"{expressions[dimension]} IN ({placeholders})")
+        params.extend(values)
+    return where, params
+
+
+def rollup_query(source, expressions, dimensions, measures, filters):
+    """Query summing a rollup's stored sums and counts"""
+    where, params = _filter_terms(expressions, filters)
+    if 'hour' in dimensions and 'hour' in expressions:
+        where.append(f"{expressions['hour']} IS NOT NULL")
+    # Live queries inner-join zones; agg_insights keeps trips without one
+    if 'borough' in dimensions and 'borough' in expressions:
+        where.append(f"{expressions['borough']} IS NOT NULL")
+    sums = {column: (f"SUM({column}_sum)", f"SUM({column}_n)")
+            for column in measure_columns(measures)}
+    return _grouped_sql([(name, expressions[name]) for name in dimensions],
+                        "SUM(trip_count)", sums, source, where, params)
+
+
+def live_query(dimensions, measures, filters):
+    """One parameterized GROUP BY over trips"""
+    expressions = {name: expr for name, (expr, _, _) in DIMENSIONS.items()}
+    where, params = _filter_terms(expressions, filters)
+    if 'hour' in dimensions:
+        where.append("t.pickup_hour IS NOT NULL")
+    sums = {column: (f"SUM(t.{column})", f"COUNT(t.{column})")
+            for column in measure_columns(measures)}
+    source = 'trips t'
+    if 'borough' in dimensions or 'borough' in filters:
+        source += ' JOIN zones z ON t.pickup_location_id = z.location_id'
+    return _grouped_sql([(name, expressions[name]) for name in dimensions],
+                        "COUNT(*)", sums, source, where, params)
+
+
+def estimate_rows(conn, filters):
+    """Estimated trips rows a live query reads
+
+    A filter on an indexed dimension lets SQLite read only the matching
+    rows, so the estimate is the table size times the smallest selectivity
+    among those filters, each taken from its one-dimension rollup.
+    """
+    try:
+        total = conn.execute("SELECT SUM(trip_count) FROM agg_overview").fetchone()[0]
+    except sqlite3.OperationalError:
+        total = None
+    if total is None:
+        total = conn.execute("SELECT COALESCE(MAX(trip_id), 0) FROM trips").fetchone()[0]
+    if not total:
+        return 0
+
+    fraction = 1.0
+    for table, dims in SELECTIVITY_ROLLUPS.items():
+        (dimension, expr), = dims.items()
+        if dimension not in filters or not DIMENSIONS[dimension][2]:
+            continue
+        placeholders = ', '.join('?' for _ in filters[dimension])
+        try:
+            matched = conn.execute(
+                f"SELECT COALESCE(SUM(trip_count), 0) FROM {table} a "
+                f"WHERE {expr} IN ({placeholders})", filters[dimension]).fetchone()[0]
+        except sqlite3.OperationalError:
+            continue
+        fraction = min(fraction, matched / total)
+    return int(total * fraction)
+
+
+def run_with_deadline(conn, sql, params, seconds):
+    """Execute sql, aborting through a progress handler after `seconds`"""
+    deadline = time.perf_counter() + seconds
+    conn.set_progress_handler(lambda: time.perf_counter() > deadline, 10000)
+    try:
+        return conn.execute(sql, params).fetchall()
+    except sqlite3.OperationalError as e:
+        if 'interrupted' in str(e):
+            raise BudgetExceeded(
+                f"Query exceeded the {seconds * 1000:.0f} ms time budget; "
+                f"add filters or group by fewer dimensions")
+        raise
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def aggregate_columns(store, dimensions, measures, filters):
+    """Grouped totals from a ColumnStore, as rows shaped like the SQL results"""
+    location_ids = [location_id for location_id, _, _ in store.zones]
+    boroughs = sorted({borough for _, borough, _ in store.zones},
+                      key=lambda borough: (borough is None, borough or ''))
+    location_borough = np.full(max(location_ids + [0]) + 1, -1, dtype=np.int64)
+    for location_id, borough, _ in store.zones:
+        location_borough[location_id] = boroughs.index(borough)
+    max_payment = max([payment_id for payment_id, _ in store.payment_types] + [0])
+
+    # Dimension -> (columns read, number of codes, values per code)
+    codecs = {
+        'hour': (['pickup_hour'], 24, list(range(24))),
+        'borough': (['pickup_location_id'], len(boroughs), boroughs),
+        'payment': (['payment_type_id'], max_payment + 1, list(range(max_payment + 1))),
+        'dow': (['pickup_dow'], 7, list(range(7))),
+        'distance_bucket': (['trip_distance'], len(DISTANCE_LABELS), DISTANCE_LABELS)
+    }
+
+    def codes(dimension, chunk):
+        if dimension == 'borough':
+            location = np.asarray(chunk['pickup_location_id'], dtype=np.int64)
+            known = (location >= 0) & (location < len(location_borough))
+            code = np.full(len(location), -1, dtype=np.int64)
+            code[known] = location_borough[location[known]]
+            return code
+        if dimension == 'distance_bucket':
+            bounds = np.array([upper for upper, _ in DISTANCE_BUCKETS if upper is not None],
+                              dtype=float)
+            return np.searchsorted(bounds, chunk['trip_distance'], side='left')
+        values = np.asarray(chunk[codecs[dimension][0][0]], dtype=float)
+        return np.where(np.isnan(values), -1, values).astype(np.int64)
+
+    sizes = [codecs[dimension][1] for dimension in dimensions]
+    size = int(np.prod(sizes)) if sizes else 1
+
+    def key(chunk):
+        combined = np.zeros(len(next(iter(chunk.values()))), dtype=np.int64)
+        mask = np.ones(len(combined), dtype=bool)
+        for dimension in dimensions:
+            code = codes(dimension, chunk)
+            mask &= (code >= 0) & (code < codecs[dimension][1])
+            combined = combined * codecs[dimension][1] + np.maximum(code, 0)
+        for dimension, values in filters.items():
+            allowed = [i for i, value in enumerate(codecs[dimension][2])
+                       if value in values]
+            mask &= np.isin(codes(dimension, chunk), allowed)
+        return combined, mask
+
+    key_columns = {column for dimension in set(dimensions) | set(filters)
+                   for column in codecs[dimension][0]}
+    columns = measure_columns(measures)
+    totals = store.group_by(key, size, columns, key_columns=sorted(key_columns)
+                            or ['trip_id'])
+
+    rows = []
+    for group in np.nonzero(totals['trip_count'])[0]:
+        row = {}
+        if dimensions:
+            for dimension, code in zip(dimensions, np.unravel_index(group, sizes)):
+                row[dimension] = codecs[dimension][2][int(code)]
+        row['trip_count'] = int(totals['trip_count'][group])
+        for column in columns:
+            n = int(totals[f"{column}_n"][group])
+            row[f"{column}_sum"] = float(totals[f"{column}_sum"][group]) if n else None
+            row[f"{column}_n"] = n
+        rows.append(row)
+    return rows
+
+
+def shape_rows(rows, dimensions, measures):
+    """Turn grouped sums into the requested measures, ordered by dimension"""
+    result = []
+    for row in rows:
+        if not row['trip_count']:
+            continue
+        shaped = {dimension: row[dimension] for dimension in dimensions}
+        for measure in measures:
+            if measure == 'count':
+                shaped['count'] = int(row['trip_count'])
+                continue
+            function, _, name = measure.partition('_')
+            column = MEASURE_COLUMNS[name]
+            total, n = row[f"{column}_sum"], row[f"{column}_n"]
+            if function == 'sum':
+                shaped[measure] = float(total) if total is not None else None
+            else:
+                shaped[measure] = float(total) / n if n else None
+        result.append(shaped)
+
+    def sort_key(row):
+        key = []
+        for dimension in dimensions:
+            value = row[dimension]
+            if dimension == 'distance_bucket':
+                value = DISTANCE_LABELS.index(value)
+            key.append((value is None, value if value is not None else 0))
+        return key
+
+    return sorted(result, key=sort_key)
+
+
+def run_aggregate(conn, args, max_rows, timeout, store=None):
+    """Plan and answer one /api/aggregate request
+
+    Rollups are used when they cover the request (large ones only without a
+    column store), then the column store when one is given, then a live
+    GROUP BY over trips within the row and time budgets. Returns the
+    response payload.
+    """
+    dimensions, measures, filters = parse_request(args)
+    plan = {'dimensions': dimensions, 'measures': measures, 'filters': filters}
+
+    rollup = covering_rollup(conn, dimensions, measures, filters)
+    if rollup is not None and store is not None and rollup[0] in LARGE_ROLLUPS:
+        rollup = None
+    if rollup is not None and not args.get('live', 0, type=int):
+        table, source, expressions = rollup
+        sql, params = rollup_query(source, expressions, dimensions, measures, filters)
+        rows = [dict(zip(row.keys(), row)) for row in conn.execute(sql, params)]
+        plan['source'] = 'rollup'
+        plan['table'] = table
+    elif store is not None and not args.get('live', 0, type=int):
+        rows = aggregate_columns(store, dimensions, measures, filters)
+        plan['source'] = 'columns'
+    else:
+        estimated = estimate_rows(conn, filters)
+        plan['source'] = 'live'
+        plan['estimated_rows'] = estimated
+        plan['max_rows'] = max_rows
+        if estimated > max_rows:
+            raise BudgetExceeded(
+                f"Request would read about {estimated:,} trips, over the "
+                f"{max_rows:,} row budget; filter on hour, payment or dow, "
+                f"or group by dimensions a rollup covers")
+        sql, params = live_query(dimensions, measures, filters)
+        rows = [dict(zip(row.keys(), row))
+                for row in run_with_deadline(conn, sql, params, timeout)]
+
+    return {
+        'plan': plan,
+        'rows': shape_rows(rows, dimensions, measures)
+    }
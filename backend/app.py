@@ -1,400 +1,743 @@
-from flask import Flask, jsonify, request
+from flask import (Flask, jsonify, request, g, make_response, Response,
+                   has_app_context)
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
 import sqlite3
 import os
+import threading
+import time
 from datetime import datetime
+from aggregate import AggregateError, run_aggregate
+from column_store import open_column_store
+from db_pool import ConnectionPool
+from insights import build_insights, fetch_insight_cube
+from metrics import COUNT_BUCKETS, MetricsRegistry
+from profiling import ProfiledConnection, RequestProfile, SlowQueryLog
+from response_cache import ResponseCache
+from sampling import approx_sections, sample_info, sample_table
+from serialization import columnar, compress, dumps, encodings, is_compressible
+from stats_queries import (DASHBOARD_SECTIONS, SECTION_FETCHERS,
+                           fetch_dashboard_single_pass)
+from ranking import rank_trip_rows, rank_trips
+from od_matrix import (get_od_matrix, fetch_top_routes_live,
+                       fetch_top_routes_rollup)
+from timestamps import uses_epoch_timestamps
+from trip_queries import (build_trip_query, decode_cursor, fetch_trip_page,
+                          fetch_trip_rows, stream_csv, stream_ndjson)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """JSON provider that adds encoding time to the request profile"""
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            profile = g.get('profile') if has_app_context() else None
+            if profile is not None:
+                profile.serialize_seconds += time.perf_counter() - start
+
 
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 CORS(app)
 
-DB_PATH = os.path.join(os.path.dirname(__file__), '..',
-                       'data', 'database', 'taxi_data.db')
+DB_PATH = os.environ.get('TAXI_DB_PATH', os.path.join(
+    os.path.dirname(__file__), '..', 'data', 'database', 'taxi_data.db'))
+
+# Answer /api/stats/* from the rollup tables built by setup.py. Set
+# TAXI_USE_ROLLUPS=0 (or pass ?live=1 on a request) to query trips directly.
+USE_ROLLUPS = os.environ.get('TAXI_USE_ROLLUPS', '1') != '0'
+
+# Read-only connection pool shared by every request
+POOL_SIZE = int(os.environ.get('TAXI_DB_POOL_SIZE', '4'))
+POOL_MMAP_SIZE = int(os.environ.get('TAXI_DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+POOL_CACHE_SIZE = int(os.environ.get('TAXI_DB_CACHE_SIZE', '-65536'))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# /api/dashboard runs its independent section reads concurrently on this many
+# threads, each on its own pooled connection
+QUERY_THREADS = int(os.environ.get('TAXI_QUERY_THREADS', str(POOL_SIZE)))
+
+_query_executor = {'pid': None, 'executor': None}
+_query_executor_lock = threading.Lock()
+
+# Response cache for the read-only endpoints. Entries are dropped whenever
+# setup.py stamps a new dataset version.
+CACHE_ENABLED = os.environ.get('TAXI_CACHE_ENABLED', '1') != '0'
+CACHE_VERSION_CHECK_SECONDS = 1.0
+response_cache = ResponseCache(
+    max_entries=int(os.environ.get('TAXI_CACHE_SIZE', '256')),
+    ttl=float(os.environ.get('TAXI_CACHE_TTL', '3600')))
+
+# Largest page /api/trips returns as JSON; use format=ndjson or format=csv to
+# export more
+MAX_TRIPS_PAGE = int(os.environ.get('TAXI_MAX_TRIPS_PAGE', '10000'))
+STREAM_FORMATS = {
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+    'csv': ('text/csv', stream_csv)
+}
+
+# format=columns on /api/trips and /api/trips/ranked returns
+# {columns: [...], rows: [[...]]} encoded with orjson instead of one object
+# per trip
+COLUMNAR_FORMAT = 'columns'
+
+# gzip/brotli compression of buffered responses of at least this many bytes,
+# negotiated from Accept-Encoding; TAXI_COMPRESSION=0 turns it off
+COMPRESSION_ENABLED = os.environ.get('TAXI_COMPRESSION', '1') != '0'
+COMPRESS_MIN_BYTES = int(os.environ.get('TAXI_COMPRESS_MIN_BYTES', '1024'))
+
+# /api/trips/ranked walks a column index for K up to this size and falls back
+# to a bounded heap scan over the whole table above it
+RANK_INDEX_MAX_K = int(os.environ.get('TAXI_RANK_INDEX_MAX_K', '5000'))
+
+# Budgets for /api/aggregate requests no rollup covers: estimated trips rows
+# read, and wall time before the query is interrupted
+AGGREGATE_MAX_ROWS = int(os.environ.get('TAXI_AGGREGATE_MAX_ROWS', '2000000'))
+AGGREGATE_TIMEOUT = float(os.environ.get('TAXI_AGGREGATE_TIMEOUT', '5'))
+
+# Analytics backend for /api/stats/* and /api/dashboard: 'sqlite' (rollups or
+# trips) or 'columns', the memory-mapped export written by
+# `setup.py --export-columns`. ?live=1 always scans trips in SQLite.
+ANALYTICS_BACKEND = os.environ.get('TAXI_ANALYTICS_BACKEND', 'sqlite')
+COLUMN_STORE_PATH = os.environ.get(
+    'TAXI_COLUMN_STORE',
+    os.path.join(os.path.dirname(__file__), '..', 'data', 'processed', 'columns'))
+
+# Sample rate in percent behind ?approx=true when ?sample is not given
+APPROX_SAMPLE = int(os.environ.get('TAXI_APPROX_SAMPLE', '1'))
+
+_column_store = {'version': None, 'store': None}
+_column_store_lock = threading.Lock()
+
+_dataset_version = {'value': None, 'checked_at': 0.0}
+
+# Per-request timing, SQL profiling and /api/metrics; TAXI_METRICS=0 turns it
+# off. Setting TAXI_SLOW_QUERY_MS logs statements at least that slow with
+# their EXPLAIN QUERY PLAN, to TAXI_SLOW_QUERY_LOG (JSON lines) or stdout.
+METRICS_ENABLED = os.environ.get('TAXI_METRICS', '1') != '0'
+SLOW_QUERY_MS = os.environ.get('TAXI_SLOW_QUERY_MS')
+slow_query_log = (SlowQueryLog(float(SLOW_QUERY_MS),
+                               os.environ.get('TAXI_SLOW_QUERY_LOG'))
+                  if SLOW_QUERY_MS else None)
+
+metrics = MetricsRegistry()
+REQUESTS = metrics.counter(
+    'taxi_http_requests_total', "Requests by route, method and status",
+    ('route', 'method', 'status'))
+REQUEST_SECONDS = metrics.histogram(
+    'taxi_http_request_duration_seconds', "Wall time per request", ('route',))
+SQL_SECONDS = metrics.histogram(
+    'taxi_sql_request_seconds', "SQL execute and fetch time per request",
+    ('route',))
+STATEMENT_SECONDS = metrics.histogram(
+    'taxi_sql_statement_duration_seconds', "Time per SQL statement", ('route',))
+ROWS_RETURNED = metrics.histogram(
+    'taxi_sql_rows_returned', "Rows fetched from SQLite per request",
+    ('route',), COUNT_BUCKETS)
+VM_STEPS = metrics.histogram(
+    'taxi_sql_vm_steps', "SQLite VM instructions per request, a proxy for "
+    "rows scanned", ('route',), COUNT_BUCKETS)
+SERIALIZE_SECONDS = metrics.histogram(
+    'taxi_http_serialization_seconds', "JSON encoding time per request",
+    ('route',))
+SLOW_QUERIES = metrics.counter(
+    'taxi_sql_slow_queries_total', "Statements over TAXI_SLOW_QUERY_MS",
+    ('route',))
+
+
+def get_pool():
+    """Return the shared connection pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(DB_PATH, size=POOL_SIZE,
+                                   mmap_size=POOL_MMAP_SIZE,
+                                   cache_size=POOL_CACHE_SIZE)
+    return _pool
 
 
 def get_db_connection():
-    """Create database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    print(f"Connected to database: {DB_PATH}")
+    """Borrow a pooled database connection for the current request"""
+    conn = get_pool().acquire()
+    profile = g.get('profile')
+    if profile is not None:
+        conn = ProfiledConnection(conn, profile, request_route(), slow_query_log)
+    g.setdefault('db_connections', []).append(conn)
     return conn
 
 
-def dict_from_row(row):
-    """Convert sqlite3.Row to dictionary"""
-    return dict(zip(row.keys(), row))
+def request_route():
+    """URL rule of the current request, used as the metrics label"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+@app.before_request
+def start_request_profile():
+    """Start timing the request and collecting its SQL statements"""
+    if METRICS_ENABLED:
+        g.profile = RequestProfile()
+        g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Record request metrics and report them in a Server-Timing header"""
+    profile = g.get('profile')
+    if profile is None:
+        return response
+
+    route = request_route()
+    total = time.perf_counter() - g.request_started
+    REQUESTS.inc(route, request.method, response.status_code)
+    REQUEST_SECONDS.observe(total, route)
+    SQL_SECONDS.observe(profile.sql_seconds, route)
+    ROWS_RETURNED.observe(profile.rows_returned, route)
+    VM_STEPS.observe(profile.steps, route)
+    SERIALIZE_SECONDS.observe(profile.serialize_seconds, route)
+    for statement in profile.statements:
+        STATEMENT_SECONDS.observe(statement['seconds'], route)
+        if slow_query_log is not None and slow_query_log.is_slow(statement):
+            SLOW_QUERIES.inc(route)
+
+    response.headers['Server-Timing'] = (
+        f"sql;desc=\"{len(profile.statements)} statements\";"
+        f"dur={profile.sql_seconds * 1000:.2f}, "
+        f"serialize;dur={profile.serialize_seconds * 1000:.2f}, "
+        f"compress;dur={profile.compress_seconds * 1000:.2f}, "
+        f"total;dur={total * 1000:.2f}")
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """gzip or brotli encode the body when the client accepts it
+
+    Runs before record_request_metrics, so compression counts towards the
+    request's time. Cached responses keep each encoding they are served in.
+    """
+    if not COMPRESSION_ENABLED:
+        return response
+    encoding = request.accept_encodings.best_match(encodings())
+    if response.status_code == 304:
+        if encoding:
+            weaken_etag(response)
+        return response
+    if not is_compressible(response, COMPRESS_MIN_BYTES):
+        return response
+    response.vary.add('Accept-Encoding')
+    if encoding is None:
+        return response
+
+    start = time.perf_counter()
+    entry = g.get('cache_entry')
+    if entry is not None and encoding in entry.encoded:
+        body = entry.encoded[encoding]
+    else:
+        body = compress(response.get_data(), encoding)
+        if entry is not None:
+            entry.encoded[encoding] = body
+    profile = g.get('profile')
+    if profile is not None:
+        profile.compress_seconds += time.perf_counter() - start
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    weaken_etag(response)
+    return response
+
+
+def weaken_etag(response):
+    """Mark the ETag weak: it names the content, not these encoded bytes"""
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def fast_json_response(payload, status=200):
+    """JSON response encoded with serialization.dumps, timed like jsonify"""
+    start = time.perf_counter()
+    body = dumps(payload)
+    profile = g.get('profile')
+    if profile is not None:
+        profile.serialize_seconds += time.perf_counter() - start
+    return Response(body, status=status, mimetype='application/json')
+
+
+@app.teardown_appcontext
+def release_db_connections(exc):
+    """Return any connection a request did not close (e.g. after an error)"""
+    for conn in g.pop('db_connections', []):
+        conn.close()
+
 
+def get_dataset_version():
+    """Return the dataset version stamp, re-reading it at most once a second"""
+    now = time.monotonic()
+    if now - _dataset_version['checked_at'] < CACHE_VERSION_CHECK_SECONDS:
+        return _dataset_version['value']
+
+    with get_pool().connection() as conn:
+        try:
+            row = conn.execute(
+                "SELECT version FROM dataset_version WHERE id = 1").fetchone()
+            version = row[0] if row else None
+        except sqlite3.OperationalError:
+            version = None
+    if version is None:
+        # Databases built before version stamps: fall back to file mtime
+        version = f"mtime:{os.path.getmtime(DB_PATH)}"
+
+    _dataset_version['value'] = version
+    _dataset_version['checked_at'] = now
+    return version
+
+
+def cached_response(view):
+    """Serve a GET endpoint from the response cache, with ETag support"""
+    # Async views are run to completion here, so the cache sees a response
+    run = app.ensure_sync(view)
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not CACHE_ENABLED:
+            return run(*args, **kwargs)
+
+        try:
+            version = get_dataset_version()
+        except Exception as e:
+            print(f"Response cache bypassed: {str(e)}")
+            return run(*args, **kwargs)
+        key = ResponseCache.make_key(request.path,
+                                     request.args.items(multi=True))
+        entry = response_cache.get(key, version)
+        cache_status = 'HIT'
+
+        if entry is None:
+            response = make_response(run(*args, **kwargs))
+            # Only successful, fully buffered responses are cached
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            entry = response_cache.put(key, version, response.get_data(),
+                                       response.mimetype)
+            cache_status = 'MISS'
+
+        g.cache_entry = entry
+        # Weak comparison, since compressed responses carry a weak ETag
+        if request.if_none_match.contains_weak(entry.etag):
+            response = Response(status=304)
+        else:
+            response = Response(entry.body, mimetype=entry.mimetype)
+        response.set_etag(entry.etag)
+        response.headers['X-Cache'] = cache_status
+        return response
+
+    return wrapper
+
+
+def use_rollups(conn, table='agg_overview'):
+    """Check whether the current request can be served from rollup tables"""
+    if not USE_ROLLUPS or request.args.get('live', 0, type=int):
+        return False
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone()
+    return row is not None
+
+
+def get_column_store():
+    """The column store when it is the configured backend and up to date"""
+    if ANALYTICS_BACKEND != 'columns':
+        return None
+
+    version = get_dataset_version()
+    with _column_store_lock:
+        if _column_store['version'] != version:
+            store = open_column_store(COLUMN_STORE_PATH)
+            if store is None or store.version != version:
+                print(f"Column store at {COLUMN_STORE_PATH} is missing or stale; "
+                      f"using SQLite")
+                store = None
+            _column_store['store'] = store
+            _column_store['version'] = version
+        return _column_store['store']
+
+
+def stats_reads(conn, sections, store=None):
+    """(source, reads, sample info or None) for a stats request
+
+    Each read takes a cursor and returns {section: payload}; reads are
+    independent, so composite endpoints can run them concurrently.
+    ?approx=true answers from a stratified sample (?sample=1 or 10 percent)
+    when one has been built; otherwise the column store, rollups or a live
+    scan of trips give exact results.
+
+    store is get_column_store(), read before conn was borrowed: checking
+    the dataset version can borrow a pooled connection of its own.
+    """
+    if request.args.get('approx', '').lower() in ('1', 'true'):
+        percent = request.args.get('sample', APPROX_SAMPLE, type=int)
+        table = sample_table(percent)
+        info = sample_info(conn.cursor(), table)
+        if info is not None:
+            return 'sample', [
+                functools.partial(approx_sections, table=table, sections=[section])
+                for section in sections], info
+
+    if store is not None and not request.args.get('live', 0, type=int):
+        # One pass over the columns serves every section
+        return 'columns', [lambda cursor: store.dashboard(sections)], None
+
+    rollup = use_rollups(conn)
+    if not rollup and len(sections) > 1:
+        # Per-section live queries would each scan trips; one pass serves all
+        return 'live', [functools.partial(fetch_dashboard_single_pass,
+                                          sections=sections)], None
+    return ('rollup' if rollup else 'live'), [
+        functools.partial(fetch_section, section=section, rollup=rollup)
+        for section in sections], None
+
+
+def fetch_section(cursor, section, rollup):
+    """{section: payload} from the rollups or trips"""
+    return {section: SECTION_FETCHERS[section](cursor, rollup)}
+
+
+def stats_sections(sections):
+    """(source, {section: payload}, sample info or None), read one at a time"""
+    store = get_column_store()
+    conn = get_db_connection()
+    source, reads, sample = stats_reads(conn, sections, store)
+    cursor = conn.cursor()
+    payload = {}
+    for read in reads:
+        payload.update(read(cursor))
+    conn.close()
+    return source, payload, sample
+
+
+def get_query_executor():
+    """Bounded thread pool for concurrent reads, created once per process"""
+    with _query_executor_lock:
+        # A pool inherited across fork has no threads; start a new one
+        if _query_executor['pid'] != os.getpid():
+            _query_executor['executor'] = ThreadPoolExecutor(
+                max_workers=QUERY_THREADS, thread_name_prefix='taxi-query')
+            _query_executor['pid'] = os.getpid()
+        return _query_executor['executor']
+
+
+async def gather_reads(reads):
+    """Run read(cursor) callables concurrently, each on its own pooled connection
+
+    Results come back in the order of reads; the request waits for the
+    slowest read rather than the sum of all of them.
+    """
+    pool = get_pool()
+    profile = g.get('profile')
+    route = request_route()
+
+    def run(read):
+        conn = pool.acquire()
+        if profile is not None:
+            conn = ProfiledConnection(conn, profile, route, slow_query_log)
+        try:
+            return read(conn.cursor())
+        finally:
+            conn.close()
+
+    loop = asyncio.get_running_loop()
+    executor = get_query_executor()
+    return await asyncio.gather(*(loop.run_in_executor(executor, run, read)
+                                  for read in reads))
+
+
+def stats_response(source, sample, **payload):
+    """JSON body for a stats endpoint, describing the sample behind estimates"""
+    body = {'success': True, 'source': source, **payload}
+    if sample is not None:
+        body['sample'] = sample
+    return jsonify(body)
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request, SQL and serialization metrics in Prometheus text format
+
+    ?format=json returns p50/p90/p99 estimates per route instead.
+    """
+    try:
+        if request.args.get('format') != 'json':
+            return Response(metrics.render(),
+                            mimetype='text/plain; version=0.0.4')
+
+        routes = {}
+        for (route,), (_, _, count) in REQUEST_SECONDS.series().items():
+            routes[route] = {'requests': count}
+            for name, histogram in (('duration', REQUEST_SECONDS),
+                                    ('sql', SQL_SECONDS),
+                                    ('serialization', SERIALIZE_SECONDS)):
+                for q in (0.5, 0.9, 0.99):
+                    value = histogram.quantile(q, route)
+                    routes[route][f"{name}_p{round(q * 100)}_ms"] = (
+                        None if value is None else round(value * 1000, 2))
 
-try:
-    from custom_algorithm import quicksort
-except ImportError:
-    def quicksort(arr, key, reverse=False):
-        """Fallback sort using custom implementation"""
-        comparisons = 0
-        swaps = 0
+        return jsonify({
+            'success': True,
+            'enabled': METRICS_ENABLED,
+            'routes': routes
+        })
+    except Exception as e:
+        print(f"Error in /api/metrics: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        def partition(low, high):
-            nonlocal comparisons, swaps
-            pivot = arr[high][key]
-            i = low - 1
 
-            for j in range(low, high):
-                comparisons += 1
-                if (reverse and arr[j][key] > pivot) or (not reverse and arr[j][key] < pivot):
-                    i += 1
-                    arr[i], arr[j] = arr[j], arr[i]
-                    swaps += 1
+@app.route('/api/metrics/slow-queries', methods=['GET'])
+def get_slow_queries():
+    """Most recent statements over TAXI_SLOW_QUERY_MS, with their plans"""
+    return jsonify({
+        'success': True,
+        'enabled': slow_query_log is not None,
+        'threshold_ms': slow_query_log.threshold_ms if slow_query_log else None,
+        'queries': slow_query_log.recent() if slow_query_log else []
+    })
 
-            arr[i + 1], arr[high] = arr[high], arr[i + 1]
-            swaps += 1
-            return i + 1
 
-        def quicksort_helper(low, high):
-            if low < high:
-                pi = partition(low, high)
-                quicksort_helper(low, pi - 1)
-                quicksort_helper(pi + 1, high)
+@app.route('/api/health', methods=['GET'])
+def get_health():
+    """Report connection pool health and usage counters"""
+    try:
+        pool = get_pool()
+        health = pool.health_check()
 
-        if len(arr) > 0:
-            quicksort_helper(0, len(arr) - 1)
+        return jsonify({
+            'success': health['healthy'],
+            'health': health,
+            'pool': pool.stats()
+        }), 200 if health['healthy'] else 503
+    except Exception as e:
+        print(f"Error in /api/health: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-        return arr, comparisons, swaps
+
+@app.route('/api/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Report response cache hit/miss/eviction counters"""
+    return jsonify({
+        'success': True,
+        'enabled': CACHE_ENABLED,
+        'cache': response_cache.stats()
+    })
 
 
 @app.route('/api/stats', methods=['GET'])
+@cached_response
 def get_stats():
     """Get all overview statistics"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        source, sections, sample = stats_sections(['statistics'])
 
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_trips,
-                SUM(total_amount) as total_revenue,
-                AVG(trip_distance) as avg_distance,
-                AVG(total_amount) as avg_fare,
-                AVG(trip_duration_minutes) as avg_duration,
-                SUM(passenger_count) as total_passengers,
-                AVG(passenger_count) as avg_passengers,
-                AVG(tip_percentage) as avg_tip_percentage
-            FROM trips
-        ''')
-
-        stats = dict_from_row(cursor.fetchone())
-        conn.close()
-
-        return jsonify({
-            'success': True,
-            'statistics': {
-                'total_trips': int(stats['total_trips']),
-                'total_revenue': float(stats['total_revenue'] or 0),
-                'avg_distance': float(stats['avg_distance'] or 0),
-                'avg_fare': float(stats['avg_fare'] or 0),
-                'avg_duration': float(stats['avg_duration'] or 0),
-                'total_passengers': int(stats['total_passengers'] or 0),
-                'avg_passengers': float(stats['avg_passengers'] or 0),
-                'avg_tip_percentage': float(stats['avg_tip_percentage'] or 0)
-            }
-        })
+        return stats_response(source, sample, statistics=sections['statistics'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error in /api/stats: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/api/stats/hourly', methods=['GET'])
+@cached_response
 def get_hourly_stats():
     """Get statistics by hour of day"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        source, sections, sample = stats_sections(['hourly'])
 
-        cursor.execute('''
-            SELECT 
-                pickup_hour,
-                COUNT(*) as trip_count,
-                AVG(total_amount) as avg_fare,
-                AVG(trip_distance) as avg_distance,
-                AVG(trip_duration_minutes) as avg_duration,
-                AVG(tip_percentage) as avg_tip_percentage
-            FROM trips
-            WHERE pickup_hour IS NOT NULL
-            GROUP BY pickup_hour
-            ORDER BY pickup_hour
-        ''')
-
-        hourly_stats = [dict_from_row(row) for row in cursor.fetchall()]
-        conn.close()
-
-        return jsonify({
-            'success': True,
-            'statistics': hourly_stats
-        })
+        return stats_response(source, sample, statistics=sections['hourly'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error in /api/stats/hourly: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/api/stats/borough', methods=['GET'])
+@cached_response
 def get_borough_stats():
     """Get statistics by borough"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        source, sections, sample = stats_sections(['borough'])
 
-        cursor.execute('''
-            SELECT 
-                z.borough,
-                COUNT(*) as trip_count,
-                AVG(t.total_amount) as avg_fare,
-                AVG(t.trip_distance) as avg_distance,
-                AVG(t.trip_duration_minutes) as avg_duration
-            FROM trips t
-            JOIN zones z ON t.pickup_location_id = z.location_id
-            WHERE z.borough IS NOT NULL AND z.borough != 'Unknown'
-            GROUP BY z.borough
-            ORDER BY trip_count DESC
-        ''')
-
-        borough_stats = [dict_from_row(row) for row in cursor.fetchall()]
-        conn.close()
-
-        return jsonify({
-            'success': True,
-            'statistics': borough_stats
-        })
+        return stats_response(source, sample, statistics=sections['borough'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error in /api/stats/borough: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/api/stats/payment', methods=['GET'])
+@cached_response
 def get_payment_stats():
     """Get statistics by payment type"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT 
-                pt.payment_name,
-                COUNT(*) as trip_count,
-                AVG(t.total_amount) as avg_fare
-            FROM trips t
-            JOIN payment_types pt ON t.payment_type_id = pt.payment_type_id
-            GROUP BY pt.payment_name
-            ORDER BY trip_count DESC
-        ''')
-
-        payment_stats = [dict_from_row(row) for row in cursor.fetchall()]
-        conn.close()
+        source, sections, sample = stats_sections(['payment'])
 
-        return jsonify({
-            'success': True,
-            'statistics': payment_stats
-        })
+        return stats_response(source, sample, statistics=sections['payment'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error in /api/stats/payment: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/api/stats/distance-distribution', methods=['GET'])
+@cached_response
 def get_distance_distribution():
     """Get distance distribution"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute('''
-            SELECT 
-                CASE 
-                    WHEN trip_distance <= 2 THEN '0-2 mi'
-                    WHEN trip_distance <= 5 THEN '2-5 mi'
-                    WHEN trip_distance <= 10 THEN '5-10 mi'
-                    WHEN trip_distance <= 20 THEN '10-20 mi'
-                    WHEN trip_distance <= 50 THEN '20-50 mi'
-                    ELSE '50+ mi'
-                END as distance_range,
-                COUNT(*) as trip_count
-            FROM trips
-            GROUP BY distance_range
-            ORDER BY 
-                CASE distance_range
-                    WHEN '0-2 mi' THEN 1
-                    WHEN '2-5 mi' THEN 2
-                    WHEN '5-10 mi' THEN 3
-                    WHEN '10-20 mi' THEN 4
-                    WHEN '20-50 mi' THEN 5
-                    WHEN '50+ mi' THEN 6
-                END
-        ''')
-
-        distribution = [dict_from_row(row) for row in cursor.fetchall()]
-        conn.close()
+        source, sections, sample = stats_sections(['distance_distribution'])
 
-        return jsonify({
-            'success': True,
-            'distribution': distribution
-        })
+        return stats_response(source, sample, distribution=sections['distance_distribution'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error in /api/stats/distance-distribution: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/api/stats/fare-distribution', methods=['GET'])
+@cached_response
 def get_fare_distribution():
     """Get fare distribution"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        source, sections, sample = stats_sections(['fare_distribution'])
 
-        cursor.execute('''
-            SELECT 
-                CASE 
-                    WHEN total_amount <= 10 THEN '$0-10'
-                    WHEN total_amount <= 20 THEN '$10-20'
-                    WHEN total_amount <= 30 THEN '$20-30'
-                    WHEN total_amount <= 50 THEN '$30-50'
-                    WHEN total_amount <= 100 THEN '$50-100'
-                    ELSE '$100+'
-                END as fare_range,
-                COUNT(*) as trip_count
-            FROM trips
-            GROUP BY fare_range
-            ORDER BY 
-                CASE fare_range
-                    WHEN '$0-10' THEN 1
-                    WHEN '$10-20' THEN 2
-                    WHEN '$20-30' THEN 3
-                    WHEN '$30-50' THEN 4
-                    WHEN '$50-100' THEN 5
-                    WHEN '$100+' THEN 6
-                END
-        ''')
-
-        distribution = [dict_from_row(row) for row in cursor.fetchall()]
-        conn.close()
-
-        return jsonify({
-            'success': True,
-            'distribution': distribution
-        })
+        return stats_response(source, sample, distribution=sections['fare_distribution'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error in /api/stats/fare-distribution: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/api/stats/day-of-week', methods=['GET'])
+@cached_response
 def get_day_of_week_stats():
     """Get statistics by day of week"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        source, sections, sample = stats_sections(['day_of_week'])
 
-        cursor.execute('''
-            SELECT 
-                CASE CAST(strftime('%w', pickup_datetime) AS INTEGER)
-                    WHEN 0 THEN 'Sunday'
-                    WHEN 1 THEN 'Monday'
-                    WHEN 2 THEN 'Tuesday'
-                    WHEN 3 THEN 'Wednesday'
-                    WHEN 4 THEN 'Thursday'
-                    WHEN 5 THEN 'Friday'
-                    WHEN 6 THEN 'Saturday'
-                END as pickup_day_of_week,
-                COUNT(*) as trip_count,
-                SUM(total_amount) as total_revenue,
-                AVG(total_amount) as avg_fare
-            FROM trips
-            GROUP BY pickup_day_of_week
-            ORDER BY 
-                CASE pickup_day_of_week
-                    WHEN 'Monday' THEN 1
-                    WHEN 'Tuesday' THEN 2
-                    WHEN 'Wednesday' THEN 3
-                    WHEN 'Thursday' THEN 4
-                    WHEN 'Friday' THEN 5
-                    WHEN 'Saturday' THEN 6
-                    WHEN 'Sunday' THEN 7
-                END
-        ''')
-
-        day_stats = [dict_from_row(row) for row in cursor.fetchall()]
-        conn.close()
-
-        return jsonify({
-            'success': True,
-            'statistics': day_stats
-        })
+        return stats_response(source, sample, statistics=sections['day_of_week'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error in /api/stats/day-of-week: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/api/stats/weekly-trend', methods=['GET'])
+@cached_response
 def get_weekly_trend():
     """Get weekly trend for the month"""
     try:
+        source, sections, sample = stats_sections(['weekly_trend'])
+
+        return stats_response(source, sample, trend=sections['weekly_trend'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in /api/stats/weekly-trend: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/dashboard', methods=['GET'])
+@cached_response
+async def get_dashboard():
+    """Get every dashboard chart in a single response, sections read concurrently"""
+    try:
+        store = get_column_store()
         conn = get_db_connection()
-        cursor = conn.cursor()
+        source, reads, sample = stats_reads(conn, DASHBOARD_SECTIONS, store)
+        conn.close()
 
-        cursor.execute('''
-            SELECT 
-                CASE 
-                    WHEN CAST(strftime('%d', pickup_datetime) AS INTEGER) <= 7 THEN 'Week 1'
-                    WHEN CAST(strftime('%d', pickup_datetime) AS INTEGER) <= 14 THEN 'Week 2'
-                    WHEN CAST(strftime('%d', pickup_datetime) AS INTEGER) <= 21 THEN 'Week 3'
-                    ELSE 'Week 4'
-                END as week,
-                COUNT(*) as trip_count,
-                SUM(total_amount) as total_revenue
-            FROM trips
-            GROUP BY week
-            ORDER BY week
-        ''')
-
-        weekly_trend = [dict_from_row(row) for row in cursor.fetchall()]
+        dashboard = {}
+        for sections in await gather_reads(reads):
+            dashboard.update(sections)
+
+        return stats_response(source, sample, **dashboard)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Error in /api/dashboard: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@app.route('/api/aggregate', methods=['GET'])
+@cached_response
+def get_aggregate():
+    """Group trips by whitelisted dimensions, with filters and measures"""
+    try:
+        # Before borrowing conn: checking the store's version borrows one too
+        store = get_column_store()
+        conn = get_db_connection()
+        result = run_aggregate(conn, request.args, AGGREGATE_MAX_ROWS,
+                               AGGREGATE_TIMEOUT, store)
         conn.close()
 
         return jsonify({
             'success': True,
-            'trend': weekly_trend
+            'source': result['plan']['source'],
+            **result
         })
+    except AggregateError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
-        print(f"Error in /api/stats/weekly-trend: {str(e)}")
+        print(f"Error in /api/aggregate: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
 @app.route('/api/routes/top', methods=['GET'])
+@cached_response
 def get_top_routes():
-    """Get most popular routes"""
+    """Get most popular routes, optionally filtered by borough, hour or payment"""
     try:
         limit = request.args.get('limit', 10, type=int)
+        filters = {
+            'pickup_borough': request.args.get('pickup_borough'),
+            'dropoff_borough': request.args.get('dropoff_borough'),
+            'hour': request.args.get('hour', type=int),
+            'payment_type': request.args.get('payment_type', type=int)
+        }
+        # Read before borrowing the request's connection: a stale version
+        # check borrows one of its own
+        version = get_dataset_version()
 
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute('''
-            SELECT 
-                z1.zone as pickup_zone,
-                z2.zone as dropoff_zone,
-                COUNT(*) as trip_count,
-                AVG(t.total_amount) as avg_fare,
-                AVG(t.trip_distance) as avg_distance
-            FROM trips t
-            JOIN zones z1 ON t.pickup_location_id = z1.location_id
-            JOIN zones z2 ON t.dropoff_location_id = z2.location_id
-            WHERE z1.zone IS NOT NULL AND z2.zone IS NOT NULL 
-              AND z1.zone != 'Unknown' AND z2.zone != 'Unknown'
-            GROUP BY z1.zone, z2.zone
-            ORDER BY trip_count DESC
-            LIMIT ?
-        ''', (limit,))
-
-        routes = [dict_from_row(row) for row in cursor.fetchall()]
+        if not use_rollups(conn, 'agg_od'):
+            source = 'live'
+            routes = fetch_top_routes_live(cursor, limit, **filters)
+        elif filters['hour'] is not None and filters['payment_type'] is not None:
+            # The cubes are by hour or by payment type, not both
+            source = 'rollup'
+            routes = fetch_top_routes_rollup(cursor, limit, **filters)
+        else:
+            source = 'matrix'
+            matrix = get_od_matrix(cursor, version)
+            routes = matrix.top_routes(limit, **filters)
         conn.close()
 
         return jsonify({
             'success': True,
+            'source': source,
             'routes': routes
         })
     except Exception as e:
@@ -403,85 +746,17 @@ def get_top_routes():
 
 
 @app.route('/api/insights', methods=['GET'])
+@cached_response
 def get_insights():
-    """Generate dynamic insights from data"""
+    """Generate dynamic insights from data in one pass over the insights cube"""
     try:
         conn = get_db_connection()
-        cursor = conn.cursor()
-
-        insights = {}
-
-        cursor.execute('''
-            SELECT 
-                pickup_hour,
-                COUNT(*) as trip_count
-            FROM trips
-            WHERE pickup_hour IS NOT NULL
-            GROUP BY pickup_hour
-            ORDER BY trip_count DESC
-            LIMIT 1
-        ''')
-        peak_hour = dict_from_row(cursor.fetchone())
-
-        cursor.execute('''
-            SELECT 
-                pickup_hour,
-                COUNT(*) as trip_count
-            FROM trips
-            WHERE pickup_hour IS NOT NULL
-            GROUP BY pickup_hour
-            ORDER BY trip_count ASC
-            LIMIT 1
-        ''')
-        lowest_hour = dict_from_row(cursor.fetchone())
-
-        ratio = peak_hour['trip_count'] / \
-            lowest_hour['trip_count'] if lowest_hour['trip_count'] > 0 else 0
-        insights['peak_hours'] = {
-            'peak_hour': peak_hour['pickup_hour'],
-            'peak_count': peak_hour['trip_count'],
-            'lowest_hour': lowest_hour['pickup_hour'],
-            'lowest_count': lowest_hour['trip_count'],
-            'ratio': round(ratio, 1)
-        }
-
-        cursor.execute('''
-            SELECT 
-                AVG(CASE WHEN pickup_hour >= 0 AND pickup_hour < 6 
-                    THEN total_amount END) as night_avg,
-                AVG(CASE WHEN pickup_hour >= 6 AND pickup_hour < 18 
-                    THEN total_amount END) as day_avg
-            FROM trips
-            WHERE pickup_hour IS NOT NULL
-        ''')
-        fare_comparison = dict_from_row(cursor.fetchone())
-
-        night_premium = ((fare_comparison['night_avg'] / fare_comparison['day_avg']
-                          ) - 1) * 100 if fare_comparison['day_avg'] > 0 else 0
-        insights['night_fares'] = {
-            'night_avg': round(fare_comparison['night_avg'] or 0, 2),
-            'day_avg': round(fare_comparison['day_avg'] or 0, 2),
-            'premium_percent': round(night_premium, 1)
-        }
-
-        cursor.execute('''
-            SELECT 
-                pt.payment_name,
-                COUNT(*) as trip_count,
-                ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM trips), 1) as percentage
-            FROM trips t
-            JOIN payment_types pt ON t.payment_type_id = pt.payment_type_id
-            GROUP BY pt.payment_name
-            ORDER BY trip_count DESC
-        ''')
-        payment_dist = [dict_from_row(row) for row in cursor.fetchall()]
-        insights['payment_methods'] = payment_dist
-
+        cube = fetch_insight_cube(conn.cursor(), use_rollups(conn, 'agg_insights'))
         conn.close()
 
         return jsonify({
             'success': True,
-            'insights': insights
+            'insights': build_insights(cube)
         })
     except Exception as e:
         print(f"Error in /api/insights: {str(e)}")
@@ -489,118 +764,105 @@ def get_insights():
 
 
 @app.route('/api/trips', methods=['GET'])
+@cached_response
 def get_trips():
-    """Get trips with optional filters"""
+    """Get trips with optional filters, a page at a time or as a stream"""
     try:
-        min_fare = request.args.get('min_fare', type=float)
-        max_fare = request.args.get('max_fare', type=float)
-        pickup_borough = request.args.get('pickup_borough')
-        payment_type = request.args.get('payment_type')
-        limit = request.args.get('limit', 100, type=int)
+        output_format = request.args.get('format', 'json')
+        token = request.args.get('cursor')
+        after = decode_cursor(token) if token else None
 
         conn = get_db_connection()
-        cursor = conn.cursor()
+        epoch = uses_epoch_timestamps(conn)
+
+        if output_format in STREAM_FORMATS:
+            conn.close()
+            return stream_trips(output_format, after, epoch)
 
-        query = '''
-            SELECT 
-                t.*,
-                z1.borough as pickup_borough,
-                z1.zone as pickup_zone,
-                z2.zone as dropoff_zone
-            FROM trips t
-            JOIN zones z1 ON t.pickup_location_id = z1.location_id
-            JOIN zones z2 ON t.dropoff_location_id = z2.location_id
-            WHERE 1=1
-        '''
-
-        params = []
-
-        if min_fare is not None:
-            query += ' AND t.total_amount >= ?'
-            params.append(min_fare)
-
-        if max_fare is not None:
-            query += ' AND t.total_amount <= ?'
-            params.append(max_fare)
-
-        if pickup_borough:
-            query += ' AND z1.borough = ?'
-            params.append(pickup_borough)
-
-        if payment_type:
-            if payment_type.lower() == 'cash':
-                query += ' AND t.payment_type_id = 2'
-            elif payment_type.lower() == 'credit':
-                query += ' AND t.payment_type_id = 1'
-
-        query += ' LIMIT ?'
-        params.append(limit)
-
-        cursor.execute(query, params)
-        trips = [dict_from_row(row) for row in cursor.fetchall()]
+        limit = request.args.get('limit', 100, type=int)
+        limit = max(1, min(limit, MAX_TRIPS_PAGE))
+
+        cursor = conn.cursor()
+        if output_format == COLUMNAR_FORMAT:
+            columns, rows, next_cursor = fetch_trip_rows(
+                cursor, request.args, after, limit, epoch)
+            conn.close()
+            return fast_json_response(columnar(
+                columns, rows, success=True, count=len(rows),
+                next_cursor=next_cursor))
+
+        trips, next_cursor = fetch_trip_page(cursor, request.args, after, limit,
+                                             epoch)
         conn.close()
 
         return jsonify({
             'success': True,
             'trips': trips,
-            'count': len(trips)
+            'count': len(trips),
+            'next_cursor': next_cursor
         })
+    except ValueError as e:
+        # Bad cursor, start or end
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Error in /api/trips: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def stream_trips(output_format, after, epoch=False):
+    """Stream every matching trip as NDJSON or CSV with constant memory"""
+    limit = request.args.get('limit', type=int)
+    query, params = build_trip_query(request.args, after, limit, epoch)
+    mimetype, writer = STREAM_FORMATS[output_format]
+
+    def generate():
+        # The request's teardown runs before the body is sent, so the stream
+        # holds its own pooled connection until the last row is written
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            yield from writer(cursor)
+
+    response = Response(generate(), mimetype=mimetype)
+    if output_format == 'csv':
+        response.headers['Content-Disposition'] = 'attachment; filename=trips.csv'
+    return response
+
+
 @app.route('/api/trips/ranked', methods=['GET'])
+@cached_response
 def get_ranked_trips():
-    """Get trips ranked using custom QuickSort"""
+    """Get the top trips over the whole table, via an index or a bounded heap"""
     try:
         rank_by = request.args.get('rank_by', 'fare')
         order = request.args.get('order', 'desc')
-        limit = request.args.get('limit', 100, type=int)
+        limit = max(request.args.get('limit', 100, type=int), 1)
+        strategy = request.args.get('strategy', 'auto')
 
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        column_map = {
-            'fare': 'total_amount',
-            'distance': 'trip_distance',
-            'duration': 'trip_duration_minutes',
-            'tip': 'tip_percentage'
-        }
-
-        cursor.execute(f'''
-            SELECT 
-                t.*,
-                z1.zone as pickup_zone,
-                z2.zone as dropoff_zone
-            FROM trips t
-            JOIN zones z1 ON t.pickup_location_id = z1.location_id
-            JOIN zones z2 ON t.dropoff_location_id = z2.location_id
-            LIMIT ?
-        ''', (limit * 10,))
-
-        trips = [dict_from_row(row) for row in cursor.fetchall()]
+        start = time.perf_counter()
+        if request.args.get('format') == COLUMNAR_FORMAT:
+            columns, rows, algorithm_stats = rank_trip_rows(
+                cursor, rank_by, order == 'desc', limit, strategy,
+                RANK_INDEX_MAX_K)
+            algorithm_stats['elapsed_ms'] = round(
+                (time.perf_counter() - start) * 1000, 2)
+            conn.close()
+            return fast_json_response(columnar(
+                columns, rows, success=True, algorithm_stats=algorithm_stats))
+
+        ranked_trips, algorithm_stats = rank_trips(
+            cursor, rank_by, order == 'desc', limit, strategy, RANK_INDEX_MAX_K)
+        elapsed = time.perf_counter() - start
         conn.close()
 
-        sort_column = column_map.get(rank_by, 'total_amount')
-        sorted_trips, comparisons, swaps = quicksort(
-            trips, sort_column, order == 'desc')
-
-        sorted_trips = sorted_trips[:limit]
-
-        print(f"Ranking {len(trips)} trips by {rank_by}...")
-        print(f"Sorting completed: {comparisons} comparisons, {swaps} swaps")
-
+        algorithm_stats['elapsed_ms'] = round(elapsed * 1000, 2)
         return jsonify({
             'success': True,
-            'trips': sorted_trips,
-            'algorithm_stats': {
-                'comparisons': comparisons,
-                'swaps': swaps,
-                'algorithm': 'QuickSort',
-                'time_complexity': 'O(n log n)',
-                'space_complexity': 'O(log n)'
-            }
+            'trips': ranked_trips,
+            'algorithm_stats': algorithm_stats
         })
     except Exception as e:
         print(f"Error in /api/trips/ranked: {str(e)}")
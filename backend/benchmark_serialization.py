@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Serialization Benchmark for NYC Taxi Data Explorer
+Compares dict-per-row JSON with column-oriented JSON, raw and compressed, for trip pages
+"""
+
+from serialization import (BROTLI_QUALITY, GZIP_LEVEL, brotli, columnar, compress,
+                           dumps, orjson)
+from trip_queries import fetch_trip_rows
+import app as api
+import argparse
+import sqlite3
+import sys
+import time
+
+from werkzeug.datastructures import MultiDict
+
+
+def cpu_best(call, repeat):
+    """(best CPU seconds, last result) over `repeat` runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.process_time()
+        result = call()
+        elapsed = time.process_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def encode_formats(columns, rows):
+    """Callables building the response body for each format from fetched rows"""
+    def dict_rows():
+        # What /api/trips does by default: a dict per trip through jsonify
+        with api.app.test_request_context():
+            trips = [dict(zip(columns, row)) for row in rows]
+            return api.app.json.response({'success': True, 'trips': trips,
+                                          'count': len(trips)}).get_data()
+
+    def column_rows():
+        return dumps(columnar(columns, rows, success=True, count=len(rows)))
+
+    return [('dict per row', dict_rows), ('columns', column_rows)]
+
+
+def bench_encoding(conn, sizes, repeat):
+    """Encode and compress one trip page per size in each format"""
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    encoder = f"orjson {orjson.__version__}" if orjson else "json (orjson not installed)"
+    levels = f"gzip level {GZIP_LEVEL}"
+    levels += f", brotli quality {BROTLI_QUALITY}" if brotli else ", brotli not installed"
+    print(f"Encoder: {encoder}, {levels}")
+    header = f"{'rows':>7} {'format':<14} {'encode ms':>10} {'raw kB':>9}"
+    for encoding in encodings:
+        header += f" {encoding + ' ms':>9} {encoding + ' kB':>9}"
+    print(header)
+    print("-" * len(header))
+
+    for size in sizes:
+        columns, rows, _ = fetch_trip_rows(conn.cursor(), MultiDict(), None, size)
+        baseline = None
+        for name, build in encode_formats(columns, rows):
+            seconds, body = cpu_best(build, repeat)
+            line = (f"{len(rows):>7} {name:<14} {seconds * 1000:>10.2f} "
+                    f"{len(body) / 1e3:>9.1f}")
+            for encoding in encodings:
+                compress_seconds, packed = cpu_best(
+                    lambda: compress(body, encoding), repeat)
+                line += f" {compress_seconds * 1000:>9.2f} {len(packed) / 1e3:>9.1f}"
+            if baseline is None:
+                baseline = (seconds, len(body))
+            else:
+                line += (f"   {baseline[0] / seconds:.1f}x faster, "
+                         f"{baseline[1] / len(body):.1f}x smaller")
+            print(line)
+
+
+def bench_endpoints(db_path, sizes, repeat):
+    """CPU time and bytes sent per request through the Flask app, cache off"""
+    api.DB_PATH = db_path
+    api._pool = None
+    api.CACHE_ENABLED = False
+    client = api.app.test_client()
+
+    print(f"\n{'request':<58} {'cpu ms':>8} {'sent kB':>9}")
+    print("-" * 77)
+    for size in sizes:
+        for url in (f"/api/trips?limit={size}",
+                    f"/api/trips?limit={size}&format=columns",
+                    f"/api/trips/ranked?limit={size}",
+                    f"/api/trips/ranked?limit={size}&format=columns"):
+            for encoding in ('identity', 'br, gzip'):
+                def call():
+                    response = client.get(url, headers={'Accept-Encoding': encoding})
+                    return response.get_data()
+                seconds, body = cpu_best(call, repeat)
+                label = f"{url} [{encoding}]"
+                print(f"{label:<58} {seconds * 1000:>8.2f} {len(body) / 1e3:>9.1f}")
+    api.get_pool().close_all()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--db', default=api.DB_PATH, help="Database to read trips from")
+    parser.add_argument('--rows', default='100,1000,10000',
+                        help="Comma-separated page sizes (default: 100,1000,10000)")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Runs per measurement; the lowest CPU time is reported")
+    args = parser.parse_args()
+
+    sizes = [min(int(size), api.MAX_TRIPS_PAGE) for size in args.rows.split(',')]
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    bench_encoding(conn, sizes, args.repeat)
+    conn.close()
+    bench_endpoints(args.db, sizes, args.repeat)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Sort Benchmark for NYC Taxi Data Explorer
+Compares QuickSortAlgorithm and IntroSortAlgorithm on adversarial inputs
+"""
+
+from custom_algorithm import QuickSortAlgorithm, IntroSortAlgorithm
+import argparse
+import random
+import sys
+import time
+
+
+def make_inputs(n, seed):
+    """Trip-like rows for each input shape, keyed by 'value'"""
+    rng = random.Random(seed)
+    half = n // 2
+    shapes = {
+        'random': [rng.uniform(0, 100) for _ in range(n)],
+        'sorted': [float(i) for i in range(n)],
+        'reversed': [float(n - i) for i in range(n)],
+        'all_equal': [1.0] * n,
+        # passenger_count-like: a handful of distinct values
+        'few_unique': [float(rng.randint(1, 6)) for _ in range(n)],
+        'organ_pipe': [float(i) for i in range(half)] + [float(i) for i in range(n - half, 0, -1)],
+        'sorted_tail_noise': [float(i) for i in range(n - 10)] + [rng.uniform(0, n) for _ in range(10)]
+    }
+    return {name: [{'value': v} for v in values] for name, values in shapes.items()}
+
+
+def run(sorter, rows):
+    """Return (seconds, comparisons, swaps) or the error name"""
+    start = time.perf_counter()
+    try:
+        _, comparisons, swaps = sorter.sort(rows, 'value')
+    except RecursionError:
+        return 'RecursionError'
+    return time.perf_counter() - start, comparisons, swaps
+
+
+def format_result(result):
+    if isinstance(result, str):
+        return f"{result:>38}"
+    seconds, comparisons, swaps = result
+    return f"{seconds:9.3f}s {comparisons:>14,} {swaps:>12,}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--size', type=int, default=5000,
+                        help="Rows per input (default: 5000)")
+    parser.add_argument('--quicksort-max', type=int, default=20000,
+                        help="Skip the recursive QuickSort above this size; it "
+                             "is quadratic on several shapes (default: 20000)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    quick = QuickSortAlgorithm()
+    intro = IntroSortAlgorithm()
+    run_quick = args.size <= args.quicksort_max
+
+    print(f"Sorting {args.size:,} rows per input")
+    print(f"{'input':<18} {'sorter':<10} {'time':>10} {'comparisons':>14} {'swaps':>12}")
+    print("-" * 68)
+
+    for name, rows in make_inputs(args.size, args.seed).items():
+        quick_result = run(quick, rows) if run_quick else 'skipped'
+        print(f"{name:<18} {'quicksort':<10} {format_result(quick_result)}")
+        print(f"{name:<18} {'introsort':<10} {format_result(run(intro, rows))}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite for NYC Taxi Data Explorer
+Times processing, loading, every API endpoint and QuickSort on synthetic data, with a regression check
+"""
+
+from custom_algorithm import IntroSortAlgorithm, QuickSortAlgorithm
+from data_processor import TaxiDataProcessor
+from database import DatabaseManager
+from synthetic_data import generate_dataset, parse_rows, scale_label
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'benchmark_baseline.json')
+
+# Query strings timed per route; routes not listed are timed once without one
+ENDPOINT_VARIANTS = {
+    '/api/stats': ['', '?live=1', '?approx=true'],
+    '/api/stats/hourly': ['', '?live=1'],
+    '/api/stats/borough': ['', '?live=1'],
+    '/api/stats/payment': ['', '?live=1'],
+    '/api/stats/distance-distribution': ['', '?live=1'],
+    '/api/stats/fare-distribution': ['', '?live=1'],
+    '/api/stats/day-of-week': ['', '?live=1'],
+    '/api/stats/weekly-trend': ['', '?live=1'],
+    '/api/dashboard': ['', '?live=1', '?approx=true&sample=1',
+                       '?approx=true&sample=10'],
+    '/api/aggregate': ['?group_by=hour,payment&measures=count,avg_fare',
+                       '?group_by=borough&hour=8&measures=count,avg_tip_pct&live=1'],
+    '/api/routes/top': ['', '?hour=8&payment_type=1'],
+    '/api/trips': ['', '?min_fare=50', '?pickup_borough=Queens&limit=1000',
+                   '?pickup_borough=Queens&limit=1000&format=columns',
+                   '?format=csv&limit=10000'],
+    '/api/trips/ranked': ['?rank_by=fare', '?rank_by=distance&order=asc&limit=1000',
+                          '?rank_by=distance&order=asc&limit=1000&format=columns']
+}
+
+# Ignored by the regression check: differences below this are noise
+MIN_DELTA_SECONDS = 0.002
+
+
+def timed(results, name, call, *args, **kwargs):
+    """Run call once with its output captured, recording its wall time"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        value = call(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    results[name] = {'seconds': elapsed, 'best': elapsed, 'runs': 1}
+    print(f"  {name:<72} {elapsed * 1000:>10.1f} ms")
+    return value
+
+
+def repeated(results, name, call, repeat):
+    """Median and best of `repeat` runs after one warm-up run"""
+    call()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    results[name] = {'seconds': statistics.median(times), 'best': min(times),
+                     'runs': repeat}
+    print(f"  {name:<72} {results[name]['seconds'] * 1000:>10.1f} ms")
+
+
+def bench_pipeline(results, raw_path, zones_path, cleaned_path, db_path):
+    """TaxiDataProcessor stages, then DatabaseManager loading and rollups"""
+    print("Processing")
+    processor = TaxiDataProcessor(raw_path, zones_path)
+    df = timed(results, 'processor.load_raw_data', processor.load_raw_data)
+    zones = timed(results, 'processor.load_zone_lookup', processor.load_zone_lookup)
+    df = timed(results, 'processor.clean_data', processor.clean_data, df)
+    df = timed(results, 'processor.enrich_data', processor.enrich_data, df, zones)
+    timed(results, 'processor.save_cleaned_data', processor.save_cleaned_data,
+          df, cleaned_path)
+    del df
+
+    print("Database")
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    db = DatabaseManager(db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.connect()
+    timed(results, 'database.create_schema', db.create_schema)
+    timed(results, 'database.load_zones', db.load_zones, zones_path)
+    timed(results, 'database.load_trips', db.load_trips, cleaned_path)
+    timed(results, 'database.populate_dates', db.populate_dates)
+    timed(results, 'database.build_aggregates', db.build_aggregates)
+    timed(results, 'database.build_samples', db.build_samples)
+    with contextlib.redirect_stdout(io.StringIO()):
+        db.stamp_dataset_version()
+        db.close()
+
+
+def endpoint_urls(api):
+    """Every GET /api route of the Flask app with its timed query strings"""
+    urls = []
+    for rule in sorted(api.app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        if not rule.rule.startswith('/api') or 'GET' not in rule.methods:
+            continue
+        for query in ENDPOINT_VARIANTS.get(rule.rule, ['']):
+            urls.append(rule.rule + query)
+    return urls
+
+
+def bench_endpoints(results, db_path, repeat):
+    """Every endpoint through the Flask test client, response cache off"""
+    import app as api
+
+    print("Endpoints")
+    api.DB_PATH = db_path
+    api._pool = None
+    api.CACHE_ENABLED = False
+    client = api.app.test_client()
+
+    for url in endpoint_urls(api):
+        def call():
+            response = client.get(url)
+            response.get_data()
+            if response.status_code != 200:
+                raise RuntimeError(f"{url} returned {response.status_code}: "
+                                   f"{response.get_data(as_text=True)[:200]}")
+        repeated(results, f"endpoint {url}", call, repeat)
+    api.get_pool().close_all()
+
+
+def bench_sort(results, db_path, size, repeat):
+    """QuickSort and IntroSort over trip rows keyed by fare"""
+    print("Sorting")
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(row) for row in conn.execute(
+        "SELECT trip_id, total_amount FROM trips ORDER BY trip_id LIMIT ?", (size,))]
+    conn.close()
+
+    for name, sorter in (('quicksort', QuickSortAlgorithm()),
+                         ('introsort', IntroSortAlgorithm())):
+        repeated(results, f"sort.{name} ({len(rows):,} rows)",
+                 lambda: sorter.sort(rows, 'total_amount'), repeat)
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))
+                              ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """[(name, baseline s, current s, ratio, regressed)] for shared benchmarks
+
+    Best times are compared: the fastest run is the least disturbed by other
+    load on the machine.
+    """
+    rows = []
+    for name, current in results['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        base, now = previous['best'], current['best']
+        ratio = now / base if base > 0 else float('inf')
+        regressed = ratio > 1 + tolerance and now - base > MIN_DELTA_SECONDS
+        rows.append((name, base, now, ratio, regressed))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--rows', type=parse_rows, default='100k',
+                        help="Synthetic trips: 100k, 1m, 10m or a number "
+                             "(default: 100k)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help="Raw file format the processor reads (default: csv)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(),
+                                                          'taxi_benchmark'),
+                        help="Where data and the database are written; raw "
+                             "files are reused across runs")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Timed runs per endpoint and sort; the median is "
+                             "reported (default: 5)")
+    parser.add_argument('--sort-size', type=int, default=20000,
+                        help="Rows sorted by QuickSort and IntroSort (default: 20000)")
+    parser.add_argument('--output', help="Results JSON (default: "
+                                         "<workdir>/results_<rows>.json)")
+    parser.add_argument('--baseline', default=BASELINE_PATH,
+                        help="Baseline results to check against")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Write these results to --baseline instead of "
+                             "checking against it")
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help="Allowed slowdown before a benchmark counts as a "
+                             "regression (default: 0.5 = 50%%)")
+    args = parser.parse_args()
+
+    label = scale_label(args.rows)
+    data_dir = os.path.join(args.workdir, 'synthetic')
+    raw_path = os.path.join(
+        data_dir, f"yellow_tripdata_synthetic_{label}_seed{args.seed}.{args.format}")
+    zones_path = os.path.join(data_dir, 'taxi_zone_lookup.csv')
+    cleaned_path = os.path.join(args.workdir, f"cleaned_{label}.parquet")
+    db_path = os.path.join(args.workdir, f"benchmark_{label}.db")
+
+    if not os.path.exists(raw_path):
+        print(f"Generating {args.rows:,} synthetic trips...")
+        generate_dataset(data_dir, args.rows, args.seed, args.format)
+
+    results = {
+        'meta': {
+            'rows': args.rows,
+            'seed': args.seed,
+            'format': args.format,
+            'repeat': args.repeat,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'results': {}
+    }
+    bench_pipeline(results['results'], raw_path, zones_path, cleaned_path, db_path)
+    bench_endpoints(results['results'], db_path, args.repeat)
+    bench_sort(results['results'], db_path, args.sort_size, args.repeat)
+
+    output = args.output or os.path.join(args.workdir, f"results_{label}.json")
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if (baseline['meta']['rows'], baseline['meta']['format']) != (args.rows, args.format):
+        print(f"Baseline is for {baseline['meta']['rows']:,} {baseline['meta']['format']} "
+              f"rows; not comparable")
+        return 2
+
+    rows = compare(results, baseline, args.tolerance)
+    regressions = [row for row in rows if row[4]]
+    print(f"\n{'benchmark':<72} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    print("-" * 102)
+    for name, base, now, ratio, regressed in rows:
+        flag = '  REGRESSION' if regressed else ''
+        print(f"{name:<72} {base * 1000:>8.1f}ms {now * 1000:>8.1f}ms "
+              f"{ratio:>6.2f}x{flag}")
+    print(f"\n{len(regressions)} regression(s) over {args.tolerance:.0%} "
+          f"against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Timestamp Storage Benchmark for NYC Taxi Data Explorer
+Builds ISO-text and epoch-integer databases from one cleaned file and compares them
+"""
+
+from database import DatabaseManager
+from timestamps import to_storage
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# (name, SQL, bounds bound as parameters); SQL None comes from DERIVED_SQL
+QUERIES = [
+    ('range count (1 day)',
+     "SELECT COUNT(*) FROM trips WHERE pickup_datetime >= ? AND pickup_datetime < ?",
+     ('day_start', 'day_end')),
+    ('range page (1 week, 100 rows)',
+     "SELECT * FROM trips WHERE pickup_datetime >= ? AND pickup_datetime < ? "
+     "ORDER BY pickup_datetime, trip_id LIMIT 100",
+     ('week_start', 'week_end')),
+    ('keyset page (100 rows)',
+     "SELECT * FROM trips WHERE (pickup_datetime, trip_id) > (?, 0) "
+     "ORDER BY pickup_datetime, trip_id LIMIT 100",
+     ('middle',)),
+    ('trip count per day', None, ()),
+    ('avg duration from timestamps', None, ())
+]
+
+# The last two differ by storage: date arithmetic on text vs on integers
+DERIVED_SQL = {
+    'text': {
+        'trip count per day':
+            "SELECT substr(pickup_datetime, 1, 10), COUNT(*) FROM trips GROUP BY 1",
+        'avg duration from timestamps':
+            "SELECT AVG((julianday(dropoff_datetime) - julianday(pickup_datetime)) "
+            "* 1440) FROM trips"
+    },
+    'epoch': {
+        'trip count per day':
+            "SELECT pickup_datetime / 86400, COUNT(*) FROM trips GROUP BY 1",
+        'avg duration from timestamps':
+            "SELECT AVG((dropoff_datetime - pickup_datetime) / 60.0) FROM trips"
+    }
+}
+
+
+def build(db_path, cleaned, zones, epoch):
+    """Load the cleaned file into a fresh database; returns load seconds"""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    start = time.perf_counter()
+    db = DatabaseManager(db_path)
+    db.connect()
+    db.create_schema(epoch_timestamps=epoch)
+    db.load_zones(zones)
+    db.load_trips(cleaned)
+    db.close()
+    elapsed = time.perf_counter() - start
+
+    # VACUUM so both files are measured without free pages
+    conn = sqlite3.connect(db_path)
+    conn.execute("VACUUM")
+    conn.close()
+    return elapsed
+
+
+def bounds(conn):
+    """ISO range endpoints inside the first loaded month"""
+    low = conn.execute("SELECT MIN(pickup_datetime) FROM trips").fetchone()[0]
+    day = low[:8] + '15'
+    return {
+        'day_start': f"{day} 00:00:00",
+        'day_end': f"{day} 23:59:59",
+        'week_start': f"{day} 00:00:00",
+        'week_end': f"{low[:8]}22 00:00:00",
+        'middle': f"{day} 12:00:00"
+    }
+
+
+def time_query(conn, sql, params, repeat):
+    """Best wall time of `repeat` full executions"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_queries(db_path, mode, iso_bounds, repeat):
+    """{query name: seconds} for one database"""
+    conn = sqlite3.connect(db_path)
+    results = {}
+    for name, sql, keys in QUERIES:
+        sql = sql or DERIVED_SQL[mode][name]
+        params = [to_storage(iso_bounds[key], mode == 'epoch') for key in keys]
+        results[name] = time_query(conn, sql, params, repeat)
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('cleaned', help="Cleaned trip file (CSV or Parquet)")
+    parser.add_argument('--zones', required=True, help="Taxi zone lookup CSV")
+    parser.add_argument('--workdir', default=tempfile.gettempdir(),
+                        help="Where the two databases are written")
+    parser.add_argument('--repeat', type=int, default=5,
+                        help="Runs per query; the best time is reported")
+    args = parser.parse_args()
+
+    paths = {mode: os.path.join(args.workdir, f"timestamps_{mode}.db")
+             for mode in ('text', 'epoch')}
+    load_seconds = {mode: build(path, args.cleaned, args.zones, mode == 'epoch')
+                    for mode, path in paths.items()}
+
+    conn = sqlite3.connect(paths['text'])
+    iso_bounds = bounds(conn)
+    conn.close()
+
+    results = {mode: run_queries(path, mode, iso_bounds, args.repeat)
+               for mode, path in paths.items()}
+    sizes = {mode: os.path.getsize(path) for mode, path in paths.items()}
+
+    print()
+    print(f"{'':<36} {'text':>12} {'epoch':>12}")
+    print("-" * 62)
+    print(f"{'database size (MB)':<36} {sizes['text'] / 1e6:>12.1f} "
+          f"{sizes['epoch'] / 1e6:>12.1f}")
+    print(f"{'load time (s)':<36} {load_seconds['text']:>12.2f} "
+          f"{load_seconds['epoch']:>12.2f}")
+    for name, _, _ in QUERIES:
+        print(f"{name + ' (ms)':<36} {results['text'][name] * 1000:>12.2f} "
+              f"{results['epoch'][name] * 1000:>12.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
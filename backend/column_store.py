@@ -0,0 +1,143 @@
+"""
+Column Store for NYC Taxi Data Explorer
+Memory-mapped .npy trips columns queried with vectorized NumPy
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+
+from stats_queries import (DASHBOARD_COLUMNS, DashboardAccumulator,
+                           dashboard_lookups, group_totals)
+
+MANIFEST = 'manifest.json'
+
+# Rows processed per step; bounds the temporaries a query allocates
+CHUNK_ROWS = 1 << 21
+
+FILTER_OPS = {
+    '=': np.equal,
+    '!=': np.not_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal
+}
+
+
+class ColumnStore:
+    """Read-only view of a directory written by DatabaseManager.export_columns
+
+    Columns are opened with np.load(mmap_mode='r'), so data is paged in on
+    demand and every process mapping the same files shares the OS page cache.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            manifest = json.load(f)
+        self.version = manifest['version']
+        self.rows = manifest['rows']
+        self.dtypes = manifest['columns']
+        self.zones = manifest['zones']
+        self.payment_types = manifest['payment_types']
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    def column(self, name):
+        """Memory-mapped array for one exported column"""
+        if name not in self.dtypes:
+            raise KeyError(f"Column not in store: {name}")
+        with self._lock:
+            if name not in self._columns:
+                self._columns[name] = np.load(
+                    os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+            return self._columns[name]
+
+    def chunks(self, columns):
+        """Yield dicts of aligned column slices, CHUNK_ROWS rows at a time"""
+        arrays = {name: self.column(name) for name in columns}
+        for start in range(0, self.rows, CHUNK_ROWS):
+            yield {name: array[start:start + CHUNK_ROWS]
+                   for name, array in arrays.items()}
+
+    @staticmethod
+    def mask(chunk, filters):
+        """Boolean row mask for (column, op, value) filters, or None
+
+        op is one of FILTER_OPS or 'in' with a list of values. NaN (NULL)
+        never matches, as in SQL.
+        """
+        mask = None
+        for column, op, value in filters or []:
+            values = chunk[column]
+            if op == 'in':
+                match = np.isin(values, value)
+            elif op in FILTER_OPS:
+                match = FILTER_OPS[op](values, value)
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+            mask = match if mask is None else mask & match
+        return mask
+
+    def group_by(self, key, size, measures, filters=None, key_columns=()):
+        """Per-group trip counts, sums and non-null counts
+
+        key is a column holding group numbers in [0, size), or a function
+        mapping a chunk to (group numbers, row mask or None) that reads
+        key_columns; rows outside [0, size) are dropped. Returns the
+        group_totals dict.
+        """
+        needed = set(measures) | set(key_columns)
+        needed |= {column for column, _, _ in filters or []}
+        if isinstance(key, str):
+            needed.add(key)
+
+        totals = None
+        for chunk in self.chunks(sorted(needed)):
+            if isinstance(key, str):
+                keys, mask = np.asarray(chunk[key]), None
+            else:
+                keys, mask = key(chunk)
+            keep = (keys >= 0) & (keys < size)
+            for extra in (mask, self.mask(chunk, filters)):
+                if extra is not None:
+                    keep &= extra
+            values = {name: np.asarray(chunk[name], dtype=float)[keep]
+                      for name in measures}
+            totals = group_totals(keys[keep].astype(np.int64), size, values, totals)
+        if totals is None:
+            totals = group_totals(np.zeros(0, dtype=np.int64), size,
+                                  {name: np.zeros(0) for name in measures})
+        return totals
+
+    def histogram(self, column, bounds, filters=None):
+        """Row counts per range; bounds are inclusive upper limits, plus overflow"""
+        bounds = np.asarray(bounds, dtype=float)
+
+        def buckets(chunk):
+            values = np.asarray(chunk[column], dtype=float)
+            return np.searchsorted(bounds, values, side='left'), ~np.isnan(values)
+
+        totals = self.group_by(buckets, len(bounds) + 1, [], filters,
+                               key_columns=[column])
+        return totals['trip_count'].astype(np.int64)
+
+    def dashboard(self, sections=None):
+        """Dashboard sections in the /api/stats/* payload shapes"""
+        lookups = dashboard_lookups(
+            [(location_id, borough) for location_id, borough, _ in self.zones],
+            self.payment_types)
+        accumulator = DashboardAccumulator(lookups, sections)
+        for chunk in self.chunks(DASHBOARD_COLUMNS):
+            accumulator.add(chunk)
+        return accumulator.payload()
+
+
+def open_column_store(path):
+    """ColumnStore for path, or None when nothing has been exported there"""
+    if not os.path.exists(os.path.join(path, MANIFEST)):
+        return None
+    return ColumnStore(path)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Concurrency Check for NYC Taxi Data Explorer
+Sends concurrent requests through the app with a connection pool smaller than the request count
+"""
+
+import app as api
+import argparse
+import sys
+import threading
+import time
+
+# Endpoints that read the dataset version, which borrows a pooled connection
+# of its own whenever the once-a-second check is due; with --columns the
+# stats and aggregate endpoints read it to check the column store
+URLS = [
+    '/api/routes/top',
+    '/api/routes/top?pickup_borough=Manhattan&limit=5',
+    '/api/stats',
+    '/api/stats/hourly',
+    '/api/dashboard',
+    '/api/aggregate?group_by=hour,payment&measures=count,avg_fare'
+]
+
+
+def run_concurrently(url, requests):
+    """Statuses of `requests` simultaneous GETs of url"""
+    statuses = []
+    start = threading.Barrier(requests)
+
+    def fetch():
+        client = api.app.test_client()
+        start.wait()
+        statuses.append(client.get(url).status_code)
+
+    threads = [threading.Thread(target=fetch) for _ in range(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--db', default=api.DB_PATH, help="Database to serve")
+    parser.add_argument('--pool-size', type=int, default=2,
+                        help="Pooled connections (default: 2)")
+    parser.add_argument('--requests', type=int, default=6,
+                        help="Simultaneous requests per endpoint (default: 6)")
+    parser.add_argument('--columns', metavar='DIR',
+                        help="Serve stats from this column store "
+                             "(TAXI_ANALYTICS_BACKEND=columns)")
+    args = parser.parse_args()
+
+    api.DB_PATH = args.db
+    if args.columns:
+        api.ANALYTICS_BACKEND = 'columns'
+        api.COLUMN_STORE_PATH = args.columns
+    api.POOL_SIZE = args.pool_size
+    api._pool = None
+    api.CACHE_ENABLED = False
+    # Every request re-checks the dataset version, as when the check is due
+    api.CACHE_VERSION_CHECK_SECONDS = 0
+
+    print(f"{args.requests} simultaneous requests per endpoint, "
+          f"pool of {args.pool_size}, {api.ANALYTICS_BACKEND} backend")
+    failed = 0
+    for url in URLS:
+        started = time.perf_counter()
+        statuses = run_concurrently(url, args.requests)
+        errors = sum(status != 200 for status in statuses)
+        failed += errors
+        print(f"  {url:<60} {errors} failed  "
+              f"{time.perf_counter() - started:.1f}s")
+    api.get_pool().close_all()
+
+    if failed:
+        print(f"{failed} request(s) failed")
+        return 1
+    print("All requests succeeded")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
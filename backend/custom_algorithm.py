@@ -3,6 +3,8 @@ Custom QuickSort Algorithm Implementation
 No built-in sort functions used - implements QuickSort from scratch
 """
 
+from array import array
+from numbers import Real
 from typing import List, Dict, Any, Tuple
 
 
@@ -89,8 +91,189 @@ class QuickSortAlgorithm:
         return i + 1
 
 
-# Create global instance
+class IntroSortAlgorithm:
+    """
+    Iterative introspective sort with performance tracking
+    Time Complexity: O(n log n) worst case (heapsort fallback)
+    Space Complexity: O(n) for the key and position arrays, O(log n) stack
+
+    Keys are read out of the dictionaries once into a compact array and the
+    sort permutes (key, position) pairs. Each range is split around a
+    median-of-three (ninther for large ranges) pivot into <, == and > parts.
+    The smaller side is handled first so the explicit stack stays O(log n).
+    Small ranges finish with insertion sort, and ranges that recurse too
+    deep switch to heapsort.
+    """
+
+    INSERTION_THRESHOLD = 16
+    NINTHER_THRESHOLD = 128
+
+    def __init__(self):
+        self.comparisons = 0
+        self.swaps = 0
+
+    def sort(self, arr: List[Dict[str, Any]], key: str, reverse: bool = False) -> Tuple[List[Dict[str, Any]], int, int]:
+        """
+        Sort array using introsort
+
+        Args:
+            arr: List of dictionaries to sort
+            key: Key to sort by
+            reverse: True for descending order
+
+        Returns:
+            Tuple of (sorted_array, comparisons_count, swaps_count)
+        """
+        self.comparisons = 0
+        self.swaps = 0
+
+        n = len(arr)
+        if n <= 1:
+            return arr.copy(), 0, 0
+
+        keys = [row[key] for row in arr]
+        numeric = all(isinstance(k, Real) and not isinstance(k, bool) for k in keys)
+        if numeric:
+            # Negating numeric keys gives descending order without a flag
+            keys = array('d', [-k if reverse else k for k in keys])
+        positions = array('q', range(n))
+
+        self._introsort(keys, positions, n)
+
+        result = [arr[i] for i in positions]
+        if reverse and not numeric:
+            result = result[::-1]
+        return result, self.comparisons, self.swaps
+
+    def _swap(self, keys, positions, i: int, j: int):
+        keys[i], keys[j] = keys[j], keys[i]
+        positions[i], positions[j] = positions[j], positions[i]
+        self.swaps += 1
+
+    def _introsort(self, keys, positions, n: int):
+        """Iterative introsort over keys[0:n], smaller partition first"""
+        depth_limit = 2 * n.bit_length()
+        stack = [(0, n - 1, depth_limit)]
+
+        while stack:
+            low, high, depth = stack.pop()
+            while low < high:
+                if high - low < self.INSERTION_THRESHOLD:
+                    self._insertion_sort(keys, positions, low, high)
+                    break
+                if depth == 0:
+                    self._heapsort(keys, positions, low, high)
+                    break
+                depth -= 1
+
+                lt, gt = self._partition3(keys, positions, low, high)
+
+                # Keep the larger side for later, loop on the smaller one
+                if lt - low < high - gt:
+                    stack.append((gt + 1, high, depth))
+                    high = lt - 1
+                else:
+                    stack.append((low, lt - 1, depth))
+                    low = gt + 1
+
+    def _median3(self, keys, a: int, b: int, c: int) -> int:
+        """Index of the median of keys[a], keys[b], keys[c]"""
+        self.comparisons += 1
+        if keys[a] < keys[b]:
+            self.comparisons += 1
+            if keys[b] < keys[c]:
+                return b
+            self.comparisons += 1
+            return c if keys[a] < keys[c] else a
+        self.comparisons += 1
+        if keys[a] < keys[c]:
+            return a
+        self.comparisons += 1
+        return c if keys[b] < keys[c] else b
+
+    def _choose_pivot(self, keys, low: int, high: int) -> int:
+        """Median-of-three, or Tukey's ninther for large ranges"""
+        mid = (low + high) // 2
+        if high - low < self.NINTHER_THRESHOLD:
+            return self._median3(keys, low, mid, high)
+        step = (high - low) // 8
+        return self._median3(
+            keys,
+            self._median3(keys, low, low + step, low + 2 * step),
+            self._median3(keys, mid - step, mid, mid + step),
+            self._median3(keys, high - 2 * step, high - step, high))
+
+    def _partition3(self, keys, positions, low: int, high: int) -> Tuple[int, int]:
+        """
+        Three-way partition around a pivot value
+
+        Returns (lt, gt) with keys[low:lt] < pivot, keys[lt:gt + 1] == pivot
+        and keys[gt + 1:high + 1] > pivot
+        """
+        pivot_index = self._choose_pivot(keys, low, high)
+        pivot_value = keys[pivot_index]
+
+        lt = low
+        i = low
+        gt = high
+        while i <= gt:
+            self.comparisons += 1
+            value = keys[i]
+            if value < pivot_value:
+                if i != lt:
+                    self._swap(keys, positions, lt, i)
+                lt += 1
+                i += 1
+            else:
+                self.comparisons += 1
+                if pivot_value < value:
+                    self._swap(keys, positions, i, gt)
+                    gt -= 1
+                else:
+                    i += 1
+        return lt, gt
+
+    def _insertion_sort(self, keys, positions, low: int, high: int):
+        for i in range(low + 1, high + 1):
+            j = i
+            while j > low:
+                self.comparisons += 1
+                if not keys[j] < keys[j - 1]:
+                    break
+                self._swap(keys, positions, j, j - 1)
+                j -= 1
+
+    def _sift_down(self, keys, positions, low: int, root: int, size: int):
+        # Heap of `size` elements stored at keys[low:low + size]
+        while True:
+            largest = root
+            left = 2 * root + 1
+            right = left + 1
+            if left < size:
+                self.comparisons += 1
+                if keys[low + largest] < keys[low + left]:
+                    largest = left
+            if right < size:
+                self.comparisons += 1
+                if keys[low + largest] < keys[low + right]:
+                    largest = right
+            if largest == root:
+                return
+            self._swap(keys, positions, low + root, low + largest)
+            root = largest
+
+    def _heapsort(self, keys, positions, low: int, high: int):
+        size = high - low + 1
+        for root in range(size // 2 - 1, -1, -1):
+            self._sift_down(keys, positions, low, root, size)
+        for end in range(size - 1, 0, -1):
+            self._swap(keys, positions, low, low + end)
+            self._sift_down(keys, positions, low, 0, end)
+
+
+# Create global instances
 sorter = QuickSortAlgorithm()
+intro_sorter = IntroSortAlgorithm()
 
 
 def quicksort(arr: List[Dict[str, Any]], key: str, reverse: bool = False) -> Tuple[List[Dict[str, Any]], int, int]:
@@ -106,3 +289,118 @@ def quicksort(arr: List[Dict[str, Any]], key: str, reverse: bool = False) -> Tup
         Tuple of (sorted_array, comparisons_count, swaps_count)
     """
     return sorter.sort(arr, key, reverse)
+
+
+def introsort(arr: List[Dict[str, Any]], key: str, reverse: bool = False) -> Tuple[List[Dict[str, Any]], int, int]:
+    """
+    Public function to sort array using the iterative introsort engine
+
+    Args:
+        arr: List of dictionaries to sort
+        key: Dictionary key to sort by
+        reverse: True for descending order, False for ascending
+
+    Returns:
+        Tuple of (sorted_array, comparisons_count, swaps_count)
+    """
+    return intro_sorter.sort(arr, key, reverse)
+
+
+class TopKSelector:
+    """
+    Bounded binary heap that keeps the K best (value, trip_id) pairs
+    Time Complexity: O(n log K), Space Complexity: O(K)
+
+    Batches arrive as typed NumPy arrays. Once the heap is full, a single
+    vectorized comparison against the heap root discards most of a batch,
+    so only real candidates go through the heap.
+    """
+
+    def __init__(self, k: int, reverse: bool = False):
+        self.k = k
+        self.reverse = reverse
+        self.heap = []
+        self.comparisons = 0
+        self.swaps = 0
+
+    def _worse(self, a: Tuple[float, int], b: Tuple[float, int]) -> bool:
+        """True when a ranks below b, so a belongs nearer the heap root"""
+        self.comparisons += 1
+        return a < b if self.reverse else a > b
+
+    def _sift_up(self, i: int):
+        heap = self.heap
+        while i > 0:
+            parent = (i - 1) // 2
+            if not self._worse(heap[i], heap[parent]):
+                break
+            heap[i], heap[parent] = heap[parent], heap[i]
+            self.swaps += 1
+            i = parent
+
+    def _sift_down(self, i: int, size: int):
+        heap = self.heap
+        while True:
+            worst = i
+            left = 2 * i + 1
+            right = left + 1
+            if left < size and self._worse(heap[left], heap[worst]):
+                worst = left
+            if right < size and self._worse(heap[right], heap[worst]):
+                worst = right
+            if worst == i:
+                return
+            heap[i], heap[worst] = heap[worst], heap[i]
+            self.swaps += 1
+            i = worst
+
+    def push(self, item: Tuple[float, int]):
+        """Offer one (value, trip_id) pair"""
+        if self.k <= 0:
+            return
+        if len(self.heap) < self.k:
+            self.heap.append(item)
+            self._sift_up(len(self.heap) - 1)
+        elif self._worse(self.heap[0], item):
+            self.heap[0] = item
+            self._sift_down(0, len(self.heap))
+
+    def push_batch(self, values, trip_ids):
+        """Offer a batch of values with their trip ids (NumPy arrays)"""
+        if len(self.heap) == self.k and self.k > 0:
+            # Ties with the root still need the full (value, trip_id) check
+            threshold = self.heap[0][0]
+            self.comparisons += len(values)
+            keep = values >= threshold if self.reverse else values <= threshold
+            values = values[keep]
+            trip_ids = trip_ids[keep]
+        for value, trip_id in zip(values.tolist(), trip_ids.tolist()):
+            self.push((value, trip_id))
+
+    def result(self) -> List[Tuple[float, int]]:
+        """Drain the heap into best-first order (in-place heapsort)"""
+        heap = self.heap
+        for end in range(len(heap) - 1, 0, -1):
+            heap[0], heap[end] = heap[end], heap[0]
+            self.swaps += 1
+            self._sift_down(0, end)
+        # Each pass moved the current worst item to the end
+        return heap
+
+
+def top_k(batches, k: int, reverse: bool = False) -> Tuple[List[Tuple[float, int]], int, int]:
+    """
+    Select the K best (value, trip_id) pairs from a stream of array batches
+
+    Args:
+        batches: Iterable of (values, trip_ids) NumPy array pairs
+        k: Number of pairs to keep
+        reverse: True to keep the largest values, False for the smallest
+
+    Returns:
+        Tuple of (ranked_pairs, comparisons_count, swaps_count)
+    """
+    selector = TopKSelector(k, reverse)
+    for values, trip_ids in batches:
+        selector.push_batch(values, trip_ids)
+    return selector.result(), selector.comparisons, selector.swaps
@@ -5,8 +5,208 @@ Cleans and validates NYC taxi trip data
 
 import pandas as pd
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import io
 import os
+import shutil
+import time
+
+
+# Storage types for the Parquet intermediate. Money and distance columns stay
+# float64 so values round-trip exactly; Parquet dictionary-encodes strings.
+PARQUET_DTYPES = {
+    'vendor_id': 'Int8',
+    'passenger_count': 'int8',
+    'rate_code_id': 'Int8',
+    'pickup_location_id': 'int16',
+    'dropoff_location_id': 'int16',
+    'payment_type': 'Int8',
+    'pickup_hour': 'int8',
+    'pickup_dow': 'int8',
+    'pickup_dom': 'int8',
+    'week_of_month': 'int8',
+    'date_id': 'int32',
+    'store_and_fwd_flag': 'string',
+    'pickup_borough': 'string',
+    'pickup_zone': 'string',
+    'dropoff_borough': 'string',
+    'dropoff_zone': 'string'
+}
+
+
+# Rows per Parquet row group, and the most rows ParquetSink holds across all
+# pickup dates before it writes out the largest buffer early
+PARQUET_ROW_GROUP_ROWS = 256 * 1024
+PARQUET_MAX_BUFFERED_ROWS = 4 * PARQUET_ROW_GROUP_ROWS
+
+
+def add_calendar_columns(df):
+    """Add pickup_dow (0 = Sunday), pickup_dom, week_of_month and date_id"""
+    pickup = pd.to_datetime(df['pickup_datetime'])
+    df['pickup_dow'] = (pickup.dt.dayofweek + 1) % 7
+    df['pickup_dom'] = pickup.dt.day
+    # Days 22-31 all fall in week 4
+    df['week_of_month'] = ((pickup.dt.day - 1) // 7).clip(upper=3) + 1
+    # YYYYMMDD, the key of the dates table
+    df['date_id'] = (pickup.dt.year * 10000 + pickup.dt.month * 100
+                     + pickup.dt.day)
+    return df
+
+
+def is_parquet_path(path):
+    """True for a .parquet file or a directory holding a Parquet dataset"""
+    path = str(path)
+    return path.endswith('.parquet') or os.path.isdir(path)
+
+
+def quality_log_path(output_path):
+    """Quality log file written next to the cleaned output"""
+    root, ext = os.path.splitext(str(output_path).rstrip(os.sep))
+    return f"{root}_quality_log.txt"
+
+
+def to_parquet_table(df, schema=None):
+    """Convert a cleaned frame to an Arrow table with the storage types"""
+    import pyarrow as pa
+
+    df = df.astype({col: dtype for col, dtype in PARQUET_DTYPES.items()
+                    if col in df.columns})
+    df['pickup_date'] = df['pickup_date'].astype(str)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if schema is not None:
+        table = table.select(schema.names).cast(schema)
+    return table
+
+
+class CsvSink:
+    """Append cleaned chunks to a single CSV file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def write(self, df):
+        df.to_csv(self.path, mode='a', header=self.rows == 0, index=False)
+        self.rows += len(df)
+
+    def close(self, success=True):
+        pass
+
+
+class ParquetSink:
+    """Append cleaned chunks to a Parquet dataset partitioned by pickup date
+
+    Each date keeps one open file for the whole run, and its rows are
+    buffered until they fill a row group, so small chunks still produce one
+    file per date with full-size row groups.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.schema = None
+        self.writers = {}
+        self.buffers = {}
+        self.buffered = {}
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.isdir(self.path):
+            shutil.rmtree(self.path)
+
+    def write(self, df):
+        import pyarrow.compute as pc
+
+        table = to_parquet_table(df, self.schema)
+        if self.schema is None:
+            self.schema = table.schema
+
+        dates = table.column('pickup_date')
+        for date in pc.unique(dates).to_pylist():
+            # The date lives in the directory name, as in a hive dataset
+            part = table.filter(pc.equal(dates, date)).drop_columns('pickup_date')
+            self.buffers.setdefault(date, []).append(part)
+            self.buffered[date] = self.buffered.get(date, 0) + part.num_rows
+            if self.buffered[date] >= PARQUET_ROW_GROUP_ROWS:
+                self._flush(date)
+
+        # Many dates each holding a partial row group: flush the largest
+        while sum(self.buffered.values()) > PARQUET_MAX_BUFFERED_ROWS:
+            self._flush(max(self.buffered, key=self.buffered.get))
+        self.rows += len(df)
+
+    def _flush(self, date):
+        """Write the rows buffered for one date to that date's file"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.concat_tables(self.buffers.pop(date))
+        del self.buffered[date]
+        if date not in self.writers:
+            directory = os.path.join(self.path, f"pickup_date={date}")
+            os.makedirs(directory, exist_ok=True)
+            self.writers[date] = pq.ParquetWriter(
+                os.path.join(directory, 'part-00000.parquet'), table.schema,
+                compression='zstd')
+        self.writers[date].write_table(table, row_group_size=PARQUET_ROW_GROUP_ROWS)
+
+    def close(self, success=True):
+        for date in list(self.buffers):
+            self._flush(date)
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+class SQLiteSink:
+    """Insert cleaned chunks straight into the trips table"""
+
+    def __init__(self, db_manager):
+        self.db = db_manager
+        self.path = db_manager.db_path
+        self.rows = 0
+
+    def open(self):
+        self.db.begin_bulk_load()
+
+    def write(self, df):
+        self.db.insert_trips(df)
+        self.rows += len(df)
+
+    def close(self, success=True):
+        self.db.finish_bulk_load(success)
+
+
+class IncrementalSQLiteSink(SQLiteSink):
+    """Append cleaned chunks to existing trips, skipping duplicates"""
+
+    def __init__(self, db_manager):
+        super().__init__(db_manager)
+        self.inserted = 0
+
+    def open(self):
+        self.db.begin_append()
+
+    def write(self, df):
+        self.db.append_trips(df)
+        self.rows += len(df)
+
+    def close(self, success=True):
+        self.inserted = self.db.finish_append(success)
+
+
+def make_sink(output_path):
+    """Pick a file sink from the output path"""
+    if str(output_path).endswith('.csv'):
+        return CsvSink(output_path)
+    return ParquetSink(output_path)
 
 
 class TaxiDataProcessor:
@@ -16,12 +216,25 @@ class TaxiDataProcessor:
         self.raw_data_path = raw_data_path
         self.zone_lookup_path = zone_lookup_path
         self.quality_log = []
+        self.rows_read = 0
+        # Source path -> {'rows_read', 'rows_kept'} for the ingest manifest
+        self.file_rows = {}
+
+    def count_file_rows(self, path, rows_read, rows_kept):
+        """Add rows read from and kept out of one source file"""
+        counts = self.file_rows.setdefault(path, {'rows_read': 0, 'rows_kept': 0})
+        counts['rows_read'] += rows_read
+        counts['rows_kept'] += rows_kept
 
     def log_quality_issue(self, issue_type, count, description):
-        """Log data quality issues"""
+        """Log data quality issues, adding to any earlier count of the same type"""
+        for log in self.quality_log:
+            if log['issue_type'] == issue_type:
+                log['count'] += int(count)
+                return
         self.quality_log.append({
             'issue_type': issue_type,
-            'count': count,
+            'count': int(count),
             'description': description
         })
 
@@ -46,6 +259,30 @@ class TaxiDataProcessor:
 
         return df
 
+    def iter_raw_chunks(self, chunk_size=100000, start_row=0):
+        """Yield raw trip data chunk by chunk without holding the whole file
+
+        Rows before start_row are skipped, so a file that has grown since it
+        was last ingested can be resumed where the previous load stopped.
+        """
+        if self.raw_data_path.endswith('.parquet'):
+            import pyarrow.parquet as pq
+
+            parquet_file = pq.ParquetFile(self.raw_data_path)
+            skip = start_row
+            for batch in parquet_file.iter_batches(batch_size=chunk_size):
+                if skip >= batch.num_rows:
+                    skip -= batch.num_rows
+                    continue
+                yield batch.slice(skip).to_pandas()
+                skip = 0
+        else:
+            # A callable keeps the header row and costs nothing per skipped
+            # row; pandas turns a range into a set of every skipped index
+            skiprows = (lambda i: 0 < i <= start_row) if start_row else None
+            yield from pd.read_csv(self.raw_data_path, chunksize=chunk_size,
+                                   skiprows=skiprows, low_memory=False)
+
     def load_zone_lookup(self):
         """Load zone lookup data"""
         print(f"Loading zone lookup from {self.zone_lookup_path}...")
@@ -53,9 +290,10 @@ class TaxiDataProcessor:
         print(f"Loaded {len(zones)} zones")
         return zones
 
-    def clean_data(self, df):
+    def clean_data(self, df, verbose=True):
         """Clean and validate trip data"""
-        print("\nCleaning data...")
+        if verbose:
+            print("\nCleaning data...")
         original_count = len(df)
 
         column_mapping = {
@@ -118,19 +356,21 @@ class TaxiDataProcessor:
             self.log_quality_issue('extreme_fare', extreme_fare,
                                    'Fares over $500 removed')
 
-        cleaned_count = len(df)
-        removed_count = original_count - cleaned_count
-        removal_pct = (removed_count / original_count) * 100
+        if verbose:
+            cleaned_count = len(df)
+            removed_count = original_count - cleaned_count
+            removal_pct = (removed_count / original_count) * 100 if original_count else 0
 
-        print(f"Cleaned {original_count:,} -> {cleaned_count:,} records")
-        print(
-            f"Removed {removed_count:,} ({removal_pct:.2f}%) invalid records")
+            print(f"Cleaned {original_count:,} -> {cleaned_count:,} records")
+            print(
+                f"Removed {removed_count:,} ({removal_pct:.2f}%) invalid records")
 
         return df
 
-    def enrich_data(self, df, zones):
+    def enrich_data(self, df, zones, verbose=True):
         """Add derived fields and join with zone data"""
-        print("\nEnriching data...")
+        if verbose:
+            print("\nEnriching data...")
 
         df['trip_duration_minutes'] = (
             (df['dropoff_datetime'] - df['pickup_datetime']).dt.total_seconds() / 60
@@ -150,6 +390,7 @@ class TaxiDataProcessor:
 
         df['pickup_hour'] = df['pickup_datetime'].dt.hour
         df['pickup_date'] = df['pickup_datetime'].dt.date
+        df = add_calendar_columns(df)
 
         zone_cols = ['LocationID', 'Borough', 'Zone']
         zones_clean = zones[zone_cols].copy()
@@ -190,20 +431,35 @@ class TaxiDataProcessor:
             self.log_quality_issue('unknown_zones', removed_unknown_zones,
                                    'Trips with invalid location IDs removed')
 
-        print(f"Added derived fields and zone information")
+        if verbose:
+            print(f"Added derived fields and zone information")
 
         return df
 
+    def save_parquet_dataset(self, df, output_path):
+        """Save cleaned data as a compressed Parquet dataset partitioned by date"""
+        sink = ParquetSink(output_path)
+        sink.open()
+        sink.write(df)
+        sink.close()
+
     def save_cleaned_data(self, df, output_path):
-        """Save cleaned data to CSV"""
+        """Save cleaned data to CSV or a partitioned Parquet dataset"""
         print(f"\nSaving cleaned data to {output_path}...")
 
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        df.to_csv(output_path, index=False)
+        if output_path.endswith('.csv'):
+            df.to_csv(output_path, index=False)
+        else:
+            self.save_parquet_dataset(df, output_path)
         print(f"Saved {len(df):,} records")
 
-        log_path = output_path.replace('.csv', '_quality_log.txt')
+        self.save_quality_log(output_path)
+
+    def save_quality_log(self, output_path):
+        """Write the quality log next to the cleaned output"""
+        log_path = quality_log_path(output_path)
         with open(log_path, 'w') as f:
             f.write("DATA QUALITY LOG\n")
             f.write("=" * 80 + "\n\n")
@@ -212,22 +468,236 @@ class TaxiDataProcessor:
                 f.write(f"  {log['description']}\n\n")
         print(f"Quality log saved to {log_path}")
 
-    def process_all(self, output_path):
+    def process_streaming(self, sink, chunk_size=100000, start_row=0):
+        """Clean, enrich and emit one chunk at a time with bounded memory"""
+        zones = self.load_zone_lookup()
+        self.rows_read = 0
+
+        print(f"Streaming {self.raw_data_path} in chunks of {chunk_size:,} rows...")
+        sink.open()
+        try:
+            for chunk in self.iter_raw_chunks(chunk_size, start_row):
+                self.rows_read += len(chunk)
+                df = self.clean_data(chunk, verbose=False)
+                df = self.enrich_data(df, zones, verbose=False)
+                sink.write(df)
+                print(f"  Processed {self.rows_read:,} rows, kept {sink.rows:,}...",
+                      end='\r')
+        except Exception:
+            sink.close(success=False)
+            raise
+        sink.close()
+        self.count_file_rows(self.raw_data_path, self.rows_read, sink.rows)
+
+        removed = self.rows_read - sink.rows
+        removal_pct = (removed / self.rows_read) * 100 if self.rows_read else 0
+        print(f"\nCleaned {self.rows_read:,} -> {sink.rows:,} records")
+        print(f"Removed {removed:,} ({removal_pct:.2f}%) invalid records")
+
+        self.save_quality_log(sink.path)
+        return sink.rows
+
+    def process_all(self, output_path, streaming=False, chunk_size=100000,
+                    sink=None, start_row=0):
         """Run complete data processing pipeline"""
         print("\n" + "=" * 80)
         print("DATA PROCESSING PIPELINE")
         print("=" * 80)
 
+        if streaming or sink is not None or start_row:
+            rows = self.process_streaming(sink or make_sink(output_path),
+                                          chunk_size, start_row)
+
+            print("\n" + "=" * 80)
+            print("DATA PROCESSING COMPLETE")
+            print("=" * 80)
+
+            return rows
+
         df = self.load_raw_data()
         zones = self.load_zone_lookup()
+        self.rows_read = len(df)
 
         df = self.clean_data(df)
         df = self.enrich_data(df, zones)
 
         self.save_cleaned_data(df, output_path)
+        self.count_file_rows(self.raw_data_path, self.rows_read, len(df))
 
         print("\n" + "=" * 80)
         print("DATA PROCESSING COMPLETE")
         print("=" * 80)
 
         return df
+
+
+# Zone lookup loaded once per worker process by _init_worker
+_worker_processor = None
+_worker_zones = None
+
+
+def _init_worker(zone_lookup_path):
+    """Load the zone lookup once in each worker process"""
+    global _worker_processor, _worker_zones
+    _worker_processor = TaxiDataProcessor(None, zone_lookup_path)
+    _worker_zones = pd.read_csv(zone_lookup_path)
+
+
+def csv_byte_ranges(path, chunk_size):
+    """Split a CSV file into (start, end) byte ranges of about chunk_size rows
+
+    Ranges begin after the header and end on a line break, so each one
+    parses on its own. Only the first megabyte is read, to estimate the row
+    width, plus one line per boundary. Fields must not contain line breaks,
+    which holds for the TLC trip files.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        sample = f.read(1 << 20)
+        step = max(int(len(sample) / max(sample.count(b'\n'), 1) * chunk_size), 1)
+        while start < size:
+            f.seek(min(start + step, size))
+            f.readline()
+            end = f.tell()
+            yield start, end
+            start = end
+
+
+def read_work_unit(unit):
+    """Raw rows of one (path, start, end) unit: a CSV byte range or a range
+    of Parquet row groups"""
+    path, start, end = unit
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+
+        return pq.ParquetFile(path).read_row_groups(range(start, end)).to_pandas()
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        body = f.read(end - start)
+    return pd.read_csv(io.BytesIO(header + body), low_memory=False)
+
+
+def _clean_chunk(unit):
+    """Read, clean and enrich one work unit; runs inside a worker process"""
+    start = time.perf_counter()
+    chunk = read_work_unit(unit)
+    _worker_processor.quality_log = []
+    df = _worker_processor.clean_data(chunk, verbose=False)
+    df = _worker_processor.enrich_data(df, _worker_zones, verbose=False)
+    return {
+        'data': df,
+        'quality_log': _worker_processor.quality_log,
+        'path': unit[0],
+        'pid': os.getpid(),
+        'rows': len(chunk),
+        'seconds': time.perf_counter() - start
+    }
+
+
+class ParallelTaxiProcessor(TaxiDataProcessor):
+    """Clean many raw files in parallel, per file and per chunk"""
+
+    def __init__(self, raw_data_paths, zone_lookup_path, workers=None):
+        super().__init__(None, zone_lookup_path)
+        self.raw_data_paths = list(raw_data_paths)
+        self.workers = workers or os.cpu_count() or 1
+        self.worker_stats = {}
+
+    def _work_units(self, chunk_size):
+        """Yield (path, start, end) units in file order
+
+        Workers read their own unit, so the parent never parses raw rows or
+        ships them between processes. A Parquet unit is one row group.
+        """
+        for path in self.raw_data_paths:
+            if path.endswith('.parquet'):
+                import pyarrow.parquet as pq
+
+                groups = pq.ParquetFile(path).num_row_groups
+                yield from ((path, group, group + 1) for group in range(groups))
+            else:
+                yield from ((path, start, end)
+                            for start, end in csv_byte_ranges(path, chunk_size))
+
+    def _merge(self, result):
+        """Fold one worker result into the run totals"""
+        for log in result['quality_log']:
+            self.log_quality_issue(log['issue_type'], log['count'],
+                                     log['description'])
+        self.count_file_rows(result['path'], result['rows'], len(result['data']))
+
+        stats = self.worker_stats.setdefault(
+            result['pid'], {'chunks': 0, 'rows': 0, 'seconds': 0.0})
+        stats['chunks'] += 1
+        stats['rows'] += result['rows']
+        stats['seconds'] += result['seconds']
+
+    def _results(self, chunk_size):
+        """Yield worker results in submission order with bounded look-ahead"""
+        if self.workers == 1:
+            _init_worker(self.zone_lookup_path)
+            for unit in self._work_units(chunk_size):
+                yield _clean_chunk(unit)
+            return
+
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 initializer=_init_worker,
+                                 initargs=(self.zone_lookup_path,)) as executor:
+            pending = deque()
+            for unit in self._work_units(chunk_size):
+                pending.append(executor.submit(_clean_chunk, unit))
+                # Keep a couple of chunks queued per worker, no more
+                if len(pending) >= self.workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def process_all(self, output_path, streaming=True, chunk_size=100000,
+                    sink=None):
+        """Clean every input file and write the results to the sink in order"""
+        sink = sink or make_sink(output_path)
+        print("\n" + "=" * 80)
+        print("PARALLEL DATA PROCESSING PIPELINE")
+        print("=" * 80)
+        print(f"Processing {len(self.raw_data_paths)} file(s) with "
+              f"{self.workers} worker(s)...")
+
+        start = time.perf_counter()
+        rows_read = 0
+        sink.open()
+        try:
+            for result in self._results(chunk_size):
+                sink.write(result['data'])
+                rows_read += result['rows']
+                self._merge(result)
+                print(f"  Processed {rows_read:,} rows, kept {sink.rows:,}...",
+                      end='\r')
+        except Exception:
+            sink.close(success=False)
+            raise
+        sink.close()
+        elapsed = time.perf_counter() - start
+
+        removed = rows_read - sink.rows
+        removal_pct = (removed / rows_read) * 100 if rows_read else 0
+        print(f"\nCleaned {rows_read:,} -> {sink.rows:,} records")
+        print(f"Removed {removed:,} ({removal_pct:.2f}%) invalid records")
+        rate = rows_read / elapsed if elapsed > 0 else 0
+        print(f"Total: {elapsed:.1f}s ({rate:,.0f} rows/s)")
+
+        print("Worker throughput:")
+        for pid, stats in sorted(self.worker_stats.items()):
+            rate = stats['rows'] / stats['seconds'] if stats['seconds'] > 0 else 0
+            print(f"  worker {pid}: {stats['chunks']} chunks, "
+                  f"{stats['rows']:,} rows, {rate:,.0f} rows/s")
+
+        self.save_quality_log(sink.path)
+
+        print("\n" + "=" * 80)
+        print("DATA PROCESSING COMPLETE")
+        print("=" * 80)
+
+        return sink.rows
@@ -3,9 +3,220 @@ Database Manager for NYC Taxi Data Explorer
 Handles all database operations with SQLite
 """
 
+import json
+import os
+import shutil
 import sqlite3
+import uuid
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from data_processor import add_calendar_columns, is_parquet_path
+from timestamps import TIMESTAMP_COLUMNS, epoch_series, uses_epoch_timestamps
+
+
+# Range buckets used by the distance and fare distribution charts, as
+# (upper bound, label). The last bucket has no upper bound.
+DISTANCE_BUCKETS = [
+    (2, '0-2 mi'),
+    (5, '2-5 mi'),
+    (10, '5-10 mi'),
+    (20, '10-20 mi'),
+    (50, '20-50 mi'),
+    (None, '50+ mi')
+]
+
+FARE_BUCKETS = [
+    (10, '$0-10'),
+    (20, '$10-20'),
+    (30, '$20-30'),
+    (50, '$30-50'),
+    (100, '$50-100'),
+    (None, '$100+')
+]
+
+# Measures kept by every rollup table. Sums and non-null counts are stored
+# instead of averages so rollup rows can be combined exactly.
+AGGREGATE_MEASURES = [
+    'total_amount',
+    'trip_distance',
+    'trip_duration_minutes',
+    'tip_percentage',
+    'passenger_count'
+]
+
+
+# Columns written to trips by the bulk loader, as
+# (database column, cleaned-data column, type, default when missing).
+TRIP_COLUMNS = [
+    ('vendor_id', 'vendor_id', int, 1),
+    ('pickup_datetime', 'pickup_datetime', str, None),
+    ('dropoff_datetime', 'dropoff_datetime', str, None),
+    ('passenger_count', 'passenger_count', int, None),
+    ('trip_distance', 'trip_distance', float, None),
+    ('rate_code_id', 'rate_code_id', int, 1),
+    ('store_and_fwd_flag', 'store_and_fwd_flag', str, 'N'),
+    ('pickup_location_id', 'pickup_location_id', int, None),
+    ('dropoff_location_id', 'dropoff_location_id', int, None),
+    ('payment_type_id', 'payment_type', int, None),
+    ('fare_amount', 'fare_amount', float, None),
+    ('extra', 'extra', float, 0.0),
+    ('mta_tax', 'mta_tax', float, 0.0),
+    ('tip_amount', 'tip_amount', float, 0.0),
+    ('tolls_amount', 'tolls_amount', float, 0.0),
+    ('improvement_surcharge', 'improvement_surcharge', float, 0.0),
+    ('total_amount', 'total_amount', float, None),
+    ('congestion_surcharge', 'congestion_surcharge', float, 0.0),
+    ('trip_duration_minutes', 'trip_duration_minutes', float, 0.0),
+    ('speed_mph', 'speed_mph', float, None),
+    ('tip_percentage', 'tip_percentage', float, 0.0),
+    ('cost_per_mile', 'cost_per_mile', float, 0.0),
+    ('pickup_hour', 'pickup_hour', int, 0),
+    ('pickup_date', 'pickup_date', str, None),
+    ('pickup_dow', 'pickup_dow', int, None),
+    ('pickup_dom', 'pickup_dom', int, None),
+    ('week_of_month', 'week_of_month', int, None),
+    ('date_id', 'date_id', int, None)
+]
+
+# Calendar columns derived from pickup_datetime at ingest, with the SQL that
+# backfills them on databases created before they existed
+CALENDAR_COLUMNS = [
+    ('pickup_dow', "CAST(strftime('%w', pickup_datetime) AS INTEGER)"),
+    ('pickup_dom', "CAST(strftime('%d', pickup_datetime) AS INTEGER)"),
+    ('week_of_month',
+     "MIN((CAST(strftime('%d', pickup_datetime) AS INTEGER) - 1) / 7, 3) + 1"),
+    ('date_id', "CAST(strftime('%Y%m%d', pickup_datetime) AS INTEGER)")
+]
+
+
+# Columns identifying a trip across loads; incremental ingestion skips rows
+# whose natural key is already present in trips. The lookup is served by
+# idx_pickup_datetime, which is selective enough on its own.
+NATURAL_KEY = [
+    'pickup_datetime',
+    'pickup_location_id',
+    'dropoff_location_id',
+    'vendor_id',
+    'dropoff_datetime',
+    'trip_distance',
+    'total_amount'
+]
+
+
+# Every secondary index, as (name, table, columns). create_schema builds these,
+# database_schema.sql mirrors them and index_advisor.py --apply syncs an
+# existing database to them.
+INDEXES = [
+    # Keyset pagination of /api/trips walks this in (pickup_datetime, trip_id) order
+    ('idx_pickup_datetime', 'trips', ['pickup_datetime']),
+    # Covering indexes for queries that run against trips: top routes, the
+    # live statistics and the live insights cube
+    ('idx_route', 'trips',
+     ['pickup_location_id', 'dropoff_location_id', 'total_amount', 'trip_distance']),
+    ('idx_hour_measures', 'trips',
+     ['pickup_hour', 'total_amount', 'trip_distance', 'trip_duration_minutes',
+      'tip_percentage']),
+    ('idx_payment_amount', 'trips', ['payment_type_id', 'total_amount']),
+    ('idx_insight_cube', 'trips',
+     ['pickup_hour', 'payment_type_id', 'pickup_location_id', 'total_amount',
+      'tip_percentage']),
+    # Let /api/trips/ranked answer top-K by fare or distance from an index
+    ('idx_total_amount', 'trips', ['total_amount']),
+    ('idx_trip_distance', 'trips', ['trip_distance']),
+    # Day-of-week and week-of-month statistics group on these integers
+    ('idx_dow_amount', 'trips', ['pickup_dow', 'total_amount']),
+    ('idx_week_amount', 'trips', ['week_of_month', 'total_amount']),
+    ('idx_date_id', 'trips', ['date_id'])
+]
+
+
+def index_sql(name, table, columns):
+    """CREATE INDEX statement for one INDEXES entry"""
+    return f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(columns)})"
+
+
+def bucket_case(column, buckets, labels=True):
+    """Build a CASE expression mapping a column onto range buckets"""
+    clauses = []
+    for position, (upper, label) in enumerate(buckets, 1):
+        value = f"'{label}'" if labels else str(position)
+        if upper is None:
+            clauses.append(f"ELSE {value}")
+        else:
+            clauses.append(f"WHEN {column} <= {upper} THEN {value}")
+    return "CASE " + " ".join(clauses) + " END"
+
+
+# Rollup tables built at load time: name -> (key columns, source, filter).
+# Key columns are (column name, SQL expression) pairs.
+AGGREGATE_TABLES = {
+    'agg_overview': ([], 'trips', None),
+    'agg_hourly': (
+        [('pickup_hour', 'pickup_hour')],
+        'trips', 'pickup_hour IS NOT NULL'),
+    'agg_borough': (
+        [('borough', 'z.borough')],
+        'trips t JOIN zones z ON t.pickup_location_id = z.location_id', None),
+    'agg_payment': (
+        [('payment_type_id', 'payment_type_id')],
+        'trips', None),
+    'agg_distance': (
+        [('bucket', bucket_case('trip_distance', DISTANCE_BUCKETS, False)),
+         ('distance_range', bucket_case('trip_distance', DISTANCE_BUCKETS))],
+        'trips', None),
+    'agg_fare': (
+        [('bucket', bucket_case('total_amount', FARE_BUCKETS, False)),
+         ('fare_range', bucket_case('total_amount', FARE_BUCKETS))],
+        'trips', None),
+    'agg_day_of_week': (
+        [('day_of_week', 'pickup_dow')],
+        'trips', None),
+    'agg_day_of_month': (
+        [('day_of_month', 'pickup_dom')],
+        'trips', None),
+    # Origin-destination cube behind /api/routes/top (see od_matrix.py)
+    'agg_od': (
+        [('pickup_location_id', 'pickup_location_id'),
+         ('dropoff_location_id', 'dropoff_location_id'),
+         ('pickup_hour', 'pickup_hour'),
+         ('payment_type_id', 'payment_type_id')],
+        'trips', None),
+    # Hour x payment type x pickup borough cube behind /api/insights (see
+    # insights.py); trips without a zone are kept with a NULL borough
+    'agg_insights': (
+        [('pickup_hour', 't.pickup_hour'),
+         ('payment_type_id', 't.payment_type_id'),
+         ('borough', 'z.borough')],
+        'trips t LEFT JOIN zones z ON t.pickup_location_id = z.location_id', None)
+}
+
+
+# Stratified samples behind ?approx=true: table -> sampling rate in percent.
+# Each (pickup_hour, pickup borough) stratum keeps ceil(rate% of its rows),
+# and at least 2, picked by a fixed hash of trip_id, so the smaller samples
+# nest inside the larger ones.
+SAMPLE_TABLES = {
+    'trips_sample_1': 1,
+    'trips_sample_10': 10
+}
+
+# trips columns copied into the samples (borough comes from the pickup zone)
+SAMPLE_COLUMNS = [
+    'trip_id', 'pickup_hour', 'payment_type_id', 'pickup_dow', 'week_of_month',
+    'total_amount', 'trip_distance', 'trip_duration_minutes', 'tip_percentage',
+    'passenger_count'
+]
+
+
+def sample_size(rows, rate):
+    """SQL for the rows a stratum keeps in a sample: ceil(rate% of rows)
+
+    At least 2 rows are kept, or every row of a smaller stratum: a stratum
+    with one sampled row out of several has no variance estimate, and its
+    share of the interval would be silently dropped.
+    """
+    return f"MAX((({rows}) * {rate} + 99) / 100, MIN({rows}, 2))"
 
 
 class DatabaseManager:
@@ -15,6 +226,8 @@ class DatabaseManager:
         self.db_path = db_path
         self.conn = None
         self.cursor = None
+        self._bulk_state = None
+        self._append_state = None
 
     def connect(self):
         """Connect to SQLite database"""
@@ -33,16 +246,26 @@ class DatabaseManager:
             self.conn.close()
             print("Database connection closed")
 
-    def create_schema(self):
-        """Create database schema programmatically"""
+    def create_schema(self, reset=True, epoch_timestamps=False):
+        """Create database schema programmatically
+
+        With reset=False existing tables and data are kept, which is what
+        incremental ingestion uses. With epoch_timestamps=True a new trips
+        table stores pickup/dropoff times as INTEGER epoch seconds, and the
+        trips_iso view shows them as ISO text.
+        """
         print("Creating database schema...")
 
-        tables = ['trips', 'zones', 'dates', 'rate_codes', 'payment_types']
-        for table in tables:
-            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        if reset:
+            tables = ['trips', 'zones', 'dates', 'rate_codes', 'payment_types',
+                      'ingest_manifest', 'dataset_version']
+            tables += list(AGGREGATE_TABLES) + list(SAMPLE_TABLES)
+            self.cursor.execute("DROP VIEW IF EXISTS trips_iso")
+            for table in tables:
+                self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
 
         self.cursor.execute("""
-            CREATE TABLE zones (
+            CREATE TABLE IF NOT EXISTS zones (
                 location_id INTEGER PRIMARY KEY,
                 borough TEXT NOT NULL,
                 zone TEXT NOT NULL,
@@ -51,7 +274,7 @@ class DatabaseManager:
         """)
 
         self.cursor.execute("""
-            CREATE TABLE dates (
+            CREATE TABLE IF NOT EXISTS dates (
                 date_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 date DATE NOT NULL UNIQUE,
                 year INTEGER NOT NULL,
@@ -63,7 +286,7 @@ class DatabaseManager:
         """)
 
         self.cursor.execute("""
-            CREATE TABLE rate_codes (
+            CREATE TABLE IF NOT EXISTS rate_codes (
                 rate_code_id INTEGER PRIMARY KEY,
                 rate_name TEXT NOT NULL
             )
@@ -78,12 +301,12 @@ class DatabaseManager:
             (6, 'Group ride')
         ]
         self.cursor.executemany(
-            "INSERT INTO rate_codes (rate_code_id, rate_name) VALUES (?, ?)",
+            "INSERT OR IGNORE INTO rate_codes (rate_code_id, rate_name) VALUES (?, ?)",
             rate_codes
         )
 
         self.cursor.execute("""
-            CREATE TABLE payment_types (
+            CREATE TABLE IF NOT EXISTS payment_types (
                 payment_type_id INTEGER PRIMARY KEY,
                 payment_name TEXT NOT NULL
             )
@@ -98,16 +321,17 @@ class DatabaseManager:
             (6, 'Voided trip')
         ]
         self.cursor.executemany(
-            "INSERT INTO payment_types (payment_type_id, payment_name) VALUES (?, ?)",
+            "INSERT OR IGNORE INTO payment_types (payment_type_id, payment_name) VALUES (?, ?)",
             payment_types
         )
 
-        self.cursor.execute("""
-            CREATE TABLE trips (
+        timestamp_type = 'INTEGER' if epoch_timestamps else 'DATETIME'
+        self.cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS trips (
                 trip_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 vendor_id INTEGER NOT NULL,
-                pickup_datetime DATETIME NOT NULL,
-                dropoff_datetime DATETIME NOT NULL,
+                pickup_datetime {timestamp_type} NOT NULL,
+                dropoff_datetime {timestamp_type} NOT NULL,
                 passenger_count INTEGER NOT NULL,
                 trip_distance REAL NOT NULL,
                 rate_code_id INTEGER NOT NULL,
@@ -129,24 +353,46 @@ class DatabaseManager:
                 cost_per_mile REAL,
                 pickup_hour INTEGER,
                 pickup_date DATE,
+                pickup_dow INTEGER,
+                pickup_dom INTEGER,
+                week_of_month INTEGER,
+                date_id INTEGER,
                 FOREIGN KEY (pickup_location_id) REFERENCES zones(location_id),
                 FOREIGN KEY (dropoff_location_id) REFERENCES zones(location_id),
                 FOREIGN KEY (rate_code_id) REFERENCES rate_codes(rate_code_id),
-                FOREIGN KEY (payment_type_id) REFERENCES payment_types(payment_type_id)
+                FOREIGN KEY (payment_type_id) REFERENCES payment_types(payment_type_id),
+                FOREIGN KEY (date_id) REFERENCES dates(date_id)
             )
         """)
+        if not reset:
+            self._add_calendar_columns()
+        if uses_epoch_timestamps(self.conn):
+            self._create_iso_view()
 
         print("Creating indexes...")
-        self.cursor.execute(
-            "CREATE INDEX idx_pickup_datetime ON trips(pickup_datetime)")
-        self.cursor.execute(
-            "CREATE INDEX idx_pickup_location ON trips(pickup_location_id)")
-        self.cursor.execute(
-            "CREATE INDEX idx_dropoff_location ON trips(dropoff_location_id)")
-        self.cursor.execute(
-            "CREATE INDEX idx_payment_type ON trips(payment_type_id)")
-        self.cursor.execute(
-            "CREATE INDEX idx_pickup_hour ON trips(pickup_hour)")
+        for name, table, columns in INDEXES:
+            self.cursor.execute(index_sql(name, table, columns))
+
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS dataset_version (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version TEXT NOT NULL,
+                updated_at DATETIME NOT NULL
+            )
+        """)
+
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_manifest (
+                source_file TEXT PRIMARY KEY,
+                source_path TEXT NOT NULL,
+                file_size INTEGER NOT NULL,
+                file_mtime REAL NOT NULL,
+                row_start INTEGER NOT NULL,
+                row_end INTEGER NOT NULL,
+                rows_loaded INTEGER NOT NULL,
+                loaded_at DATETIME NOT NULL
+            )
+        """)
 
         self.conn.commit()
         print("Schema created successfully")
@@ -181,21 +427,30 @@ class DatabaseManager:
         self.conn.commit()
         print(f"Loaded {loaded_count} zones")
 
-    def load_trips(self, cleaned_data_path):
+    def load_trips(self, cleaned_data_path, bulk=True):
         """Load cleaned trip data in batches"""
+        if bulk or is_parquet_path(cleaned_data_path):
+            return self.bulk_load_trips(cleaned_data_path)
+
         print(f"Loading trips from {cleaned_data_path}...")
         print("This may take 5-10 minutes for large datasets...")
 
         chunk_size = 10000
         total_inserted = 0
+        epoch = uses_epoch_timestamps(self.conn)
 
         for chunk_num, chunk in enumerate(pd.read_csv(cleaned_data_path, chunksize=chunk_size), 1):
+            if 'date_id' not in chunk.columns:
+                chunk = add_calendar_columns(chunk)
+            if epoch:
+                for column in TIMESTAMP_COLUMNS:
+                    chunk[column] = epoch_series(chunk[column])
             records = []
             for _, row in chunk.iterrows():
                 records.append((
                     row.get('vendor_id', 1),
-                    row['pickup_datetime'],
-                    row['dropoff_datetime'],
+                    int(row['pickup_datetime']) if epoch else row['pickup_datetime'],
+                    int(row['dropoff_datetime']) if epoch else row['dropoff_datetime'],
                     int(row['passenger_count']),
                     float(row['trip_distance']),
                     int(row.get('rate_code_id', 1)),
@@ -217,7 +472,11 @@ class DatabaseManager:
                     float(row.get('tip_percentage', 0)),
                     float(row.get('cost_per_mile', 0)),
                     int(row.get('pickup_hour', 0)),
-                    row.get('pickup_date')
+                    row.get('pickup_date'),
+                    int(row['pickup_dow']),
+                    int(row['pickup_dom']),
+                    int(row['week_of_month']),
+                    int(row['date_id'])
                 ))
 
             self.cursor.executemany("""
@@ -228,8 +487,10 @@ class DatabaseManager:
                     fare_amount, extra, mta_tax, tip_amount, tolls_amount,
                     improvement_surcharge, total_amount, congestion_surcharge,
                     trip_duration_minutes, speed_mph, tip_percentage, cost_per_mile,
-                    pickup_hour, pickup_date
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    pickup_hour, pickup_date, pickup_dow, pickup_dom,
+                    week_of_month, date_id
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                          ?, ?, ?, ?)
             """, records)
 
             total_inserted += len(records)
@@ -242,6 +503,596 @@ class DatabaseManager:
         self.conn.commit()
         print(f"\nLoaded {total_inserted:,} trips into database")
 
+    @staticmethod
+    def _trip_records(chunk, epoch_timestamps=False):
+        """Convert a cleaned-data chunk to insert tuples column by column"""
+        # Cleaned files written before the calendar columns existed
+        if 'date_id' not in chunk.columns:
+            chunk = add_calendar_columns(chunk.copy())
+
+        columns = []
+        for column, source, kind, default in TRIP_COLUMNS:
+            if source in chunk.columns:
+                values = chunk[source]
+            else:
+                values = pd.Series(default, index=chunk.index)
+
+            if epoch_timestamps and column in TIMESTAMP_COLUMNS:
+                values = epoch_series(values)
+                kind = int
+
+            if kind is int:
+                if default is not None:
+                    values = values.fillna(default)
+                values = values.astype('int64')
+            elif kind is float:
+                values = values.astype('float64')
+            else:
+                if pd.api.types.is_datetime64_any_dtype(values):
+                    values = values.dt.strftime('%Y-%m-%d %H:%M:%S')
+                values = values.astype(object).where(values.notna(), None)
+            # tolist() yields native Python values that sqlite3 can bind;
+            # NaN floats are stored as NULL
+            columns.append(values.tolist())
+
+        return list(zip(*columns))
+
+    @staticmethod
+    def _read_cleaned_chunks(cleaned_data_path, chunk_size):
+        """Yield DataFrame chunks from a cleaned CSV file or Parquet dataset"""
+        if not is_parquet_path(cleaned_data_path):
+            yield from pd.read_csv(cleaned_data_path, chunksize=chunk_size,
+                                   low_memory=False)
+            return
+
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(cleaned_data_path, format='parquet',
+                             partitioning='hive')
+        # Only read the columns the trips table needs, one row group at a time
+        wanted = {source for _, source, _, _ in TRIP_COLUMNS}
+        columns = [name for name in dataset.schema.names if name in wanted]
+        for batch in dataset.to_batches(columns=columns, batch_size=chunk_size):
+            if batch.num_rows:
+                yield batch.to_pandas()
+
+    def _trip_indexes(self):
+        """Return (name, sql) for every explicit index on trips"""
+        self.cursor.execute("""
+            SELECT name, sql FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = 'trips' AND sql IS NOT NULL
+        """)
+        return self.cursor.fetchall()
+
+    def begin_bulk_load(self):
+        """Prepare for a bulk load: fast PRAGMAs and no trips indexes"""
+        self._bulk_state = {
+            'start': datetime.now(),
+            'synchronous': self.cursor.execute("PRAGMA synchronous").fetchone()[0],
+            'indexes': self._trip_indexes(),
+            'inserted': 0,
+            'epoch': uses_epoch_timestamps(self.conn)
+        }
+        # The journal stays on: without it a failed load could not be rolled
+        # back. Appends journal few pages, so skipping fsyncs is the real win.
+        self.cursor.execute("PRAGMA synchronous=OFF")
+        self.cursor.execute("PRAGMA temp_store=MEMORY")
+
+        # Maintaining indexes row by row is far slower than rebuilding them
+        for name, _ in self._bulk_state['indexes']:
+            self.cursor.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def insert_trips(self, chunk):
+        """Insert one cleaned DataFrame chunk inside the bulk-load transaction"""
+        columns = [column for column, _, _, _ in TRIP_COLUMNS]
+        insert_sql = (
+            f"INSERT INTO trips ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' for _ in columns)})"
+        )
+        self.cursor.executemany(
+            insert_sql, self._trip_records(chunk, self._bulk_state['epoch']))
+
+        state = self._bulk_state
+        state['inserted'] += len(chunk)
+        elapsed = (datetime.now() - state['start']).total_seconds()
+        rate = state['inserted'] / elapsed if elapsed > 0 else 0
+        print(f"  Progress: {state['inserted']:,} trips inserted "
+              f"({rate:,.0f} rows/s)...", end='\r')
+
+    def finish_bulk_load(self, success=True):
+        """Commit (or roll back) the load, rebuild indexes and restore PRAGMAs"""
+        state = self._bulk_state
+        if success:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+
+        load_seconds = (datetime.now() - state['start']).total_seconds()
+        print(f"\nRebuilding {len(state['indexes'])} indexes...")
+        for _, sql in state['indexes']:
+            self.cursor.execute(sql)
+        self.conn.commit()
+        self.cursor.execute(f"PRAGMA synchronous={state['synchronous']}")
+
+        total_inserted = state['inserted'] if success else 0
+        elapsed = (datetime.now() - state['start']).total_seconds()
+        rate = total_inserted / load_seconds if load_seconds > 0 else 0
+        print(f"Loaded {total_inserted:,} trips into database in {elapsed:.1f}s "
+              f"({rate:,.0f} rows/s, {elapsed - load_seconds:.1f}s rebuilding indexes)")
+        self._bulk_state = None
+        return total_inserted
+
+    def bulk_load_trips(self, cleaned_data_path, chunk_size=100000):
+        """Load cleaned trip data with vectorized conversion in one transaction"""
+        print(f"Bulk loading trips from {cleaned_data_path}...")
+
+        self.begin_bulk_load()
+        try:
+            for chunk in self._read_cleaned_chunks(cleaned_data_path, chunk_size):
+                self.insert_trips(chunk)
+        except Exception:
+            self.finish_bulk_load(success=False)
+            raise
+        return self.finish_bulk_load()
+
+    def get_manifest_entry(self, source_file):
+        """Return the manifest row for a source file, or None"""
+        self.cursor.execute("""
+            SELECT source_file, source_path, file_size, file_mtime,
+                   row_start, row_end, rows_loaded, loaded_at
+            FROM ingest_manifest WHERE source_file = ?
+        """, (source_file,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
+        keys = ['source_file', 'source_path', 'file_size', 'file_mtime',
+                'row_start', 'row_end', 'rows_loaded', 'loaded_at']
+        return dict(zip(keys, row))
+
+    def record_manifest(self, source_path, file_size, file_mtime, row_start,
+                        row_end, rows_loaded):
+        """Record which rows of a source file are loaded, then commit"""
+        self.cursor.execute("""
+            INSERT INTO ingest_manifest (
+                source_file, source_path, file_size, file_mtime,
+                row_start, row_end, rows_loaded, loaded_at
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(source_file) DO UPDATE SET
+                source_path = excluded.source_path,
+                file_size = excluded.file_size,
+                file_mtime = excluded.file_mtime,
+                row_end = excluded.row_end,
+                rows_loaded = ingest_manifest.rows_loaded + excluded.rows_loaded,
+                loaded_at = excluded.loaded_at
+        """, (
+            os.path.basename(source_path), str(source_path), file_size,
+            file_mtime, row_start, row_end, rows_loaded,
+            datetime.now().isoformat(sep=' ', timespec='seconds')
+        ))
+        # Same transaction as the appended trips, so both land or neither does
+        self.conn.commit()
+
+    def begin_append(self):
+        """Prepare a staging table for appending trips to existing data"""
+        columns = ', '.join(column for column, _, _, _ in TRIP_COLUMNS)
+        self.cursor.execute(
+            f"CREATE TEMP TABLE IF NOT EXISTS trips_staging AS "
+            f"SELECT {columns} FROM trips WHERE 0")
+        self._append_state = {'start': datetime.now(), 'inserted': 0,
+                              'skipped': 0,
+                              'epoch': uses_epoch_timestamps(self.conn)}
+
+    def append_trips(self, chunk):
+        """Append a cleaned chunk, skipping trips already present"""
+        columns = ', '.join(column for column, _, _, _ in TRIP_COLUMNS)
+        placeholders = ', '.join('?' for _ in TRIP_COLUMNS)
+        match = ' AND '.join(f"t.{column} = s.{column}" for column in NATURAL_KEY)
+
+        self.cursor.execute("DELETE FROM temp.trips_staging")
+        self.cursor.executemany(
+            f"INSERT INTO temp.trips_staging ({columns}) VALUES ({placeholders})",
+            self._trip_records(chunk, self._append_state['epoch']))
+        self.cursor.execute(f"""
+            INSERT INTO trips ({columns})
+            SELECT {columns} FROM temp.trips_staging s
+            WHERE NOT EXISTS (SELECT 1 FROM trips t WHERE {match})
+        """)
+
+        inserted = self.cursor.rowcount
+        state = self._append_state
+        state['inserted'] += inserted
+        state['skipped'] += len(chunk) - inserted
+        print(f"  Progress: {state['inserted']:,} trips appended, "
+              f"{state['skipped']:,} duplicates skipped...", end='\r')
+        return inserted
+
+    def finish_append(self, success=True):
+        """Roll back a failed append; successful appends commit with the manifest"""
+        state = self._append_state
+        self._append_state = None
+        if not success:
+            self.conn.rollback()
+            return 0
+
+        elapsed = (datetime.now() - state['start']).total_seconds()
+        print(f"\nAppended {state['inserted']:,} trips in {elapsed:.1f}s "
+              f"({state['skipped']:,} duplicates skipped)")
+        return state['inserted']
+
+    def get_max_trip_id(self):
+        """Highest trip_id currently loaded (0 when empty)"""
+        self.cursor.execute("SELECT COALESCE(MAX(trip_id), 0) FROM trips")
+        return self.cursor.fetchone()[0]
+
+    def _create_iso_view(self):
+        """View of trips with epoch timestamps shown as ISO text, for ad-hoc SQL"""
+        columns = ['trip_id'] + [
+            f"datetime({column}, 'unixepoch') AS {column}"
+            if column in TIMESTAMP_COLUMNS else column
+            for column, _, _, _ in TRIP_COLUMNS
+        ]
+        self.cursor.execute(f"""
+            CREATE VIEW IF NOT EXISTS trips_iso AS
+            SELECT {', '.join(columns)} FROM trips
+        """)
+
+    def _add_calendar_columns(self):
+        """Add and backfill the calendar columns on an older trips table"""
+        self.cursor.execute("PRAGMA table_info(trips)")
+        existing = {row[1] for row in self.cursor.fetchall()}
+        missing = [(column, expr) for column, expr in CALENDAR_COLUMNS
+                   if column not in existing]
+        if not missing:
+            return
+
+        print(f"Adding {', '.join(column for column, _ in missing)} to trips...")
+        for column, _ in missing:
+            self.cursor.execute(f"ALTER TABLE trips ADD COLUMN {column} INTEGER")
+        assignments = ', '.join(f"{column} = {expr}" for column, expr in missing)
+        self.cursor.execute(f"UPDATE trips SET {assignments}")
+        self.conn.commit()
+        self.populate_dates()
+
+    def populate_dates(self, since_trip_id=None):
+        """Insert a dates row for every date_id used by trips"""
+        where = "WHERE date_id IS NOT NULL"
+        if since_trip_id is not None:
+            where += f" AND trip_id > {int(since_trip_id)}"
+        self.cursor.execute(f"""
+            INSERT OR IGNORE INTO dates
+                (date_id, date, year, month, day, day_of_week, is_weekend)
+            SELECT
+                date_id,
+                printf('%04d-%02d-%02d', date_id / 10000, date_id / 100 % 100,
+                       date_id % 100),
+                date_id / 10000,
+                date_id / 100 % 100,
+                date_id % 100,
+                MIN(pickup_dow),
+                MIN(pickup_dow) IN (0, 6)
+            FROM trips
+            {where}
+            GROUP BY date_id
+        """)
+        self.conn.commit()
+        print(f"Dates table: {self.cursor.rowcount} new dates")
+
+    @staticmethod
+    def _aggregate_query(keys, source, where, since_trip_id=None):
+        """SELECT statement computing one rollup from trips"""
+        measures = ["COUNT(*) AS trip_count"]
+        for column in AGGREGATE_MEASURES:
+            measures.append(f"SUM({column}) AS {column}_sum")
+            measures.append(f"COUNT({column}) AS {column}_n")
+
+        select = [f"{expr} AS {name}" for name, expr in keys] + measures
+        filters = [where] if where else []
+        if since_trip_id is not None:
+            filters.append(f"trip_id > {int(since_trip_id)}")
+
+        query = f"SELECT {', '.join(select)} FROM {source}"
+        if filters:
+            query += " WHERE " + " AND ".join(filters)
+        if keys:
+            query += " GROUP BY " + ", ".join(name for name, _ in keys)
+        return query
+
+    def build_aggregates(self):
+        """Build rollup tables used by the /api/stats endpoints"""
+        print("Building aggregate tables...")
+        start = datetime.now()
+
+        for table, (keys, source, where) in AGGREGATE_TABLES.items():
+            query = self._aggregate_query(keys, source, where)
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            self.cursor.execute(f"CREATE TABLE {table} AS {query}")
+
+        self.conn.commit()
+        elapsed = (datetime.now() - start).total_seconds()
+        print(f"Built {len(AGGREGATE_TABLES)} aggregate tables in {elapsed:.1f}s")
+
+    def refresh_aggregates(self, since_trip_id):
+        """Fold trips with trip_id > since_trip_id into the existing rollups"""
+        self.cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'agg_%'")
+        existing = {row[0] for row in self.cursor.fetchall()}
+        if not set(AGGREGATE_TABLES) <= existing:
+            return self.build_aggregates()
+
+        print("Refreshing aggregate tables with new trips...")
+        start = datetime.now()
+
+        sums = ["SUM(trip_count) AS trip_count"]
+        for column in AGGREGATE_MEASURES:
+            sums.append(f"SUM({column}_sum) AS {column}_sum")
+            sums.append(f"SUM({column}_n) AS {column}_n")
+
+        for table, (keys, source, where) in AGGREGATE_TABLES.items():
+            delta = self._aggregate_query(keys, source, where, since_trip_id)
+            key_names = [name for name, _ in keys]
+            query = (f"SELECT {', '.join(key_names + sums)} "
+                     f"FROM (SELECT * FROM {table} UNION ALL {delta})")
+            if keys:
+                query += " GROUP BY " + ", ".join(key_names)
+
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}_new")
+            self.cursor.execute(f"CREATE TABLE {table}_new AS {query}")
+            self.cursor.execute(f"DROP TABLE {table}")
+            self.cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+
+        self.conn.commit()
+        elapsed = (datetime.now() - start).total_seconds()
+        print(f"Refreshed {len(AGGREGATE_TABLES)} aggregate tables in {elapsed:.1f}s")
+
+    def build_samples(self):
+        """Build the stratified sample tables from trips"""
+        print("Building sample tables...")
+        start = datetime.now()
+        tables = sorted(SAMPLE_TABLES.items(), key=lambda item: -item[1])
+        columns = ', '.join(SAMPLE_COLUMNS)
+
+        def keep(rate):
+            return sample_size('stratum_rows', rate)
+
+        # The largest sample ranks every stratum once; smaller ones are
+        # prefixes of the same ranking
+        largest, largest_rate = tables[0]
+        self.cursor.execute(f"DROP TABLE IF EXISTS {largest}")
+        self.cursor.execute(f"""
+            CREATE TABLE {largest} AS
+            SELECT {columns}, borough, stratum_rows, sample_rank,
+                   {keep(largest_rate)} AS stratum_sample
+            FROM (
+                SELECT
+                    {', '.join(f"t.{column}" for column in SAMPLE_COLUMNS)},
+                    z.borough,
+                    COUNT(*) OVER stratum AS stratum_rows,
+                    ROW_NUMBER() OVER (
+                        stratum ORDER BY (t.trip_id * 2654435761) % 4294967296, t.trip_id
+                    ) AS sample_rank
+                FROM trips t
+                LEFT JOIN zones z ON t.pickup_location_id = z.location_id
+                WINDOW stratum AS (PARTITION BY t.pickup_hour, z.borough)
+            )
+            WHERE sample_rank <= {keep(largest_rate)}
+        """)
+        for table, rate in tables[1:]:
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            self.cursor.execute(f"""
+                CREATE TABLE {table} AS
+                SELECT {columns}, borough, stratum_rows, sample_rank,
+                       {keep(rate)} AS stratum_sample
+                FROM {largest}
+                WHERE sample_rank <= {keep(rate)}
+            """)
+
+        self.conn.commit()
+        elapsed = (datetime.now() - start).total_seconds()
+        sizes = []
+        for table, rate in tables:
+            self.cursor.execute(f"SELECT COUNT(*) FROM {table}")
+            sizes.append(f"{table} ({rate}%): {self.cursor.fetchone()[0]:,} rows")
+        print(f"Built sample tables in {elapsed:.1f}s: {'; '.join(sizes)}")
+
+    def append_samples(self, since_trip_id):
+        """Sample trips appended after since_trip_id into the sample tables
+
+        New trips are ranked only within their own (pickup_hour, borough)
+        stratum, by the same trip_id hash as build_samples, and each table
+        keeps its rate of them. The stratum's stratum_rows and
+        stratum_sample then grow by the new counts. Each stratum stays a
+        proportional sample, of the trips in each load, without re-ranking
+        all of trips.
+        """
+        tables = sorted(SAMPLE_TABLES.items(), key=lambda item: -item[1])
+        self.cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN "
+            f"({', '.join('?' for _ in tables)})", [table for table, _ in tables])
+        if self.cursor.fetchone()[0] < len(tables):
+            self.build_samples()
+            return
+
+        print("Sampling new trips...")
+        start = datetime.now()
+        columns = ', '.join(SAMPLE_COLUMNS)
+
+        self.cursor.execute("DROP TABLE IF EXISTS temp.sample_batch")
+        self.cursor.execute(f"""
+            CREATE TEMP TABLE sample_batch AS
+            SELECT
+                {', '.join(f"t.{column}" for column in SAMPLE_COLUMNS)},
+                z.borough,
+                COUNT(*) OVER stratum AS batch_rows,
+                ROW_NUMBER() OVER (
+                    stratum ORDER BY (t.trip_id * 2654435761) % 4294967296, t.trip_id
+                ) AS batch_rank
+            FROM trips t
+            LEFT JOIN zones z ON t.pickup_location_id = z.location_id
+            WHERE t.trip_id > ?
+            WINDOW stratum AS (PARTITION BY t.pickup_hour, z.borough)
+        """, (since_trip_id or 0,))
+
+        for table, rate in tables:
+            # Stratum sizes before and after this load, per stratum it touches
+            self.cursor.execute("DROP TABLE IF EXISTS temp.sample_strata")
+            self.cursor.execute(f"""
+                CREATE TEMP TABLE sample_strata AS
+                SELECT s.pickup_hour, s.borough,
+                       COALESCE(MAX(o.stratum_rows), 0) AS old_rows,
+                       s.batch_rows + COALESCE(MAX(o.stratum_rows), 0) AS stratum_rows,
+                       {sample_size('s.batch_rows', rate)}
+                           + COALESCE(MAX(o.stratum_sample), 0) AS stratum_sample
+                FROM (SELECT DISTINCT pickup_hour, borough, batch_rows
+                      FROM sample_batch) s
+                LEFT JOIN {table} o
+                    ON o.pickup_hour IS s.pickup_hour AND o.borough IS s.borough
+                GROUP BY s.pickup_hour, s.borough, s.batch_rows
+            """)
+            self.cursor.execute(f"""
+                UPDATE {table}
+                SET stratum_rows = s.stratum_rows, stratum_sample = s.stratum_sample
+                FROM sample_strata s
+                WHERE {table}.pickup_hour IS s.pickup_hour
+                  AND {table}.borough IS s.borough
+            """)
+            self.cursor.execute(f"""
+                INSERT INTO {table}
+                    ({columns}, borough, stratum_rows, sample_rank, stratum_sample)
+                SELECT {', '.join(f"b.{column}" for column in SAMPLE_COLUMNS)},
+                       b.borough, s.stratum_rows, s.old_rows + b.batch_rank,
+                       s.stratum_sample
+                FROM sample_batch b
+                JOIN sample_strata s
+                    ON b.pickup_hour IS s.pickup_hour AND b.borough IS s.borough
+                WHERE b.batch_rank <= {sample_size('b.batch_rows', rate)}
+            """)
+
+        self.cursor.execute("DROP TABLE temp.sample_strata")
+        self.cursor.execute("DROP TABLE temp.sample_batch")
+        self.conn.commit()
+        elapsed = (datetime.now() - start).total_seconds()
+        print(f"Sampled new trips into {len(tables)} sample tables in {elapsed:.1f}s")
+
+    def stamp_dataset_version(self):
+        """Record a new dataset version so API caches drop stale responses"""
+        version = uuid.uuid4().hex
+        self.cursor.execute("""
+            INSERT OR REPLACE INTO dataset_version (id, version, updated_at)
+            VALUES (1, ?, ?)
+        """, (version, datetime.now().isoformat(sep=' ', timespec='seconds')))
+        self.conn.commit()
+        print(f"Dataset version: {version}")
+        return version
+
+    def enable_wal(self):
+        """Switch the database to WAL so API readers never block on a load
+
+        The journal mode is stored in the file, so this runs once per load
+        and the API's read-only connections pick it up.
+        """
+        mode = self.cursor.execute("PRAGMA journal_mode=WAL").fetchone()[0]
+        if mode.lower() != 'wal':
+            print(f"Could not enable WAL mode (journal mode is {mode})")
+        return mode
+
+    def export_columns(self, output_dir, batch_size=100000):
+        """Write each numeric trips column to output_dir/<column>.npy
+
+        Rows are in trip_id order. Integer columns without NULLs get the
+        narrowest integer dtype that holds them, everything else float64 with
+        NaN for NULL. Timestamps are exported as epoch seconds whatever the
+        storage mode. manifest.json records the dataset version, dtypes and
+        the zone and payment type lookups. The new directory replaces the old
+        one in a single rename, so readers never see a partial export.
+        """
+        print(f"Exporting trips columns to {output_dir}...")
+        start = datetime.now()
+        epoch = uses_epoch_timestamps(self.conn)
+
+        exprs = {'trip_id': ('trip_id', True)}
+        for column, _, kind, _ in TRIP_COLUMNS:
+            if column in TIMESTAMP_COLUMNS:
+                expr = column if epoch else f"CAST(strftime('%s', {column}) AS INTEGER)"
+                exprs[column] = (expr, True)
+            elif kind in (int, float):
+                exprs[column] = (column, kind is int)
+
+        stats = [f"COUNT({expr}), MIN({expr}), MAX({expr})"
+                 for expr, _ in exprs.values()]
+        self.cursor.execute(f"SELECT COUNT(*), {', '.join(stats)} FROM trips")
+        row = self.cursor.fetchone()
+        rows = row[0]
+        dtypes = {}
+        for i, (column, (_, is_int)) in enumerate(exprs.items()):
+            non_null, low, high = row[1 + 3 * i:4 + 3 * i]
+            if not is_int or non_null < rows:
+                dtypes[column] = np.dtype('float64')
+                continue
+            dtypes[column] = np.dtype('int64')
+            for candidate in ('int8', 'int16', 'int32'):
+                info = np.iinfo(candidate)
+                if rows == 0 or (info.min <= low and high <= info.max):
+                    dtypes[column] = np.dtype(candidate)
+                    break
+
+        staging = f"{output_dir}.tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        arrays = {
+            column: np.lib.format.open_memmap(
+                os.path.join(staging, f"{column}.npy"), mode='w+',
+                dtype=dtypes[column], shape=(rows,))
+            for column in exprs
+        }
+
+        select = ', '.join(expr for expr, _ in exprs.values())
+        self.cursor.execute(f"SELECT {select} FROM trips ORDER BY trip_id")
+        offset = 0
+        while True:
+            batch = self.cursor.fetchmany(batch_size)
+            if not batch:
+                break
+            # Every exported value fits a float64 exactly; None becomes NaN
+            block = np.array(batch, dtype=float)
+            for i, column in enumerate(exprs):
+                arrays[column][offset:offset + len(batch)] = block[:, i]
+            offset += len(batch)
+        for array in arrays.values():
+            array.flush()
+        del arrays
+
+        self.cursor.execute("SELECT version FROM dataset_version WHERE id = 1")
+        version = self.cursor.fetchone()
+        self.cursor.execute("SELECT location_id, borough, zone FROM zones")
+        zones = [list(zone) for zone in self.cursor.fetchall()]
+        self.cursor.execute(
+            "SELECT payment_type_id, payment_name FROM payment_types "
+            "ORDER BY payment_type_id")
+        payment_types = [list(payment) for payment in self.cursor.fetchall()]
+        with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+            json.dump({
+                'version': version[0] if version else None,
+                'rows': rows,
+                'columns': {column: dtype.name for column, dtype in dtypes.items()},
+                'zones': zones,
+                'payment_types': payment_types,
+                'exported_at': datetime.now().isoformat(sep=' ', timespec='seconds')
+            }, f, indent=2)
+
+        previous = f"{output_dir}.old"
+        shutil.rmtree(previous, ignore_errors=True)
+        if os.path.exists(output_dir):
+            os.rename(output_dir, previous)
+        os.rename(staging, output_dir)
+        shutil.rmtree(previous, ignore_errors=True)
+
+        elapsed = (datetime.now() - start).total_seconds()
+        size = sum(os.path.getsize(os.path.join(output_dir, name))
+                   for name in os.listdir(output_dir))
+        print(f"Exported {len(dtypes)} columns x {rows:,} rows "
+              f"({size / 1e6:,.1f} MB) in {elapsed:.1f}s")
+        return rows
+
     def get_summary_statistics(self):
         """Get basic statistics from the database"""
         query = """
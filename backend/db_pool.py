@@ -0,0 +1,222 @@
+"""
+Connection Pool for NYC Taxi Data Explorer
+Keeps long-lived, read-only SQLite connections for the Flask API
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes free within the timeout"""
+
+
+class PooledConnection:
+    """Wrapper that hands the connection back to the pool on close()"""
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError("Connection already returned to pool")
+        return getattr(self._conn, name)
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    def close(self):
+        """Return the connection to the pool (safe to call twice)"""
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+
+class ConnectionPool:
+    """Thread-safe pool of read-only SQLite connections
+
+    The pool never writes to the database; setup.py leaves it in WAL mode
+    (DatabaseManager.enable_wal) so these readers do not block on a load.
+    """
+
+    def __init__(self, db_path, size=4, timeout=5.0, mmap_size=268435456,
+                 cache_size=-65536, trace_callback=None):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        # Receives every SQL statement run on a pooled connection
+        self.trace_callback = trace_callback
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._open = 0
+        self._closed = False
+        self._stats = {
+            'created': 0,
+            'acquired': 0,
+            'released': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'replaced': 0,
+            'in_use': 0,
+            'peak_in_use': 0
+        }
+
+
+    def _connect(self):
+        """Open a new read-only connection with the pool PRAGMAs applied"""
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if self.trace_callback is not None:
+            conn.set_trace_callback(self.trace_callback)
+        with self._lock:
+            self._stats['created'] += 1
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """Borrow a connection, opening a new one while below pool size"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                # Reserve a slot before connecting outside the lock
+                can_open = self._open < self.size
+                if can_open:
+                    self._open += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except sqlite3.Error:
+                    with self._lock:
+                        self._open -= 1
+                    raise
+            else:
+                with self._lock:
+                    self._stats['waits'] += 1
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    with self._lock:
+                        self._stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f"No database connection free after {self.timeout}s")
+
+        with self._lock:
+            self._stats['acquired'] += 1
+            self._stats['in_use'] += 1
+            self._stats['peak_in_use'] = max(self._stats['peak_in_use'],
+                                             self._stats['in_use'])
+        return PooledConnection(self, conn)
+
+    def release(self, conn):
+        """Return a connection to the idle queue"""
+        with self._lock:
+            self._stats['released'] += 1
+            self._stats['in_use'] -= 1
+
+        if self._closed:
+            conn.close()
+            return
+
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that borrows and returns a connection"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def health_check(self):
+        """Ping idle connections, replacing any that fail"""
+        checked = 0
+        replaced = 0
+        failed = 0
+        idle = []
+        while True:
+            try:
+                idle.append(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+        for conn in idle:
+            checked += 1
+            if self._is_healthy(conn):
+                self._idle.put(conn)
+                continue
+
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            try:
+                self._idle.put(self._connect())
+                replaced += 1
+                with self._lock:
+                    self._stats['replaced'] += 1
+            except sqlite3.Error:
+                failed += 1
+                with self._lock:
+                    self._open -= 1
+
+        if checked == 0:
+            # Nothing idle to ping; prove the database is still reachable
+            try:
+                with self.connection() as conn:
+                    healthy = self._is_healthy(conn)
+            except (sqlite3.Error, PoolTimeout):
+                healthy = False
+        else:
+            healthy = failed == 0
+
+        return {
+            'healthy': healthy,
+            'checked': checked,
+            'replaced': replaced,
+            'failed': failed
+        }
+
+    def stats(self):
+        """Return pool usage counters"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['size'] = self.size
+        stats['open'] = self._open
+        stats['idle'] = self._idle.qsize()
+        return stats
+
+    def close_all(self):
+        """Close every idle connection and refuse further borrows"""
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
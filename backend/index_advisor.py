@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Index Advisor for NYC Taxi Data Explorer
+Explains every API query, tries candidate indexes and applies the index set
+"""
+
+from database import INDEXES, index_sql
+from db_pool import ConnectionPool
+import app as api
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+
+SCHEMA_SQL = os.path.join(os.path.dirname(__file__), '..', 'database_schema.sql')
+
+# Representative requests; stats, the dashboard, insights and aggregates run
+# live so they hit trips. The live dashboard is one pass over trips, a
+# different query from the per-section ones.
+WORKLOAD = [
+    '/api/stats?live=1',
+    '/api/stats/hourly?live=1',
+    '/api/stats/borough?live=1',
+    '/api/stats/payment?live=1',
+    '/api/stats/distance-distribution?live=1',
+    '/api/stats/fare-distribution?live=1',
+    '/api/stats/day-of-week?live=1',
+    '/api/stats/weekly-trend?live=1',
+    '/api/dashboard?live=1',
+    '/api/aggregate?live=1&group_by=hour,borough&measures=count,avg_fare',
+    '/api/routes/top',
+    '/api/insights?live=1',
+    '/api/trips',
+    '/api/trips?min_fare=50',
+    '/api/trips?min_fare=20&max_fare=40&payment_type=credit',
+    '/api/trips?pickup_borough=Queens',
+    '/api/trips?payment_type=cash',
+    '/api/trips/ranked?rank_by=fare',
+    '/api/trips/ranked?rank_by=distance&order=asc'
+]
+
+# Indexes worth trying beyond INDEXES: (name, table, columns, why)
+CANDIDATE_INDEXES = [
+    ('cand_hour_amount', 'trips', ['pickup_hour', 'total_amount'],
+     'narrower cover for the live hourly fare statistics'),
+    ('cand_payment_datetime', 'trips', ['payment_type_id', 'pickup_datetime'],
+     'payment filter on /api/trips without a sort'),
+    ('cand_location_measures', 'trips',
+     ['pickup_location_id', 'total_amount', 'trip_distance',
+      'trip_duration_minutes'],
+     'covers the live borough statistics'),
+    ('cand_date_amount', 'trips', ['date_id', 'total_amount'],
+     'covers per-date revenue through the dates table')
+]
+
+
+def capture_workload(db_path):
+    """Run WORKLOAD through the API and return [(endpoint, sql)] for trips queries
+
+    Returns None if any request fails, since its queries would be missing.
+    """
+    statements = []
+    api.DB_PATH = db_path
+    api.CACHE_ENABLED = False
+    # Concurrent endpoints such as /api/dashboard read on several connections
+    api._pool = ConnectionPool(db_path, size=2,
+                               trace_callback=statements.append)
+
+    client = api.app.test_client()
+    seen = set()
+    workload = []
+    failed = []
+    for endpoint in WORKLOAD:
+        del statements[:]
+        response = client.get(endpoint)
+        if response.status_code != 200:
+            error = (response.get_json(silent=True) or {}).get('error', '')
+            print(f"  {endpoint}: HTTP {response.status_code} {error}")
+            failed.append(endpoint)
+            continue
+        for sql in statements:
+            normalized = ' '.join(sql.split())
+            if (not normalized.upper().startswith('SELECT')
+                    or not re.search(r'\btrips\b', normalized)
+                    or normalized in seen):
+                continue
+            seen.add(normalized)
+            workload.append((endpoint, normalized))
+
+    api._pool.close_all()
+    api._pool = None
+    if failed:
+        print(f"  {len(failed)} request(s) failed; their queries cannot be analysed")
+        return None
+    return workload
+
+
+def explain(conn, sql):
+    """Return the EXPLAIN QUERY PLAN detail lines for sql"""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+def plan_summary(plan):
+    """Short description of how a plan reads trips"""
+    notes = []
+    for detail in plan:
+        if re.match(r'SCAN (t|trips)$', detail):
+            notes.append('full scan')
+        elif 'USE TEMP B-TREE' in detail:
+            notes.append('temp b-tree')
+        elif detail.startswith(('SCAN t ', 'SEARCH t ', 'SCAN trips ', 'SEARCH trips ')):
+            match = re.search(r'USING (COVERING )?INDEX (\w+)', detail)
+            if match:
+                notes.append(('covering ' if match.group(1) else '') + match.group(2))
+    return ', '.join(dict.fromkeys(notes)) or 'index lookups'
+
+
+def time_query(conn, sql, repeat):
+    """Best wall time of `repeat` full executions"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor = conn.execute(sql)
+        while cursor.fetchmany(10000):
+            pass
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def existing_indexes(conn):
+    """{name: (table, [columns])} for explicit indexes on the core tables"""
+    indexes = {}
+    rows = conn.execute("""
+        SELECT name, tbl_name FROM sqlite_master
+        WHERE type = 'index' AND tbl_name IN ('trips', 'zones', 'dates') AND sql IS NOT NULL
+    """).fetchall()
+    for name, table in rows:
+        columns = [row[2] for row in conn.execute(f"PRAGMA index_info({name})")]
+        indexes[name] = (table, columns)
+    return indexes
+
+
+def profile(conn, workload, repeat):
+    """[(plan summary, seconds)] for every query in the workload"""
+    return [(plan_summary(explain(conn, sql)), time_query(conn, sql, repeat))
+            for _, sql in workload]
+
+
+def speedup(before, after):
+    """Describe a timing change as 'N.Nx faster' or 'N.Nx slower'"""
+    if not before or not after:
+        return 'n/a'
+    if after <= before:
+        return f"{before / after:.1f}x faster"
+    return f"{after / before:.1f}x slower"
+
+
+def print_profile(workload, before, after=None):
+    for i, (endpoint, sql) in enumerate(workload):
+        plan, seconds = before[i]
+        print(f"\n[{i + 1}] {endpoint}")
+        print(f"    {sql[:110]}{'...' if len(sql) > 110 else ''}")
+        print(f"    before: {seconds * 1000:9.1f} ms  {plan}")
+        if after is not None:
+            plan, new_seconds = after[i]
+            print(f"    after:  {new_seconds * 1000:9.1f} ms  {plan}  "
+                  f"({speedup(seconds, new_seconds)})")
+
+
+def evaluate_candidates(conn, workload, repeat):
+    """Build each candidate in turn and report the queries it speeds up"""
+    current = existing_indexes(conn)
+    baseline = profile(conn, workload, repeat)
+
+    for name, table, columns, why in CANDIDATE_INDEXES:
+        if any(cols == columns for _, cols in current.values()):
+            continue
+        print(f"\nCandidate {table}({', '.join(columns)}): {why}")
+        start = time.perf_counter()
+        conn.execute(index_sql(name, table, columns))
+        print(f"  built in {time.perf_counter() - start:.1f}s")
+
+        for i, (endpoint, sql) in enumerate(workload):
+            plan = plan_summary(explain(conn, sql))
+            if name not in plan:
+                continue
+            seconds = time_query(conn, sql, repeat)
+            old_plan, old_seconds = baseline[i]
+            print(f"  [{i + 1}] {endpoint}: {old_seconds * 1000:.1f} ms -> "
+                  f"{seconds * 1000:.1f} ms ({speedup(old_seconds, seconds)}), "
+                  f"was {old_plan}")
+
+        conn.execute(f"DROP INDEX {name}")
+
+
+def apply_indexes(conn):
+    """Make the database's indexes match INDEXES exactly"""
+    wanted = {name: (table, columns) for name, table, columns in INDEXES}
+    for name, (table, columns) in existing_indexes(conn).items():
+        if wanted.get(name) != (table, columns):
+            print(f"  dropping {name} ON {table}({', '.join(columns)})")
+            conn.execute(f"DROP INDEX {name}")
+
+    present = existing_indexes(conn)
+    for name, table, columns in INDEXES:
+        if name not in present:
+            print(f"  creating {name} ON {table}({', '.join(columns)})")
+            conn.execute(index_sql(name, table, columns))
+    conn.commit()
+
+
+def check_schema_file():
+    """Warn when database_schema.sql lists different indexes than INDEXES"""
+    with open(SCHEMA_SQL) as f:
+        listed = set(re.findall(r'CREATE INDEX IF NOT EXISTS .+?;', f.read()))
+    expected = {index_sql(name, table, columns) + ';'
+                for name, table, columns in INDEXES}
+    for statement in sorted(expected - listed):
+        print(f"  missing from database_schema.sql: {statement}")
+    for statement in sorted(listed - expected):
+        print(f"  not in INDEXES: {statement}")
+    return listed == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--db', default=api.DB_PATH,
+                        help="Database to analyse (default: the API database)")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="Runs per query; the best time is reported")
+    parser.add_argument('--evaluate', action='store_true',
+                        help="Build each candidate index and time the queries it changes")
+    parser.add_argument('--apply', action='store_true',
+                        help="Create and drop indexes so the database matches INDEXES")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Database not found: {args.db}")
+        return 1
+
+    print("Checking database_schema.sql against INDEXES...")
+    if check_schema_file():
+        print("  in sync")
+
+    print("\nCapturing API queries...")
+    workload = capture_workload(args.db)
+    if workload is None:
+        return 1
+    print(f"  {len(workload)} distinct queries on trips")
+
+    conn = sqlite3.connect(args.db)
+    before = profile(conn, workload, args.repeat)
+
+    if args.evaluate:
+        evaluate_candidates(conn, workload, args.repeat)
+
+    if args.apply:
+        print("\nApplying INDEXES...")
+        apply_indexes(conn)
+        print_profile(workload, before, profile(conn, workload, args.repeat))
+        total_before = sum(seconds for _, seconds in before)
+        total_after = sum(seconds for _, seconds in profile(conn, workload, 1))
+        print(f"\nWorkload total: {total_before:.2f}s -> {total_after:.2f}s")
+    else:
+        print_profile(workload, before)
+
+    conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Insights Engine for NYC Taxi Data Explorer
+Data-driven insights from one pickup hour x payment type x borough cube
+"""
+
+import numpy as np
+
+HOURS = 24
+NIGHT_HOURS = slice(0, 6)
+DAY_HOURS = slice(6, 18)
+
+# A (payment type, hour) cell needs this many tipped trips to be compared
+# with the payment type's usual tip, and must differ from it by this much
+TIP_ANOMALY_MIN_TRIPS = 100
+TIP_ANOMALY_THRESHOLD = 0.25
+TIP_ANOMALY_LIMIT = 5
+
+MEASURES = ['trip_count', 'fare_sum', 'fare_n', 'tip_sum', 'tip_n']
+
+CUBE_SUMS = '''
+    SUM(trip_count), SUM(total_amount_sum), SUM(total_amount_n),
+    SUM(tip_percentage_sum), SUM(tip_percentage_n)
+'''
+
+
+def cube_query(rollup):
+    """The one query insights read: the agg_insights rollup or a scan of trips"""
+    if rollup:
+        return f'''
+            SELECT pickup_hour, payment_type_id, borough, {CUBE_SUMS}
+            FROM agg_insights
+            GROUP BY pickup_hour, payment_type_id, borough
+        '''
+    # Grouping by location first keeps the scan on idx_insight_cube, and the
+    # zone lookup then runs once per location instead of once per trip
+    return f'''
+        SELECT c.pickup_hour, c.payment_type_id, z.borough, {CUBE_SUMS}
+        FROM (
+            SELECT pickup_hour, payment_type_id, pickup_location_id,
+                   COUNT(*) AS trip_count,
+                   SUM(total_amount) AS total_amount_sum,
+                   COUNT(total_amount) AS total_amount_n,
+                   SUM(tip_percentage) AS tip_percentage_sum,
+                   COUNT(tip_percentage) AS tip_percentage_n
+            FROM trips
+            GROUP BY pickup_hour, payment_type_id, pickup_location_id
+        ) c
+        LEFT JOIN zones z ON c.pickup_location_id = z.location_id
+        GROUP BY c.pickup_hour, c.payment_type_id, z.borough
+    '''
+
+
+class InsightCube:
+    """Trip count, fare and tip sums per pickup hour x payment type x borough
+
+    Each measure is a dense array indexed [hour, payment type, borough].
+    Trips without a pickup hour or a known borough go in an extra last slot
+    of that axis, so totals over the axis still count them.
+    """
+
+    def __init__(self, rows, payment_names):
+        rows = [tuple(row) for row in rows]
+        self.boroughs = sorted({row[2] for row in rows
+                                if row[2] is not None and row[2] != 'Unknown'})
+        borough_index = {borough: i for i, borough in enumerate(self.boroughs)}
+        self.payment_names = payment_names
+
+        hour = np.array([HOURS if row[0] is None else row[0] for row in rows],
+                        dtype=np.int64)
+        payment = np.array([row[1] or 0 for row in rows], dtype=np.int64)
+        borough = np.array([borough_index.get(row[2], len(self.boroughs))
+                            for row in rows], dtype=np.int64)
+        values = np.array([row[3:] for row in rows], dtype=float)
+        values = np.nan_to_num(values.reshape(-1, len(MEASURES)))
+
+        payment_size = max(payment.tolist() + list(payment_names) + [0]) + 1
+        self.shape = (HOURS + 1, payment_size, len(self.boroughs) + 1)
+        self.measures = {}
+        for position, name in enumerate(MEASURES):
+            cube = np.zeros(self.shape)
+            np.add.at(cube, (hour, payment, borough), values[:, position])
+            self.measures[name] = cube
+
+    def totals(self, *axes):
+        """Each measure summed over every axis except those named
+
+        Axes are 'hour', 'payment' and 'borough'; the result keeps them in
+        that order.
+        """
+        names = ('hour', 'payment', 'borough')
+        drop = tuple(i for i, name in enumerate(names) if name not in axes)
+        return {name: values.sum(axis=drop) for name, values in self.measures.items()}
+
+
+def fetch_insight_cube(cursor, rollup):
+    """Read the cube and the payment type names it is keyed on"""
+    cursor.execute('SELECT payment_type_id, payment_name FROM payment_types')
+    payment_names = {payment_id: name for payment_id, name in cursor.fetchall()}
+    cursor.execute(cube_query(rollup))
+    return InsightCube(cursor.fetchall(), payment_names)
+
+
+def average(total, count):
+    return float(total / count) if count > 0 else None
+
+
+def peak_hours(cube):
+    """Busiest and quietest pickup hours"""
+    counts = cube.totals('hour')['trip_count'][:HOURS]
+    hours = np.nonzero(counts)[0]
+    if not len(hours):
+        return None
+    peak = int(hours[np.argmax(counts[hours])])
+    lowest = int(hours[np.argmin(counts[hours])])
+    return {
+        'peak_hour': peak,
+        'peak_count': int(counts[peak]),
+        'lowest_hour': lowest,
+        'lowest_count': int(counts[lowest]),
+        'ratio': round(float(counts[peak] / counts[lowest]), 1)
+    }
+
+
+def night_fares(cube):
+    """Average fare at night (0-6h) against the day (6-18h)"""
+    by_hour = cube.totals('hour')
+    night_avg = average(by_hour['fare_sum'][NIGHT_HOURS].sum(),
+                        by_hour['fare_n'][NIGHT_HOURS].sum()) or 0
+    day_avg = average(by_hour['fare_sum'][DAY_HOURS].sum(),
+                      by_hour['fare_n'][DAY_HOURS].sum()) or 0
+    premium = (night_avg / day_avg - 1) * 100 if day_avg > 0 else 0
+    return {
+        'night_avg': round(night_avg, 2),
+        'day_avg': round(day_avg, 2),
+        'premium_percent': round(premium, 1)
+    }
+
+
+def payment_methods(cube):
+    """Trip count and share of every trip per payment method"""
+    counts = cube.totals('payment')['trip_count']
+    total = counts.sum()
+    methods = [
+        {
+            'payment_name': name,
+            'trip_count': int(counts[payment_id]),
+            'percentage': round(float(counts[payment_id]) * 100.0 / total, 1)
+        }
+        for payment_id, name in cube.payment_names.items() if counts[payment_id] > 0
+    ]
+    return sorted(methods, key=lambda method: -method['trip_count'])
+
+
+def borough_premium(cube):
+    """Average fare per pickup borough against the citywide average"""
+    by_borough = cube.totals('borough')
+    overall = average(by_borough['fare_sum'].sum(), by_borough['fare_n'].sum())
+    boroughs = []
+    for i, borough in enumerate(cube.boroughs):
+        avg_fare = average(by_borough['fare_sum'][i], by_borough['fare_n'][i])
+        if avg_fare is None or not overall:
+            continue
+        boroughs.append({
+            'borough': borough,
+            'trip_count': int(by_borough['trip_count'][i]),
+            'avg_fare': round(avg_fare, 2),
+            'premium_percent': round((avg_fare / overall - 1) * 100, 1)
+        })
+    return sorted(boroughs, key=lambda entry: -entry['premium_percent'])
+
+
+def tip_anomalies(cube):
+    """Hours whose average tip stands out from the payment method's usual tip"""
+    cells = cube.totals('hour', 'payment')
+    anomalies = []
+    for payment_id, name in cube.payment_names.items():
+        usual = average(cells['tip_sum'][:HOURS, payment_id].sum(),
+                        cells['tip_n'][:HOURS, payment_id].sum())
+        if not usual:
+            continue
+        for hour in range(HOURS):
+            tipped = cells['tip_n'][hour, payment_id]
+            if tipped < TIP_ANOMALY_MIN_TRIPS:
+                continue
+            avg_tip = cells['tip_sum'][hour, payment_id] / tipped
+            deviation = avg_tip / usual - 1
+            if abs(deviation) >= TIP_ANOMALY_THRESHOLD:
+                anomalies.append({
+                    'payment_name': name,
+                    'hour': hour,
+                    'avg_tip_pct': round(float(avg_tip), 2),
+                    'usual_tip_pct': round(usual, 2),
+                    'deviation_percent': round(float(deviation) * 100, 1)
+                })
+    anomalies.sort(key=lambda entry: -abs(entry['deviation_percent']))
+    return anomalies[:TIP_ANOMALY_LIMIT]
+
+
+# Insight name -> builder. Builders only read the cube, so a new insight
+# type adds no query.
+INSIGHT_BUILDERS = {
+    'peak_hours': peak_hours,
+    'night_fares': night_fares,
+    'payment_methods': payment_methods,
+    'borough_premium': borough_premium,
+    'tip_anomalies': tip_anomalies
+}
+
+
+def build_insights(cube, names=None):
+    """{name: insight} for the named insight types, or all of them"""
+    return {name: INSIGHT_BUILDERS[name](cube) for name in names or INSIGHT_BUILDERS}
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Load Test for NYC Taxi Data Explorer
+Starts serve.py with increasing worker counts and measures throughput under concurrent clients
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import http.client
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+# Mix of requests each client cycles through
+URL_MIX = [
+    '/api/dashboard',
+    '/api/stats/hourly',
+    '/api/routes/top?limit=8',
+    '/api/insights',
+    '/api/trips?limit=100',
+    '/api/trips?min_fare=50&limit=100',
+    '/api/trips/ranked?rank_by=fare&order=desc&limit=100',
+    '/api/aggregate?group_by=hour,payment&measures=count,avg_fare'
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, workers, threads, db_path, cache):
+    """Launch serve.py and wait until /api/health answers"""
+    env = dict(os.environ, TAXI_CACHE_ENABLED='1' if cache else '0')
+    if db_path:
+        env['TAXI_DB_PATH'] = db_path
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                      'serve.py'),
+         '--bind', f"127.0.0.1:{port}", '--workers', str(workers),
+         '--threads', str(threads)],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"serve.py exited with status {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/api/health')
+            if conn.getresponse().status == 200:
+                conn.close()
+                return server
+        except OSError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("serve.py did not become ready")
+
+
+def stop_server(server):
+    """SIGTERM, letting gunicorn finish in-flight requests"""
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+def client(port, duration, offset):
+    """Issue requests on one keep-alive connection until duration passes"""
+    latencies = []
+    errors = 0
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    end = time.perf_counter() + duration
+    index = offset
+    while time.perf_counter() < end:
+        url = URL_MIX[index % len(URL_MIX)]
+        index += 1
+        start = time.perf_counter()
+        try:
+            conn.request('GET', url)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    return latencies, errors
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_load(port, concurrency, duration):
+    """Requests per second and latencies from `concurrency` client processes"""
+    with ProcessPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(client, port, duration, i) for i in range(concurrency)]
+        results = [future.result() for future in futures]
+    latencies = [latency for result, _ in results for latency in result]
+    errors = sum(errors for _, errors in results)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': len(latencies) / duration,
+        'p50_ms': percentile(latencies, 0.5) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--workers', default='1,2,4',
+                        help="Comma-separated worker counts to test (default: 1,2,4)")
+    parser.add_argument('--threads', type=int, default=2,
+                        help="Threads per worker (default: 2)")
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help="Concurrent client processes (default: 8)")
+    parser.add_argument('--duration', type=float, default=10,
+                        help="Seconds of load per worker count (default: 10)")
+    parser.add_argument('--db', help="Database to serve (default: the API's)")
+    parser.add_argument('--cache', action='store_true',
+                        help="Keep the response cache on; by default every "
+                             "request does its full work")
+    args = parser.parse_args()
+
+    worker_counts = [int(count) for count in args.workers.split(',')]
+    print(f"{args.concurrency} clients x {args.duration:.0f}s, {args.threads} "
+          f"thread(s) per worker, cache {'on' if args.cache else 'off'}, "
+          f"{os.cpu_count()} CPU(s)")
+    print(f"{'workers':>8} {'req/s':>10} {'p50 ms':>10} {'p99 ms':>10} "
+          f"{'errors':>8} {'speedup':>8}")
+    print("-" * 60)
+
+    first = None
+    for workers in worker_counts:
+        port = free_port()
+        server = start_server(port, workers, args.threads, args.db, args.cache)
+        try:
+            result = run_load(port, args.concurrency, args.duration)
+        finally:
+            stop_server(server)
+        first = first or result['rps']
+        print(f"{workers:>8} {result['rps']:>10.1f} {result['p50_ms']:>10.1f} "
+              f"{result['p99_ms']:>10.1f} {result['errors']:>8} "
+              f"{result['rps'] / first:>7.2f}x")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Metrics Registry for NYC Taxi Data Explorer
+Thread-safe counters and histograms rendered in the Prometheus text format
+"""
+
+import bisect
+import math
+import threading
+
+# Upper bounds (seconds) for request, SQL and serialization timings
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+# Upper bounds for row and step counts
+COUNT_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000, 10000000, 100000000)
+
+
+def _label_text(names, values):
+    """{name="value",...} with Prometheus escaping, or '' without labels"""
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _number(value):
+    """Sample value as Prometheus prints it"""
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, one series per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        """[(suffix, label names, label values, value)] for rendering"""
+        with self._lock:
+            items = sorted(self._values.items())
+        return [('', self.labels, values, value) for values, value in items]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label combination
+
+    quantile() interpolates within buckets the same way Prometheus'
+    histogram_quantile() does, so percentiles can be read without a server.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts incl. +Inf, sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def series(self):
+        """{label values: (cumulative bucket counts, sum, count)}"""
+        with self._lock:
+            items = {values: (list(counts), total, count)
+                     for values, (counts, total, count) in self._series.items()}
+        result = {}
+        for values, (counts, total, count) in items.items():
+            running = 0
+            cumulative = []
+            for bucket_count in counts:
+                running += bucket_count
+                cumulative.append(running)
+            result[values] = (cumulative, total, count)
+        return result
+
+    def quantile(self, q, *label_values):
+        """Estimated q-quantile (0-1) of one series, or None if it is empty"""
+        series = self.series().get(label_values)
+        if series is None or series[2] == 0:
+            return None
+        cumulative, _, count = series
+        rank = q * count
+        index = bisect.bisect_left(cumulative, rank)
+        if index >= len(self.buckets):
+            # Beyond the last finite bucket: report its bound
+            return self.buckets[-1]
+        upper = self.buckets[index]
+        lower = self.buckets[index - 1] if index > 0 else 0.0
+        below = cumulative[index - 1] if index > 0 else 0
+        in_bucket = cumulative[index] - below
+        if in_bucket == 0:
+            return upper
+        return lower + (upper - lower) * (rank - below) / in_bucket
+
+    def samples(self):
+        """[(suffix, label names, label values, value)] for rendering"""
+        samples = []
+        bounds = [_number(bound) for bound in self.buckets] + ['+Inf']
+        for values, (cumulative, total, count) in sorted(self.series().items()):
+            for bound, running in zip(bounds, cumulative):
+                samples.append(('_bucket', self.labels + ('le',),
+                                values + (bound,), running))
+            samples.append(('_sum', self.labels, values, total))
+            samples.append(('_count', self.labels, values, count))
+        return samples
+
+
+class MetricsRegistry:
+    """Named collection of metrics with a Prometheus text exposition"""
+
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        """Every metric in the Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, names, values, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_label_text(names, values)} "
+                             f"{_number(value)}")
+        return '\n'.join(lines) + '\n'
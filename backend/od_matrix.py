@@ -0,0 +1,208 @@
+"""
+Origin-Destination Matrix for NYC Taxi Data Explorer
+Dense NumPy cubes of trips per zone pair, built from the agg_od rollup
+"""
+
+import threading
+
+import numpy as np
+
+from stats_queries import dict_from_row
+
+HOURS = 24
+
+ROUTE_ZONE_FILTER = '''
+    z1.zone IS NOT NULL AND z2.zone IS NOT NULL
+    AND z1.zone != 'Unknown' AND z2.zone != 'Unknown'
+'''
+
+
+class ODMatrix:
+    """Trip count, fare sum and distance sum per pickup x dropoff location
+
+    Cubes are indexed [hour or payment type, pickup location, dropoff location],
+    so a filter on hour or payment type is a single slice.
+    """
+
+    def __init__(self, zones, od_rows):
+        location_ids = [location_id for location_id, _, _ in zones]
+        size = max(location_ids + [int(od_rows[:, :2].max()) if len(od_rows) else 0]) + 1
+        payment_size = int(od_rows[:, 3].max()) + 1 if len(od_rows) else 1
+
+        # Routes are grouped by zone name, and a few names span several ids
+        self.zone_names = sorted({zone for _, zone, _ in zones
+                                  if zone is not None and zone != 'Unknown'})
+        name_index = {zone: i for i, zone in enumerate(self.zone_names)}
+        self.location_name = np.full(size, -1, dtype=np.int64)
+        self.location_borough = np.full(size, None, dtype=object)
+        for location_id, zone, borough in zones:
+            self.location_name[location_id] = name_index.get(zone, -1)
+            self.location_borough[location_id] = borough
+
+        pickup = od_rows[:, 0].astype(np.int64)
+        dropoff = od_rows[:, 1].astype(np.int64)
+        hour = od_rows[:, 2]
+        payment = od_rows[:, 3].astype(np.int64)
+        measures = {
+            'trip_count': od_rows[:, 4],
+            'fare_sum': od_rows[:, 5],
+            'distance_sum': od_rows[:, 6]
+        }
+
+        self.by_payment = {}
+        self.by_hour = {}
+        has_hour = ~np.isnan(hour)
+        hour = np.nan_to_num(hour, nan=0).astype(np.int64)
+        for name, values in measures.items():
+            cube = np.zeros((payment_size, size, size))
+            np.add.at(cube, (payment, pickup, dropoff), values)
+            self.by_payment[name] = cube
+
+            cube = np.zeros((HOURS, size, size))
+            np.add.at(cube, (hour[has_hour], pickup[has_hour], dropoff[has_hour]),
+                      values[has_hour])
+            self.by_hour[name] = cube
+
+        # Every trip has a payment type, so this is the unfiltered matrix
+        self.total = {name: cube.sum(axis=0) for name, cube in self.by_payment.items()}
+
+    def _projection(self, borough):
+        """Location x zone-name 0/1 matrix, limited to one borough if given"""
+        keep = self.location_name >= 0
+        if borough:
+            keep &= self.location_borough == borough
+        projection = np.zeros((len(self.location_name), len(self.zone_names)))
+        locations = np.nonzero(keep)[0]
+        projection[locations, self.location_name[locations]] = 1.0
+        return projection
+
+    def top_routes(self, limit, pickup_borough=None, dropoff_borough=None,
+                   hour=None, payment_type=None):
+        """Top routes by trip count, with at most one of hour / payment_type"""
+        if hour is not None:
+            in_range = 0 <= hour < HOURS
+            matrices = {name: cube[hour] if in_range else np.zeros_like(cube[0])
+                        for name, cube in self.by_hour.items()}
+        elif payment_type is not None:
+            in_range = 0 <= payment_type < len(self.by_payment['trip_count'])
+            matrices = {name: cube[payment_type] if in_range else np.zeros_like(cube[0])
+                        for name, cube in self.by_payment.items()}
+        else:
+            matrices = self.total
+
+        origins = self._projection(pickup_borough)
+        destinations = self._projection(dropoff_borough)
+        by_name = {name: origins.T @ matrix @ destinations
+                   for name, matrix in matrices.items()}
+
+        counts = by_name['trip_count'].ravel()
+        k = min(limit, int(np.count_nonzero(counts)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-counts, k - 1)[:k]
+        # Highest count first; ties in zone-name order
+        top = top[np.lexsort((top, -counts[top]))]
+
+        routes = []
+        for cell in top:
+            pickup, dropoff = divmod(int(cell), len(self.zone_names))
+            trip_count = by_name['trip_count'][pickup, dropoff]
+            routes.append({
+                'pickup_zone': self.zone_names[pickup],
+                'dropoff_zone': self.zone_names[dropoff],
+                'trip_count': int(round(trip_count)),
+                'avg_fare': float(by_name['fare_sum'][pickup, dropoff] / trip_count),
+                'avg_distance': float(by_name['distance_sum'][pickup, dropoff] / trip_count)
+            })
+        return routes
+
+
+def load_od_matrix(cursor):
+    """Build an ODMatrix from the zones table and the agg_od rollup"""
+    cursor.execute("SELECT location_id, zone, borough FROM zones")
+    zones = [tuple(row) for row in cursor.fetchall()]
+    cursor.execute('''
+        SELECT pickup_location_id, dropoff_location_id, pickup_hour,
+               payment_type_id, trip_count, total_amount_sum, trip_distance_sum
+        FROM agg_od
+    ''')
+    od_rows = np.array(cursor.fetchall(), dtype=float).reshape(-1, 7)
+    return ODMatrix(zones, od_rows)
+
+
+_cache = {'version': None, 'matrix': None}
+_cache_lock = threading.Lock()
+
+
+def get_od_matrix(cursor, version):
+    """Return the in-memory matrix, rebuilding it when the dataset version changes"""
+    with _cache_lock:
+        if _cache['matrix'] is None or _cache['version'] != version:
+            _cache['matrix'] = load_od_matrix(cursor)
+            _cache['version'] = version
+        return _cache['matrix']
+
+
+def _route_filters(prefix, pickup_borough, dropoff_borough, hour, payment_type):
+    """Extra WHERE terms and parameters for the SQL route queries"""
+    sql = ''
+    params = []
+    if pickup_borough:
+        sql += ' AND z1.borough = ?'
+        params.append(pickup_borough)
+    if dropoff_borough:
+        sql += ' AND z2.borough = ?'
+        params.append(dropoff_borough)
+    if hour is not None:
+        sql += f' AND {prefix}.pickup_hour = ?'
+        params.append(hour)
+    if payment_type is not None:
+        sql += f' AND {prefix}.payment_type_id = ?'
+        params.append(payment_type)
+    return sql, params
+
+
+def fetch_top_routes_rollup(cursor, limit, pickup_borough=None,
+                            dropoff_borough=None, hour=None, payment_type=None):
+    """Top routes from agg_od in SQL, for filter combinations the cubes lack"""
+    filters, params = _route_filters('a', pickup_borough, dropoff_borough,
+                                     hour, payment_type)
+    cursor.execute(f'''
+        SELECT
+            z1.zone as pickup_zone,
+            z2.zone as dropoff_zone,
+            SUM(a.trip_count) as trip_count,
+            SUM(a.total_amount_sum) / SUM(a.total_amount_n) as avg_fare,
+            SUM(a.trip_distance_sum) / SUM(a.trip_distance_n) as avg_distance
+        FROM agg_od a
+        JOIN zones z1 ON a.pickup_location_id = z1.location_id
+        JOIN zones z2 ON a.dropoff_location_id = z2.location_id
+        WHERE {ROUTE_ZONE_FILTER} {filters}
+        GROUP BY z1.zone, z2.zone
+        ORDER BY trip_count DESC
+        LIMIT ?
+    ''', params + [limit])
+    return [dict_from_row(row) for row in cursor.fetchall()]
+
+
+def fetch_top_routes_live(cursor, limit, pickup_borough=None,
+                          dropoff_borough=None, hour=None, payment_type=None):
+    """Top routes straight from trips"""
+    filters, params = _route_filters('t', pickup_borough, dropoff_borough,
+                                     hour, payment_type)
+    cursor.execute(f'''
+        SELECT
+            z1.zone as pickup_zone,
+            z2.zone as dropoff_zone,
+            COUNT(*) as trip_count,
+            AVG(t.total_amount) as avg_fare,
+            AVG(t.trip_distance) as avg_distance
+        FROM trips t
+        JOIN zones z1 ON t.pickup_location_id = z1.location_id
+        JOIN zones z2 ON t.dropoff_location_id = z2.location_id
+        WHERE {ROUTE_ZONE_FILTER} {filters}
+        GROUP BY z1.zone, z2.zone
+        ORDER BY trip_count DESC
+        LIMIT ?
+    ''', params + [limit])
+    return [dict_from_row(row) for row in cursor.fetchall()]
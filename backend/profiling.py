@@ -0,0 +1,245 @@
+"""
+Query Profiling for NYC Taxi Data Explorer
+Times every SQL statement a request runs and logs slow ones with their plans
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# SQLite virtual machine instructions between progress callbacks; steps are
+# counted in these units
+STEP_INTERVAL = 1000
+
+
+class RequestProfile:
+    """SQL statements, serialization and compression time for one request"""
+
+    def __init__(self):
+        self.statements = []
+        self.serialize_seconds = 0.0
+        self.compress_seconds = 0.0
+
+    def add(self, statement):
+        self.statements.append(statement)
+
+    @property
+    def sql_seconds(self):
+        return sum(statement['seconds'] for statement in self.statements)
+
+    @property
+    def rows_returned(self):
+        return sum(statement['rows'] for statement in self.statements)
+
+    @property
+    def steps(self):
+        return sum(statement['steps'] for statement in self.statements)
+
+
+class SlowQueryLog:
+    """Statements slower than a threshold, with their EXPLAIN QUERY PLAN
+
+    The most recent entries are kept in memory; each is also appended to a
+    JSON-lines file when a path is given, or printed otherwise.
+    """
+
+    def __init__(self, threshold_ms, path=None, keep=50):
+        self.threshold_ms = threshold_ms
+        self.path = path
+        self._recent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+
+    def is_slow(self, statement):
+        return statement['seconds'] * 1000 >= self.threshold_ms
+
+    def record(self, route, statement, plan):
+        entry = {
+            'logged_at': datetime.now().isoformat(timespec='seconds'),
+            'route': route,
+            'sql': re.sub(r'\s+', ' ', statement['sql']).strip(),
+            'params': statement['params'],
+            'elapsed_ms': round(statement['seconds'] * 1000, 2),
+            'rows': statement['rows'],
+            'steps': statement['steps'],
+            'plan': plan
+        }
+        with self._lock:
+            self._recent.append(entry)
+            if self.path:
+                with open(self.path, 'a') as f:
+                    f.write(json.dumps(entry, default=str) + '\n')
+        if not self.path:
+            print(f"Slow query on {route} ({entry['elapsed_ms']} ms): "
+                  f"{entry['sql']}\n  " + '\n  '.join(plan))
+
+    def recent(self):
+        with self._lock:
+            return list(self._recent)
+
+
+def explain(conn, sql, params):
+    """EXPLAIN QUERY PLAN output as indented detail lines"""
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except sqlite3.Error as e:
+        return [f"plan unavailable: {e}"]
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node_id] + detail)
+    return lines
+
+
+class ProfiledConnection:
+    """Connection wrapper that records each statement into a RequestProfile
+
+    Time is the wall time spent inside execute and fetch calls, rows are the
+    rows handed back, and steps count SQLite VM instructions (a proxy for
+    rows scanned) through a progress handler. Handlers set by callers, such
+    as query deadlines, are chained behind it.
+    """
+
+    def __init__(self, conn, profile, route=None, slow_log=None):
+        self._conn = conn
+        self._profile = profile
+        self._route = route
+        self._slow_log = slow_log
+        self._open = []
+        self._current = None
+        self._handler = None
+        self._handler_every = 1
+        self._ticks = 0
+        conn.set_progress_handler(self._on_progress, STEP_INTERVAL)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def _on_progress(self):
+        if self._current is not None:
+            self._current['steps'] += STEP_INTERVAL
+        if self._handler is None:
+            return 0
+        self._ticks += 1
+        if self._ticks % self._handler_every:
+            return 0
+        return self._handler()
+
+    def set_progress_handler(self, handler, n):
+        """Chain a caller's handler, called about every n instructions"""
+        self._handler = handler
+        self._handler_every = max(1, round(n / STEP_INTERVAL))
+        self._ticks = 0
+
+    def cursor(self):
+        return ProfiledCursor(self, self._conn.cursor())
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def _start(self, sql, params):
+        statement = {'sql': sql, 'params': params, 'seconds': 0.0,
+                     'rows': 0, 'steps': 0}
+        self._open.append(statement)
+        return statement
+
+    def _timed(self, statement, call, *args):
+        self._current = statement
+        start = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            statement['seconds'] += time.perf_counter() - start
+            self._current = None
+
+    def _finish(self, statement):
+        remaining = [entry for entry in self._open if entry is not statement]
+        if len(remaining) == len(self._open):
+            return
+        self._open = remaining
+        self._profile.add(statement)
+        if self._slow_log is not None and self._slow_log.is_slow(statement):
+            plan = explain(self._conn, statement['sql'], statement['params'])
+            self._slow_log.record(self._route, statement, plan)
+
+    def close(self):
+        """Record unfinished statements and hand the connection back"""
+        if self.closed:
+            return
+        for statement in list(self._open):
+            self._finish(statement)
+        self._conn.set_progress_handler(None, 0)
+        self._conn.close()
+
+
+class ProfiledCursor:
+    """Cursor wrapper feeding one statement at a time to its ProfiledConnection"""
+
+    def __init__(self, owner, cursor):
+        self._owner = owner
+        self._cursor = cursor
+        self._statement = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _done(self):
+        if self._statement is not None:
+            self._owner._finish(self._statement)
+            self._statement = None
+
+    def execute(self, sql, params=()):
+        self._done()
+        self._statement = self._owner._start(sql, params)
+        try:
+            self._owner._timed(self._statement, self._cursor.execute, sql, params)
+        except sqlite3.Error:
+            self._done()
+            raise
+        return self
+
+    def _fetch(self, call, *args):
+        if self._statement is None:
+            return call(*args)
+        return self._owner._timed(self._statement, call, *args)
+
+    def fetchone(self):
+        row = self._fetch(self._cursor.fetchone)
+        if row is None:
+            self._done()
+        elif self._statement is not None:
+            self._statement['rows'] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        size = self._cursor.arraysize if size is None else size
+        rows = self._fetch(self._cursor.fetchmany, size)
+        if self._statement is not None:
+            self._statement['rows'] += len(rows)
+            if len(rows) < size:
+                self._done()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(self._cursor.fetchall)
+        if self._statement is not None:
+            self._statement['rows'] += len(rows)
+            self._done()
+        return rows
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def close(self):
+        self._done()
+        self._cursor.close()
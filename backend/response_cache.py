@@ -0,0 +1,108 @@
+"""
+Response Cache for NYC Taxi Data Explorer
+In-process LRU/TTL cache of API responses, invalidated by dataset version
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachedResponse:
+    """A cached response body with its validator
+
+    encoded holds the body compressed per content coding, filled in the
+    first time a client asks for each one.
+    """
+
+    __slots__ = ('body', 'mimetype', 'etag', 'expires_at', 'encoded')
+
+    def __init__(self, body, mimetype, etag, expires_at):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = etag
+        self.expires_at = expires_at
+        self.encoded = {}
+
+
+class ResponseCache:
+    """Thread-safe LRU cache with a TTL, cleared when the dataset version changes"""
+
+    def __init__(self, max_entries=256, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = None
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+
+    @staticmethod
+    def make_key(path, args):
+        """Build a cache key from the route and normalized query arguments"""
+        return (path, tuple(sorted(args)))
+
+    def _check_version(self, version):
+        # Caller holds the lock
+        if version != self.version:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+            self.version = version
+
+    def get(self, key, version):
+        """Return the cached response for key, or None on a miss"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats['expirations'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry
+
+    def put(self, key, version, body, mimetype):
+        """Store a response body and return the cache entry"""
+        etag = hashlib.sha1(f"{version}:".encode() + body).hexdigest()
+        entry = CachedResponse(body, mimetype, etag,
+                               time.monotonic() + self.ttl)
+        with self._lock:
+            self._check_version(version)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+        return entry
+
+    def clear(self):
+        """Drop every cached response"""
+        with self._lock:
+            if self._entries:
+                self._stats['invalidations'] += 1
+            self._entries.clear()
+
+    def stats(self):
+        """Return hit/miss/eviction counters and current size"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        stats['max_entries'] = self.max_entries
+        stats['ttl'] = self.ttl
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['dataset_version'] = self.version
+        return stats
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Sample Coverage Check for NYC Taxi Data Explorer
+Counts how often the ?approx=true 95% intervals contain the exact live values
+"""
+
+from database import SAMPLE_TABLES
+from sampling import SECTION_SPECS, approx_sections
+from stats_queries import SECTION_FETCHERS
+import app as api
+import argparse
+import sqlite3
+import sys
+
+# Rounded counts are compared to within half a trip of their interval
+ROUNDING = 0.5
+
+
+def rows_by_label(payload):
+    """{label: row} for a list section, {None: row} for statistics"""
+    if isinstance(payload, dict):
+        return {None: payload}
+    return {next(iter(row.values())): row for row in payload}
+
+
+def coverage(cursor, table):
+    """(covered, checked, [misses]) over every estimated field of a sample"""
+    sections = list(SECTION_SPECS)
+    estimates = approx_sections(cursor, table, sections)
+    covered = checked = 0
+    misses = []
+    for section in sections:
+        exact_rows = rows_by_label(SECTION_FETCHERS[section](cursor, False))
+        for label, row in rows_by_label(estimates[section]).items():
+            exact = exact_rows.get(label)
+            if exact is None:
+                continue
+            for field, value in row.items():
+                error = row.get(f"{field}_error")
+                if error is None or value is None or exact.get(field) is None:
+                    continue
+                checked += 1
+                if abs(value - exact[field]) <= error + ROUNDING:
+                    covered += 1
+                else:
+                    misses.append((section, label, field, value, error, exact[field]))
+    return covered, checked, misses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--db', default=api.DB_PATH, help="Database with samples")
+    parser.add_argument('--min-coverage', type=float, default=0.9,
+                        help="Lowest share of intervals that must contain the "
+                             "exact value (default: 0.9)")
+    parser.add_argument('--verbose', action='store_true',
+                        help="List every interval that missed")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    failed = False
+    for table, rate in SAMPLE_TABLES.items():
+        covered, checked, misses = coverage(cursor, table)
+        share = covered / checked if checked else 0.0
+        status = 'ok' if share >= args.min_coverage else 'LOW'
+        print(f"{table} ({rate}%): {covered}/{checked} intervals contain the "
+              f"exact value ({share:.0%}) {status}")
+        if args.verbose:
+            for section, label, field, value, error, exact in misses:
+                print(f"  {section} {label} {field}: {value:.2f} +/- {error:.2f}, "
+                      f"exact {exact:.2f}")
+        failed = failed or share < args.min_coverage
+    conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Approximate Statistics for NYC Taxi Data Explorer
+Stratified-sample estimates with 95% confidence intervals for ?approx=true
+"""
+
+import math
+
+from database import DISTANCE_BUCKETS, FARE_BUCKETS, SAMPLE_TABLES, bucket_case
+from stats_queries import DAY_NAMES
+
+# Normal quantile for a two-sided 95% interval
+Z_95 = 1.96
+
+COUNT = ('trip_count', 'count', None)
+AVG_FARE = ('avg_fare', 'avg', 'total_amount')
+AVG_DISTANCE = ('avg_distance', 'avg', 'trip_distance')
+AVG_DURATION = ('avg_duration', 'avg', 'trip_duration_minutes')
+REVENUE = ('total_revenue', 'sum', 'total_amount')
+
+# Section -> (group expression or None, filter or None, [(field, estimator,
+# column)]), mirroring the live queries in stats_queries.py
+SECTION_SPECS = {
+    'statistics': (None, None, [
+        ('total_trips', 'count', None),
+        REVENUE,
+        AVG_DISTANCE,
+        AVG_FARE,
+        AVG_DURATION,
+        ('total_passengers', 'sum', 'passenger_count'),
+        ('avg_passengers', 'avg', 'passenger_count'),
+        ('avg_tip_percentage', 'avg', 'tip_percentage')]),
+    'hourly': ('pickup_hour', 'pickup_hour IS NOT NULL', [
+        COUNT, AVG_FARE, AVG_DISTANCE, AVG_DURATION,
+        ('avg_tip_percentage', 'avg', 'tip_percentage')]),
+    'borough': ('borough', "borough IS NOT NULL AND borough != 'Unknown'", [
+        COUNT, AVG_FARE, AVG_DISTANCE, AVG_DURATION]),
+    'payment': ('payment_type_id', None, [COUNT, AVG_FARE]),
+    'distance_distribution': (
+        bucket_case('trip_distance', DISTANCE_BUCKETS, False), None, [COUNT]),
+    'fare_distribution': (
+        bucket_case('total_amount', FARE_BUCKETS, False), None, [COUNT]),
+    'day_of_week': ('pickup_dow', None, [COUNT, REVENUE, AVG_FARE]),
+    'weekly_trend': ('week_of_month', None, [COUNT, REVENUE])
+}
+
+
+def sample_table(percent):
+    """Sample table for a rate in percent; raises ValueError for unknown rates"""
+    for table, rate in SAMPLE_TABLES.items():
+        if rate == percent:
+            return table
+    raise ValueError(f"No {percent}% sample; choose from "
+                     f"{', '.join(str(rate) for rate in SAMPLE_TABLES.values())}")
+
+
+def sample_info(cursor, table):
+    """Description of the sample serving a request, or None if it is missing"""
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    if cursor.fetchone() is None:
+        return None
+    cursor.execute(f"SELECT MAX(rowid) FROM {table}")
+    return {
+        'table': table,
+        'rate_percent': SAMPLE_TABLES[table],
+        'rows': cursor.fetchone()[0] or 0,
+        'confidence': 0.95
+    }
+
+
+def _variance_term(stratum_rows, sample_rows, total, total_squares):
+    """N^2 (1 - n/N) s^2 / n for one stratum, given sum and sum of squares"""
+    if sample_rows < 2:
+        return 0.0
+    s2 = (total_squares - total * total / sample_rows) / (sample_rows - 1)
+    return (stratum_rows ** 2 * (1 - sample_rows / stratum_rows)
+            * max(s2, 0.0) / sample_rows)
+
+
+def estimate_groups(cursor, table, group, where, fields):
+    """{group: {field: value, field_error: 95% half-width}} from one sample
+
+    Counts and sums use the stratified expansion estimator; averages are
+    ratio estimators with linearized variance. NULL measures are skipped, as
+    in SQL.
+    """
+    columns = []
+    for _, _, column in fields:
+        if column and column not in columns:
+            columns.append(column)
+
+    select = [f"{group or 0} AS g", "MAX(stratum_rows)", "MAX(stratum_sample)",
+              "COUNT(*)"]
+    for column in columns:
+        select += [f"SUM({column})", f"SUM({column} * {column})", f"COUNT({column})"]
+    sql = f"SELECT {', '.join(select)} FROM {table}"
+    if where:
+        sql += f" WHERE {where}"
+    sql += " GROUP BY g, pickup_hour, borough"
+    cursor.execute(sql)
+
+    # group -> [(N, n, count, {column: (sum, sum of squares, non-null)})]
+    strata = {}
+    for row in cursor.fetchall():
+        sums = {column: tuple(row[4 + 3 * i:7 + 3 * i])
+                for i, column in enumerate(columns)}
+        strata.setdefault(row[0], []).append((row[1], row[2], row[3], sums))
+
+    estimates = {}
+    for key, rows in strata.items():
+        result = {}
+        for field, estimator, column in fields:
+            value = variance = 0.0
+            if estimator == 'count':
+                for N, n, count, _ in rows:
+                    value += N / n * count
+                    variance += _variance_term(N, n, count, count)
+            elif estimator == 'sum':
+                for N, n, _, sums in rows:
+                    total, squares, _ = sums[column]
+                    value += N / n * (total or 0)
+                    variance += _variance_term(N, n, total or 0, squares or 0)
+            else:
+                weighted = sum(N / n * (sums[column][0] or 0) for N, n, _, sums in rows)
+                present = sum(N / n * sums[column][2] for N, n, _, sums in rows)
+                if not present:
+                    result[field] = result[f"{field}_error"] = None
+                    continue
+                value = weighted / present
+                for N, n, _, sums in rows:
+                    total, squares, non_null = sums[column]
+                    total, squares = total or 0, squares or 0
+                    # Residuals d = x - R over the group's rows in this stratum
+                    d_sum = total - value * non_null
+                    d_squares = squares - 2 * value * total + value * value * non_null
+                    variance += _variance_term(N, n, d_sum, d_squares)
+                variance /= present * present
+            result[field] = value
+            result[f"{field}_error"] = Z_95 * math.sqrt(variance)
+        estimates[key] = result
+    return estimates
+
+
+def _rounded(row, fields):
+    """Round estimated counts to integers, as the exact endpoints return them"""
+    for field in fields:
+        if row.get(field) is not None:
+            row[field] = int(round(row[field]))
+    return row
+
+
+def _label(section, key, payment_names):
+    """Leading label fields of one estimated row"""
+    if section == 'hourly':
+        return {'pickup_hour': key}
+    if section == 'borough':
+        return {'borough': key}
+    if section == 'payment':
+        return {'payment_name': payment_names[key]}
+    if section == 'distance_distribution':
+        return {'distance_range': DISTANCE_BUCKETS[key - 1][1]}
+    if section == 'fare_distribution':
+        return {'fare_range': FARE_BUCKETS[key - 1][1]}
+    if section == 'day_of_week':
+        return {'pickup_day_of_week': DAY_NAMES[key]}
+    return {'week': f"Week {key}"}
+
+
+def approx_sections(cursor, table, sections):
+    """Estimated dashboard sections in the /api/stats/* payload shapes"""
+    cursor.execute("SELECT payment_type_id, payment_name FROM payment_types")
+    payment_names = dict(cursor.fetchall())
+
+    payload = {}
+    for section in sections:
+        group, where, fields = SECTION_SPECS[section]
+        groups = estimate_groups(cursor, table, group, where, fields)
+
+        if section == 'statistics':
+            stats = groups.get(0) or {field: 0 for field, _, _ in fields}
+            payload[section] = _rounded(dict(stats), ['total_trips', 'total_passengers'])
+            continue
+
+        if section == 'payment':
+            groups = {key: values for key, values in groups.items()
+                      if key in payment_names}
+        rows = [(key, {**_label(section, key, payment_names),
+                       **_rounded(dict(values), ['trip_count'])})
+                for key, values in groups.items()]
+
+        # Same order as the exact endpoints
+        if section in ('borough', 'payment'):
+            rows.sort(key=lambda item: -item[1]['trip_count'])
+        elif section == 'day_of_week':
+            rows.sort(key=lambda item: (item[0] + 6) % 7)
+        else:
+            rows.sort(key=lambda item: item[0])
+        payload[section] = [row for _, row in rows]
+    return payload
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Production Server for NYC Taxi Data Explorer
+Runs the API under gunicorn with pre-forked workers and warm caches
+"""
+
+from gunicorn.app.base import BaseApplication
+import app as api
+from column_store import MANIFEST
+from database import AGGREGATE_TABLES
+from db_pool import PoolTimeout
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+# Requests the frontend makes on load; answering them before the workers are
+# forked fills the response cache, the OD matrix and the column store handles
+# once, and every worker inherits them copy-on-write
+WARM_URLS = [
+    '/api/dashboard',
+    '/api/stats',
+    '/api/stats/hourly',
+    '/api/stats/borough',
+    '/api/stats/payment',
+    '/api/stats/distance-distribution',
+    '/api/stats/fare-distribution',
+    '/api/stats/day-of-week',
+    '/api/stats/weekly-trend',
+    '/api/routes/top?limit=8',
+    '/api/insights',
+    '/api/trips?limit=100',
+    '/api/trips/ranked?rank_by=fare&order=desc&limit=100'
+]
+
+# Small lookup tables read into each connection's page cache with the rollups
+WARM_TABLES = ['zones', 'payment_types', 'dataset_version']
+
+READ_BLOCK = 16 * 1024 * 1024
+
+
+def warm_page_cache():
+    """Read the database (and column store) files once so the OS caches them"""
+    paths = [api.DB_PATH, f"{api.DB_PATH}-wal"]
+    if api.ANALYTICS_BACKEND == 'columns' and os.path.isdir(api.COLUMN_STORE_PATH):
+        paths += [os.path.join(api.COLUMN_STORE_PATH, name)
+                  for name in sorted(os.listdir(api.COLUMN_STORE_PATH))
+                  if name.endswith('.npy') or name == MANIFEST]
+
+    total = 0
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'rb', buffering=0) as f:
+            while True:
+                block = f.read(READ_BLOCK)
+                if not block:
+                    break
+                total += len(block)
+    return total
+
+
+def warm_responses():
+    """Serve WARM_URLS in this process; returns how many succeeded"""
+    metrics_enabled = api.METRICS_ENABLED
+    # Warm-up traffic is not real traffic
+    api.METRICS_ENABLED = False
+    try:
+        client = api.app.test_client()
+        ok = 0
+        for url in WARM_URLS:
+            response = client.get(url)
+            response.get_data()
+            if response.status_code == 200:
+                ok += 1
+            else:
+                print(f"  Warm-up request {url} returned {response.status_code}")
+        return ok
+    finally:
+        api.METRICS_ENABLED = metrics_enabled
+
+
+def close_pool():
+    """Close the process's connection pool so it is not carried across fork"""
+    with api._pool_lock:
+        if api._pool is not None:
+            api._pool.close_all()
+            api._pool = None
+
+
+def warm_pool():
+    """Open every pooled connection and read the rollups into its page cache"""
+    pool = api.get_pool()
+    conns = [pool.acquire() for _ in range(pool.size)]
+    try:
+        for conn in conns:
+            tables = {row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table in list(AGGREGATE_TABLES) + WARM_TABLES:
+                if table in tables:
+                    for _ in conn.execute(f"SELECT * FROM {table}"):
+                        pass
+    finally:
+        for conn in conns:
+            conn.close()
+    return len(conns)
+
+
+def post_fork(server, worker):
+    """Give each worker its own warm connection pool"""
+    # Only the pool object could have come from the master; its connections
+    # were closed before forking
+    api._pool = None
+    start = time.perf_counter()
+    try:
+        opened = warm_pool()
+        print(f"Worker {worker.pid}: {opened} connections warmed in "
+              f"{time.perf_counter() - start:.2f}s")
+    except (sqlite3.Error, PoolTimeout) as e:
+        print(f"Worker {worker.pid}: pool warm-up failed: {e}")
+
+
+def worker_exit(server, worker):
+    """Close the worker's connections once in-flight requests have finished"""
+    close_pool()
+
+
+class TaxiServer(BaseApplication):
+    """gunicorn application that preloads and warms the Flask app"""
+
+    def __init__(self, options, warm=True):
+        self.options = options
+        self.warm = warm
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # With preload_app this runs once in the master, before the listening
+        # socket is bound and before any worker is forked
+        if self.warm:
+            start = time.perf_counter()
+            cached = warm_page_cache()
+            served = warm_responses()
+            close_pool()
+            print(f"Warmed {cached / 1e6:,.0f} MB of files and "
+                  f"{served}/{len(WARM_URLS)} responses in "
+                  f"{time.perf_counter() - start:.2f}s")
+        return api.app
+
+
+def server_options(args):
+    """gunicorn settings for the parsed command line"""
+    return {
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'preload_app': True,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': 5,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        'accesslog': '-' if args.access_log else None,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--bind', default=os.environ.get('TAXI_BIND', '0.0.0.0:5000'),
+                        help="Address to listen on (default: 0.0.0.0:5000)")
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('TAXI_WORKERS', os.cpu_count() or 1)),
+                        help="Worker processes (default: one per CPU)")
+    parser.add_argument('--threads', type=int,
+                        default=int(os.environ.get('TAXI_THREADS', '4')),
+                        help="Request threads per worker (default: 4)")
+    parser.add_argument('--timeout', type=int, default=60,
+                        help="Seconds before a silent worker is restarted")
+    parser.add_argument('--graceful-timeout', type=int, default=30,
+                        help="Seconds in-flight requests get after SIGTERM")
+    parser.add_argument('--max-requests', type=int, default=0,
+                        help="Recycle a worker after this many requests (0: never)")
+    parser.add_argument('--access-log', action='store_true',
+                        help="Log every request to stdout")
+    parser.add_argument('--no-warm', action='store_true',
+                        help="Skip warming caches before accepting traffic")
+    args = parser.parse_args()
+
+    # Every request thread should be able to hold a connection
+    api.POOL_SIZE = max(api.POOL_SIZE, args.threads)
+
+    print(f"Serving {api.DB_PATH} on {args.bind} with {args.workers} worker(s) "
+          f"x {args.threads} thread(s)")
+    TaxiServer(server_options(args), warm=not args.no_warm).run()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,8 +4,11 @@ NYC Taxi Data Explorer - Automated Setup Script
 Processes raw CSV data and populates SQLite database
 """
 
-from data_processor import TaxiDataProcessor
+from data_processor import (TaxiDataProcessor, ParallelTaxiProcessor,
+                            SQLiteSink, IncrementalSQLiteSink)
 from database import DatabaseManager
+import argparse
+import glob
 import sys
 import os
 from pathlib import Path
@@ -13,59 +16,226 @@ from pathlib import Path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Process raw taxi data and build the SQLite database")
+    parser.add_argument(
+        'inputs', nargs='*',
+        help="Raw monthly trip files or glob patterns "
+             "(default: data/raw/yellow_tripdata_2019-01.csv)")
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Worker processes for cleaning; more than one (or several "
+             "input files) processes files and chunks in parallel")
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="Append only files (or rows) not yet recorded in the ingest "
+             "manifest instead of rebuilding the database (single process)")
+    parser.add_argument(
+        '--stream', action='store_true',
+        help="Process the raw file chunk by chunk with bounded memory")
+    parser.add_argument(
+        '--sink', choices=['parquet', 'csv', 'sqlite'], default='parquet',
+        help="Where cleaned data goes (sqlite skips the intermediate file; "
+             "implies --stream)")
+    parser.add_argument(
+        '--chunk-size', type=int, default=100000,
+        help="Rows per chunk when streaming (default: 100000)")
+    parser.add_argument(
+        '--export-columns', action='store_true',
+        help="Also write numeric trips columns as .npy files to "
+             "data/processed/columns for TAXI_ANALYTICS_BACKEND=columns")
+    parser.add_argument(
+        '--epoch-timestamps', action='store_true',
+        help="Store pickup/dropoff times as INTEGER epoch seconds instead of "
+             "ISO text (ignored by --incremental, which keeps the existing "
+             "storage)")
+    return parser.parse_args()
+
+
+def make_processor(raw_files, zone_lookup, workers):
+    """Parallel processor for several files or workers, else the plain one"""
+    if workers > 1 or len(raw_files) > 1:
+        return ParallelTaxiProcessor([str(f) for f in raw_files],
+                                     str(zone_lookup), workers)
+    return TaxiDataProcessor(str(raw_files[0]), str(zone_lookup))
+
+
+def record_full_load(db, raw_files, processor):
+    """Record every source file of a full build in the ingest manifest
+
+    A later --incremental run then skips these files, or resumes them after
+    the rows read here if they grow.
+    """
+    for raw_data in raw_files:
+        stat = raw_data.stat()
+        counts = processor.file_rows.get(str(raw_data),
+                                         {'rows_read': 0, 'rows_kept': 0})
+        db.record_manifest(raw_data, stat.st_size, stat.st_mtime, 0,
+                           counts['rows_read'], counts['rows_kept'])
+
+
+def ingest_incremental(db, raw_files, zone_lookup, chunk_size):
+    """Append new source files, or new rows of grown files, to the database
+
+    Returns the number of trips appended.
+    """
+    since_trip_id = db.get_max_trip_id()
+    appended = 0
+
+    for raw_data in raw_files:
+        stat = raw_data.stat()
+        entry = db.get_manifest_entry(raw_data.name)
+        start_row = 0
+
+        if entry is not None:
+            unchanged = (entry['file_size'] == stat.st_size and
+                         entry['file_mtime'] == stat.st_mtime)
+            if unchanged:
+                print(f"Skipping {raw_data.name}: already loaded "
+                      f"({entry['rows_loaded']:,} trips)")
+                continue
+            if stat.st_size > entry['file_size']:
+                # File has grown; resume after the rows already ingested
+                start_row = entry['row_end']
+            print(f"{raw_data.name} changed since last load; "
+                  f"re-reading from row {start_row:,}")
+
+        processor = TaxiDataProcessor(str(raw_data), str(zone_lookup))
+        sink = IncrementalSQLiteSink(db)
+        processor.process_all(str(db.db_path), sink=sink,
+                              chunk_size=chunk_size, start_row=start_row)
+
+        db.record_manifest(raw_data, stat.st_size, stat.st_mtime, start_row,
+                           start_row + processor.rows_read, sink.inserted)
+        appended += sink.inserted
+
+    if appended:
+        db.populate_dates(since_trip_id)
+        db.refresh_aggregates(since_trip_id)
+        db.append_samples(since_trip_id)
+    else:
+        print("No new data to ingest")
+    return appended
+
+
 def main():
+    args = parse_args()
+
     print("=" * 80)
     print("NYC TAXI DATA EXPLORER - AUTOMATED SETUP")
     print("=" * 80)
     print()
 
     project_root = Path(__file__).parent.parent
-    raw_data = project_root / "data" / "raw" / "yellow_tripdata_2019-01.csv"
+    if args.inputs:
+        raw_files = []
+        for pattern in args.inputs:
+            matches = sorted(glob.glob(pattern))
+            raw_files.extend(Path(match) for match in matches or [pattern])
+    else:
+        raw_files = [project_root / "data" / "raw" / "yellow_tripdata_2019-01.csv"]
     zone_lookup = project_root / "data" / "raw" / "taxi_zone_lookup.csv"
-    output_csv = project_root / "data" / "processed" / "cleaned_taxi_data.csv"
+    if args.sink == 'csv':
+        output_data = project_root / "data" / "processed" / "cleaned_taxi_data.csv"
+    else:
+        output_data = project_root / "data" / "processed" / "cleaned_taxi_data.parquet"
     db_path = project_root / "data" / "database" / "taxi_data.db"
 
-    if not raw_data.exists():
-        print(f"Error: Raw data file not found: {raw_data}")
-        return
+    for raw_data in raw_files:
+        if not raw_data.exists():
+            print(f"Error: Raw data file not found: {raw_data}")
+            return
 
     if not zone_lookup.exists():
         print(f"Error: Zone lookup file not found: {zone_lookup}")
         return
 
-    print(f"Raw data: {raw_data}")
+    for raw_data in raw_files:
+        print(f"Raw data: {raw_data}")
     print(f"Zone lookup: {zone_lookup}")
     print(f"Database: {db_path}")
     print()
 
-    output_csv.parent.mkdir(parents=True, exist_ok=True)
+    output_data.parent.mkdir(parents=True, exist_ok=True)
     db_path.parent.mkdir(parents=True, exist_ok=True)
 
-    print("=" * 80)
-    print("STEP 1: PROCESSING RAW DATA")
-    print("=" * 80)
-    print()
+    db = DatabaseManager(str(db_path))
+    db.connect()
 
-    processor = TaxiDataProcessor(str(raw_data), str(zone_lookup))
-    processor.process_all(str(output_csv))
+    if args.incremental:
+        print("=" * 80)
+        print("INCREMENTAL INGEST")
+        print("=" * 80)
+        print()
 
-    print()
-    print("=" * 80)
-    print("STEP 2: SETTING UP DATABASE")
-    print("=" * 80)
-    print()
+        if args.workers > 1:
+            print(f"Ignoring --workers {args.workers}: incremental ingest "
+                  f"resumes files row by row in a single process")
+        db.create_schema(reset=False)
+        db.load_zones(str(zone_lookup))
+        changed = ingest_incremental(db, raw_files, zone_lookup,
+                                     args.chunk_size) > 0
+    elif args.sink == 'sqlite':
+        print("=" * 80)
+        print("STEP 1: SETTING UP DATABASE")
+        print("=" * 80)
+        print()
 
-    db = DatabaseManager(str(db_path))
-    db.connect()
+        print("Creating database schema...")
+        db.create_schema(epoch_timestamps=args.epoch_timestamps)
+
+        print("Loading taxi zones...")
+        db.load_zones(str(zone_lookup))
+
+        print()
+        print("=" * 80)
+        print("STEP 2: STREAMING RAW DATA INTO DATABASE")
+        print("=" * 80)
+        print()
+
+        processor = make_processor(raw_files, zone_lookup, args.workers)
+        processor.process_all(str(db_path), sink=SQLiteSink(db),
+                              chunk_size=args.chunk_size)
+    else:
+        print("=" * 80)
+        print("STEP 1: PROCESSING RAW DATA")
+        print("=" * 80)
+        print()
+
+        processor = make_processor(raw_files, zone_lookup, args.workers)
+        processor.process_all(str(output_data), streaming=args.stream,
+                              chunk_size=args.chunk_size)
+
+        print()
+        print("=" * 80)
+        print("STEP 2: SETTING UP DATABASE")
+        print("=" * 80)
+        print()
+
+        print("Creating database schema...")
+        db.create_schema(epoch_timestamps=args.epoch_timestamps)
+
+        print("Loading taxi zones...")
+        db.load_zones(str(zone_lookup))
 
-    print("Creating database schema...")
-    db.create_schema()
+        print("Loading trip data...")
+        db.load_trips(str(output_data))
 
-    print("Loading taxi zones...")
-    db.load_zones(str(zone_lookup))
+    if not args.incremental:
+        changed = True
+        record_full_load(db, raw_files, processor)
+        db.populate_dates()
+        print("Building aggregate tables...")
+        db.build_aggregates()
+        db.build_samples()
 
-    print("Loading trip data (this will take 5-10 minutes for 7.6M rows)...")
-    db.load_trips(str(output_csv))
+    # A new version drops every API cache, so only stamp when trips changed
+    if changed:
+        db.stamp_dataset_version()
+    db.enable_wal()
+    if args.export_columns:
+        db.export_columns(str(project_root / "data" / "processed" / "columns"))
 
     print()
     print("=" * 80)
@@ -93,7 +263,8 @@ def main():
     print("1. Start the backend:")
     print("   cd backend")
     print("   source venv/bin/activate")
-    print("   python3 app.py")
+    print("   python3 serve.py --workers 4 --threads 4")
+    print("   (python3 app.py runs Flask's development server instead)")
     print()
     print("2. Start the frontend (new terminal):")
     print("   cd frontend")
@@ -0,0 +1,572 @@
+"""
+Statistics Queries for NYC Taxi Data Explorer
+Shared by the /api/stats endpoints and the batched /api/dashboard endpoint
+"""
+
+import numpy as np
+
+from database import DISTANCE_BUCKETS, FARE_BUCKETS
+
+# pickup_dow / strftime('%w') numbering: 0 = Sunday
+DAY_NAMES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday',
+             'Friday', 'Saturday']
+
+# (label, first day of month, last day of month)
+WEEKS = [('Week 1', 1, 7), ('Week 2', 8, 14), ('Week 3', 15, 21),
+         ('Week 4', 22, 31)]
+
+
+def dict_from_row(row):
+    """Convert sqlite3.Row to dictionary"""
+    return dict(zip(row.keys(), row))
+
+
+def rollup_avg(column):
+    """SQL expression averaging a measure stored in a rollup table"""
+    return f"CAST(SUM({column}_sum) AS REAL) / NULLIF(SUM({column}_n), 0)"
+
+
+def fetch_overview(cursor, rollup):
+    """Overview statistics for the whole dataset"""
+    if rollup:
+        cursor.execute(f'''
+            SELECT 
+                SUM(trip_count) as total_trips,
+                SUM(total_amount_sum) as total_revenue,
+                {rollup_avg('trip_distance')} as avg_distance,
+                {rollup_avg('total_amount')} as avg_fare,
+                {rollup_avg('trip_duration_minutes')} as avg_duration,
+                SUM(passenger_count_sum) as total_passengers,
+                {rollup_avg('passenger_count')} as avg_passengers,
+                {rollup_avg('tip_percentage')} as avg_tip_percentage
+            FROM agg_overview
+        ''')
+    else:
+        cursor.execute('''
+            SELECT 
+                COUNT(*) as total_trips,
+                SUM(total_amount) as total_revenue,
+                AVG(trip_distance) as avg_distance,
+                AVG(total_amount) as avg_fare,
+                AVG(trip_duration_minutes) as avg_duration,
+                SUM(passenger_count) as total_passengers,
+                AVG(passenger_count) as avg_passengers,
+                AVG(tip_percentage) as avg_tip_percentage
+            FROM trips
+        ''')
+
+    return overview_payload(dict_from_row(cursor.fetchone()))
+
+
+def overview_payload(stats):
+    """Coerce raw overview aggregates to the /api/stats response types"""
+    return {
+        'total_trips': int(stats['total_trips'] or 0),
+        'total_revenue': float(stats['total_revenue'] or 0),
+        'avg_distance': float(stats['avg_distance'] or 0),
+        'avg_fare': float(stats['avg_fare'] or 0),
+        'avg_duration': float(stats['avg_duration'] or 0),
+        'total_passengers': int(stats['total_passengers'] or 0),
+        'avg_passengers': float(stats['avg_passengers'] or 0),
+        'avg_tip_percentage': float(stats['avg_tip_percentage'] or 0)
+    }
+
+
+def fetch_hourly_stats(cursor, rollup):
+    """Statistics by hour of day"""
+    if rollup:
+        cursor.execute(f'''
+            SELECT 
+                pickup_hour,
+                SUM(trip_count) as trip_count,
+                {rollup_avg('total_amount')} as avg_fare,
+                {rollup_avg('trip_distance')} as avg_distance,
+                {rollup_avg('trip_duration_minutes')} as avg_duration,
+                {rollup_avg('tip_percentage')} as avg_tip_percentage
+            FROM agg_hourly
+            GROUP BY pickup_hour
+            ORDER BY pickup_hour
+        ''')
+    else:
+        cursor.execute('''
+            SELECT 
+                pickup_hour,
+                COUNT(*) as trip_count,
+                AVG(total_amount) as avg_fare,
+                AVG(trip_distance) as avg_distance,
+                AVG(trip_duration_minutes) as avg_duration,
+                AVG(tip_percentage) as avg_tip_percentage
+            FROM trips
+            WHERE pickup_hour IS NOT NULL
+            GROUP BY pickup_hour
+            ORDER BY pickup_hour
+        ''')
+
+    hourly_stats = [dict_from_row(row) for row in cursor.fetchall()]
+    return hourly_stats
+
+
+def fetch_borough_stats(cursor, rollup):
+    """Statistics by pickup borough"""
+    if rollup:
+        cursor.execute(f'''
+            SELECT 
+                borough,
+                SUM(trip_count) as trip_count,
+                {rollup_avg('total_amount')} as avg_fare,
+                {rollup_avg('trip_distance')} as avg_distance,
+                {rollup_avg('trip_duration_minutes')} as avg_duration
+            FROM agg_borough
+            WHERE borough IS NOT NULL AND borough != 'Unknown'
+            GROUP BY borough
+            ORDER BY trip_count DESC
+        ''')
+    else:
+        cursor.execute('''
+            SELECT 
+                z.borough,
+                COUNT(*) as trip_count,
+                AVG(t.total_amount) as avg_fare,
+                AVG(t.trip_distance) as avg_distance,
+                AVG(t.trip_duration_minutes) as avg_duration
+            FROM trips t
+            JOIN zones z ON t.pickup_location_id = z.location_id
+            WHERE z.borough IS NOT NULL AND z.borough != 'Unknown'
+            GROUP BY z.borough
+            ORDER BY trip_count DESC
+        ''')
+
+    borough_stats = [dict_from_row(row) for row in cursor.fetchall()]
+    return borough_stats
+
+
+def fetch_payment_stats(cursor, rollup):
+    """Statistics by payment type"""
+    if rollup:
+        cursor.execute(f'''
+            SELECT 
+                pt.payment_name,
+                SUM(a.trip_count) as trip_count,
+                {rollup_avg('a.total_amount')} as avg_fare
+            FROM agg_payment a
+            JOIN payment_types pt ON a.payment_type_id = pt.payment_type_id
+            GROUP BY pt.payment_name
+            ORDER BY trip_count DESC
+        ''')
+    else:
+        cursor.execute('''
+            SELECT 
+                pt.payment_name,
+                COUNT(*) as trip_count,
+                AVG(t.total_amount) as avg_fare
+            FROM trips t
+            JOIN payment_types pt ON t.payment_type_id = pt.payment_type_id
+            GROUP BY pt.payment_name
+            ORDER BY trip_count DESC
+        ''')
+
+    payment_stats = [dict_from_row(row) for row in cursor.fetchall()]
+    return payment_stats
+
+
+def fetch_distance_distribution(cursor, rollup):
+    """Trip counts by distance range"""
+    if rollup:
+        cursor.execute('''
+            SELECT distance_range, SUM(trip_count) as trip_count
+            FROM agg_distance
+            GROUP BY bucket, distance_range
+            ORDER BY bucket
+        ''')
+    else:
+        cursor.execute('''
+            SELECT 
+                CASE 
+                    WHEN trip_distance <= 2 THEN '0-2 mi'
+                    WHEN trip_distance <= 5 THEN '2-5 mi'
+                    WHEN trip_distance <= 10 THEN '5-10 mi'
+                    WHEN trip_distance <= 20 THEN '10-20 mi'
+                    WHEN trip_distance <= 50 THEN '20-50 mi'
+                    ELSE '50+ mi'
+                END as distance_range,
+                COUNT(*) as trip_count
+            FROM trips
+            GROUP BY distance_range
+            ORDER BY 
+                CASE distance_range
+                    WHEN '0-2 mi' THEN 1
+                    WHEN '2-5 mi' THEN 2
+                    WHEN '5-10 mi' THEN 3
+                    WHEN '10-20 mi' THEN 4
+                    WHEN '20-50 mi' THEN 5
+                    WHEN '50+ mi' THEN 6
+                END
+        ''')
+
+    distribution = [dict_from_row(row) for row in cursor.fetchall()]
+    return distribution
+
+
+def fetch_fare_distribution(cursor, rollup):
+    """Trip counts by fare range"""
+    if rollup:
+        cursor.execute('''
+            SELECT fare_range, SUM(trip_count) as trip_count
+            FROM agg_fare
+            GROUP BY bucket, fare_range
+            ORDER BY bucket
+        ''')
+    else:
+        cursor.execute('''
+            SELECT 
+                CASE 
+                    WHEN total_amount <= 10 THEN '$0-10'
+                    WHEN total_amount <= 20 THEN '$10-20'
+                    WHEN total_amount <= 30 THEN '$20-30'
+                    WHEN total_amount <= 50 THEN '$30-50'
+                    WHEN total_amount <= 100 THEN '$50-100'
+                    ELSE '$100+'
+                END as fare_range,
+                COUNT(*) as trip_count
+            FROM trips
+            GROUP BY fare_range
+            ORDER BY 
+                CASE fare_range
+                    WHEN '$0-10' THEN 1
+                    WHEN '$10-20' THEN 2
+                    WHEN '$20-30' THEN 3
+                    WHEN '$30-50' THEN 4
+                    WHEN '$50-100' THEN 5
+                    WHEN '$100+' THEN 6
+                END
+        ''')
+
+    distribution = [dict_from_row(row) for row in cursor.fetchall()]
+    return distribution
+
+
+def fetch_day_of_week_stats(cursor, rollup):
+    """Statistics by day of week, Monday first"""
+    if rollup:
+        cursor.execute(f'''
+            SELECT 
+                CASE day_of_week
+                    WHEN 0 THEN 'Sunday'
+                    WHEN 1 THEN 'Monday'
+                    WHEN 2 THEN 'Tuesday'
+                    WHEN 3 THEN 'Wednesday'
+                    WHEN 4 THEN 'Thursday'
+                    WHEN 5 THEN 'Friday'
+                    WHEN 6 THEN 'Saturday'
+                END as pickup_day_of_week,
+                SUM(trip_count) as trip_count,
+                SUM(total_amount_sum) as total_revenue,
+                {rollup_avg('total_amount')} as avg_fare
+            FROM agg_day_of_week
+            GROUP BY day_of_week
+            ORDER BY (day_of_week + 6) % 7
+        ''')
+    else:
+        cursor.execute('''
+            SELECT 
+                CASE pickup_dow
+                    WHEN 0 THEN 'Sunday'
+                    WHEN 1 THEN 'Monday'
+                    WHEN 2 THEN 'Tuesday'
+                    WHEN 3 THEN 'Wednesday'
+                    WHEN 4 THEN 'Thursday'
+                    WHEN 5 THEN 'Friday'
+                    WHEN 6 THEN 'Saturday'
+                END as pickup_day_of_week,
+                COUNT(*) as trip_count,
+                SUM(total_amount) as total_revenue,
+                AVG(total_amount) as avg_fare
+            FROM trips
+            GROUP BY pickup_dow
+            ORDER BY (pickup_dow + 6) % 7
+        ''')
+
+    day_stats = [dict_from_row(row) for row in cursor.fetchall()]
+    return day_stats
+
+
+def fetch_weekly_trend(cursor, rollup):
+    """Trips and revenue by week of the month"""
+    if rollup:
+        cursor.execute('''
+            SELECT 
+                CASE 
+                    WHEN day_of_month <= 7 THEN 'Week 1'
+                    WHEN day_of_month <= 14 THEN 'Week 2'
+                    WHEN day_of_month <= 21 THEN 'Week 3'
+                    ELSE 'Week 4'
+                END as week,
+                SUM(trip_count) as trip_count,
+                SUM(total_amount_sum) as total_revenue
+            FROM agg_day_of_month
+            GROUP BY week
+            ORDER BY week
+        ''')
+    else:
+        cursor.execute('''
+            SELECT 
+                'Week ' || week_of_month as week,
+                COUNT(*) as trip_count,
+                SUM(total_amount) as total_revenue
+            FROM trips
+            GROUP BY week_of_month
+            ORDER BY week_of_month
+        ''')
+
+    weekly_trend = [dict_from_row(row) for row in cursor.fetchall()]
+    return weekly_trend
+
+
+# Fetcher behind each dashboard section / stats endpoint
+SECTION_FETCHERS = {
+    'statistics': fetch_overview,
+    'hourly': fetch_hourly_stats,
+    'borough': fetch_borough_stats,
+    'payment': fetch_payment_stats,
+    'distance_distribution': fetch_distance_distribution,
+    'fare_distribution': fetch_fare_distribution,
+    'day_of_week': fetch_day_of_week_stats,
+    'weekly_trend': fetch_weekly_trend
+}
+
+
+# Measures accumulated per group by the single-pass dashboard, in the order
+# they are selected after the grouping columns
+DASHBOARD_MEASURES = ['total_amount', 'trip_distance', 'trip_duration_minutes',
+                      'tip_percentage', 'passenger_count']
+
+# Columns the dashboard accumulator reads from every batch
+DASHBOARD_COLUMNS = ['pickup_hour', 'pickup_location_id', 'payment_type_id',
+                     'pickup_dow', 'week_of_month'] + DASHBOARD_MEASURES
+
+DASHBOARD_SECTIONS = ['statistics', 'hourly', 'borough', 'payment',
+                      'distance_distribution', 'fare_distribution',
+                      'day_of_week', 'weekly_trend']
+
+
+def _bucket_index(values, buckets):
+    """Zero-based range bucket for each value (upper bounds are inclusive)"""
+    bounds = np.array([upper for upper, _ in buckets if upper is not None])
+    return np.searchsorted(bounds, values, side='left')
+
+
+def group_totals(keys, size, measures, totals=None):
+    """Add per-group trip counts, sums and non-null counts into totals
+
+    keys are group numbers in [0, size); measures maps a name to a float
+    array aligned with keys, where NaN marks a NULL.
+    """
+    if totals is None:
+        totals = {'trip_count': np.zeros(size)}
+        for name in measures:
+            totals[f"{name}_sum"] = np.zeros(size)
+            totals[f"{name}_n"] = np.zeros(size)
+
+    totals['trip_count'] += np.bincount(keys, minlength=size)[:size]
+    for name, values in measures.items():
+        present = ~np.isnan(values)
+        totals[f"{name}_sum"] += np.bincount(
+            keys[present], weights=values[present], minlength=size)[:size]
+        totals[f"{name}_n"] += np.bincount(keys[present], minlength=size)[:size]
+    return totals
+
+
+def dashboard_lookups(zone_rows, payment_types):
+    """Borough number per location id, for (location_id, borough) zone rows"""
+    boroughs = sorted({borough for _, borough in zone_rows
+                       if borough is not None and borough != 'Unknown'})
+    max_location = max([location_id for location_id, _ in zone_rows] + [0])
+    location_borough = np.full(max_location + 1, -1, dtype=np.int64)
+    for location_id, borough in zone_rows:
+        if borough in boroughs:
+            location_borough[location_id] = boroughs.index(borough)
+    return {
+        'boroughs': boroughs,
+        'location_borough': location_borough,
+        'payment_types': [tuple(row) for row in payment_types]
+    }
+
+
+def load_dashboard_lookups(cursor):
+    """dashboard_lookups for the zones and payment types in the database"""
+    cursor.execute("SELECT location_id, borough FROM zones")
+    zone_rows = cursor.fetchall()
+    cursor.execute(
+        "SELECT payment_type_id, payment_name FROM payment_types "
+        "ORDER BY payment_type_id")
+    return dashboard_lookups(zone_rows, cursor.fetchall())
+
+
+class DashboardAccumulator:
+    """Folds batches of trip columns into the dashboard charts
+
+    Only the requested sections are accumulated, so a single chart costs a
+    single set of bincounts per batch.
+    """
+
+    def __init__(self, lookups, sections=None):
+        self.lookups = lookups
+        self.sections = sections or DASHBOARD_SECTIONS
+        max_payment = max([payment_type_id for payment_type_id, _
+                           in lookups['payment_types']] + [0])
+        sizes = {
+            'statistics': 1,
+            'hourly': 24,
+            'borough': len(lookups['boroughs']),
+            'payment': max_payment + 1,
+            'distance_distribution': len(DISTANCE_BUCKETS),
+            'fare_distribution': len(FARE_BUCKETS),
+            'day_of_week': 7,
+            'weekly_trend': len(WEEKS)
+        }
+        self.sizes = {section: sizes[section] for section in self.sections}
+        self.totals = {section: None for section in self.sections}
+
+    def _keys(self, section, batch, rows):
+        """(group number per row, row mask or None) for one section"""
+        if section == 'statistics':
+            return np.zeros(rows, dtype=np.int64), None
+        if section == 'hourly':
+            hour = np.asarray(batch['pickup_hour'], dtype=float)
+            return np.nan_to_num(hour, nan=0).astype(np.int64), ~np.isnan(hour)
+        if section == 'borough':
+            location = np.asarray(batch['pickup_location_id'], dtype=np.int64)
+            location_borough = self.lookups['location_borough']
+            in_zones = (location >= 0) & (location < len(location_borough))
+            borough = np.full(rows, -1, dtype=np.int64)
+            borough[in_zones] = location_borough[location[in_zones]]
+            return borough, borough >= 0
+        if section == 'payment':
+            payment = np.asarray(batch['payment_type_id'], dtype=np.int64)
+            known = [p for p, _ in self.lookups['payment_types']]
+            return payment, np.isin(payment, known)
+        if section == 'distance_distribution':
+            return _bucket_index(batch['trip_distance'], DISTANCE_BUCKETS), None
+        if section == 'fare_distribution':
+            return _bucket_index(batch['total_amount'], FARE_BUCKETS), None
+        if section == 'day_of_week':
+            return np.asarray(batch['pickup_dow'], dtype=np.int64), None
+        return np.asarray(batch['week_of_month'], dtype=np.int64) - 1, None
+
+    def add(self, batch):
+        """Fold one batch, a dict of equal-length arrays keyed by column"""
+        rows = len(batch['total_amount'])
+        measures = {name: np.asarray(batch[name], dtype=float)
+                    for name in DASHBOARD_MEASURES}
+        for section in self.sections:
+            keys, mask = self._keys(section, batch, rows)
+            values = measures
+            if mask is not None:
+                keys = keys[mask]
+                values = {name: column[mask] for name, column in measures.items()}
+            self.totals[section] = group_totals(
+                keys, self.sizes[section], values, self.totals[section])
+
+    def payload(self):
+        """The accumulated sections in the /api/stats/* payload shapes"""
+        sections = {}
+        for section in self.sections:
+            if self.totals[section] is None:
+                self.totals[section] = group_totals(
+                    np.zeros(0, dtype=np.int64), self.sizes[section],
+                    {name: np.zeros(0) for name in DASHBOARD_MEASURES})
+            sections[section] = getattr(self, f"_{section}")(self.totals[section])
+        return sections
+
+    @staticmethod
+    def _avg(totals, measure, i):
+        n = totals[f"{measure}_n"][i]
+        return float(totals[f"{measure}_sum"][i] / n) if n else None
+
+    def _statistics(self, totals):
+        return overview_payload({
+            'total_trips': int(totals['trip_count'][0]),
+            'total_revenue': float(totals['total_amount_sum'][0]),
+            'avg_distance': self._avg(totals, 'trip_distance', 0),
+            'avg_fare': self._avg(totals, 'total_amount', 0),
+            'avg_duration': self._avg(totals, 'trip_duration_minutes', 0),
+            'total_passengers': totals['passenger_count_sum'][0],
+            'avg_passengers': self._avg(totals, 'passenger_count', 0),
+            'avg_tip_percentage': self._avg(totals, 'tip_percentage', 0)
+        })
+
+    def _hourly(self, totals):
+        return [{
+            'pickup_hour': hour,
+            'trip_count': int(totals['trip_count'][hour]),
+            'avg_fare': self._avg(totals, 'total_amount', hour),
+            'avg_distance': self._avg(totals, 'trip_distance', hour),
+            'avg_duration': self._avg(totals, 'trip_duration_minutes', hour),
+            'avg_tip_percentage': self._avg(totals, 'tip_percentage', hour)
+        } for hour in range(24) if totals['trip_count'][hour]]
+
+    def _borough(self, totals):
+        rows = [{
+            'borough': name,
+            'trip_count': int(totals['trip_count'][i]),
+            'avg_fare': self._avg(totals, 'total_amount', i),
+            'avg_distance': self._avg(totals, 'trip_distance', i),
+            'avg_duration': self._avg(totals, 'trip_duration_minutes', i)
+        } for i, name in enumerate(self.lookups['boroughs']) if totals['trip_count'][i]]
+        return sorted(rows, key=lambda row: -row['trip_count'])
+
+    def _payment(self, totals):
+        rows = [{
+            'payment_name': name,
+            'trip_count': int(totals['trip_count'][payment_type_id]),
+            'avg_fare': self._avg(totals, 'total_amount', payment_type_id)
+        } for payment_type_id, name in self.lookups['payment_types']
+            if totals['trip_count'][payment_type_id]]
+        return sorted(rows, key=lambda row: -row['trip_count'])
+
+    def _distance_distribution(self, totals):
+        return [{'distance_range': label, 'trip_count': int(totals['trip_count'][i])}
+                for i, (_, label) in enumerate(DISTANCE_BUCKETS)
+                if totals['trip_count'][i]]
+
+    def _fare_distribution(self, totals):
+        return [{'fare_range': label, 'trip_count': int(totals['trip_count'][i])}
+                for i, (_, label) in enumerate(FARE_BUCKETS)
+                if totals['trip_count'][i]]
+
+    def _day_of_week(self, totals):
+        return [{
+            'pickup_day_of_week': DAY_NAMES[day],
+            'trip_count': int(totals['trip_count'][day]),
+            'total_revenue': float(totals['total_amount_sum'][day]),
+            'avg_fare': self._avg(totals, 'total_amount', day)
+        } for day in [1, 2, 3, 4, 5, 6, 0] if totals['trip_count'][day]]
+
+    def _weekly_trend(self, totals):
+        return [{
+            'week': label,
+            'trip_count': int(totals['trip_count'][i]),
+            'total_revenue': float(totals['total_amount_sum'][i])
+        } for i, (label, _, _) in enumerate(WEEKS) if totals['trip_count'][i]]
+
+
+def fetch_dashboard_single_pass(cursor, sections=None, batch_size=100000):
+    """Compute the dashboard charts (all, or the named sections) with one scan
+
+    The needed columns are read once and folded batch by batch into NumPy
+    bincount accumulators, so memory stays bounded by the batch size.
+    """
+    accumulator = DashboardAccumulator(load_dashboard_lookups(cursor), sections)
+    cursor.execute(f"SELECT {', '.join(DASHBOARD_COLUMNS)} FROM trips")
+
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        columns = list(zip(*rows))
+        accumulator.add({
+            name: np.array(values, dtype=float)
+            for name, values in zip(DASHBOARD_COLUMNS, columns)
+        })
+
+    return accumulator.payload()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Synthetic Trip Generator for NYC Taxi Data Explorer
+Writes yellow-tripdata-shaped CSV/Parquet files and a zone lookup with realistic distributions
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Named scales accepted wherever a row count is
+SCALES = {'100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+# Rows generated (and written) per step, so 10M rows fit in memory
+CHUNK_ROWS = 1_000_000
+
+# Columns of the 2019 TLC yellow trip files, in order
+TRIP_COLUMNS = [
+    'VendorID', 'tpep_pickup_datetime', 'tpep_dropoff_datetime',
+    'passenger_count', 'trip_distance', 'RatecodeID', 'store_and_fwd_flag',
+    'PULocationID', 'DOLocationID', 'payment_type', 'fare_amount', 'extra',
+    'mta_tax', 'tip_amount', 'tolls_amount', 'improvement_surcharge',
+    'total_amount', 'congestion_surcharge'
+]
+
+# (borough, zones, share of pickups, share of cross-borough dropoffs);
+# zone counts match the TLC lookup, including the two unknown zones at the end
+BOROUGHS = [
+    ('EWR', 1, 0.0005, 0.005),
+    ('Queens', 69, 0.06, 0.10),
+    ('Bronx', 43, 0.008, 0.03),
+    ('Manhattan', 69, 0.89, 0.75),
+    ('Staten Island', 20, 0.001, 0.005),
+    ('Brooklyn', 61, 0.035, 0.10),
+    ('Unknown', 2, 0.0055, 0.01)
+]
+
+# Share of a day's trips starting in each hour
+HOURLY_SHARE = np.array([2.9, 2.1, 1.5, 1.1, 1.0, 1.3, 2.6, 4.0, 4.7, 4.6, 4.5, 4.7,
+                         5.0, 5.0, 5.3, 5.3, 5.2, 5.7, 6.4, 6.2, 5.6, 5.3, 4.9, 3.9])
+
+# Relative demand Monday..Sunday
+WEEKDAY_FACTOR = np.array([0.92, 0.98, 1.03, 1.08, 1.10, 1.02, 0.87])
+
+# Typical speed multiplier by hour: empty streets at night, slow rush hours
+HOUR_SPEED = np.ones(24)
+HOUR_SPEED[0:6] = 1.5
+HOUR_SPEED[7:10] = 0.85
+HOUR_SPEED[16:20] = 0.85
+
+PASSENGERS = ([0, 1, 2, 3, 4, 5, 6], [0.02, 0.70, 0.14, 0.04, 0.02, 0.05, 0.03])
+PAYMENTS = ([1, 2, 3, 4], [0.70, 0.285, 0.01, 0.005])
+TIP_RATES = ([0.0, 0.10, 0.15, 0.20, 0.25, 0.30], [0.10, 0.05, 0.15, 0.40, 0.20, 0.10])
+
+# Invalid records the cleaner is expected to drop or fix, spread evenly over
+# the dirty fraction
+DIRTY_KINDS = ['reversed_times', 'zero_distance', 'negative_fare',
+               'missing_total', 'extreme_distance', 'extreme_fare',
+               'too_many_passengers']
+
+
+def parse_rows(text):
+    """Row count from '100k', '1m', '10m' or a plain integer"""
+    text = str(text).strip().lower()
+    if text in SCALES:
+        return SCALES[text]
+    try:
+        return int(text.replace('_', '').replace(',', ''))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"Expected a row count or one of {', '.join(SCALES)}: {text}")
+
+
+def scale_label(rows):
+    """'100k', '1m', ... for file names"""
+    for label, count in SCALES.items():
+        if rows == count:
+            return label
+    return str(rows)
+
+
+def zone_lookup():
+    """Zone lookup frame shaped like taxi_zone_lookup.csv"""
+    records = []
+    for borough, zones, _, _ in BOROUGHS:
+        for _ in range(zones):
+            location_id = len(records) + 1
+            if borough == 'EWR':
+                service_zone = 'EWR'
+            elif borough == 'Manhattan':
+                service_zone = 'Yellow Zone'
+            elif borough == 'Unknown':
+                service_zone = 'N/A'
+            else:
+                service_zone = 'Boro Zone'
+            records.append((location_id, borough, f"{borough} Zone {location_id}",
+                            service_zone))
+    zones = pd.DataFrame(records, columns=['LocationID', 'Borough', 'Zone',
+                                           'service_zone'])
+    # The last zone has no borough, like location 265 in the TLC file
+    zones.loc[zones.index[-1], ['Borough', 'Zone', 'service_zone']] = np.nan
+    return zones
+
+
+def _zone_weights():
+    """(location ids, borough index per zone, Zipf-like weights within each borough)"""
+    location_ids = []
+    borough_index = []
+    weights = []
+    for index, (_, zones, _, _) in enumerate(BOROUGHS):
+        # A few busy zones and a long tail, as in the real pickups
+        ranks = np.arange(1, zones + 1, dtype=float)
+        share = ranks ** -1.1
+        location_ids.extend(range(len(location_ids) + 1, len(location_ids) + zones + 1))
+        borough_index.extend([index] * zones)
+        weights.extend(share / share.sum())
+    return (np.array(location_ids), np.array(borough_index), np.array(weights))
+
+
+def _pick_zones(rng, boroughs, location_ids, borough_index, weights):
+    """One location id per row, drawn within the row's borough"""
+    zones = np.empty(len(boroughs), dtype=np.int64)
+    for index in range(len(BOROUGHS)):
+        rows = np.flatnonzero(boroughs == index)
+        if len(rows):
+            in_borough = borough_index == index
+            zones[rows] = rng.choice(location_ids[in_borough], size=len(rows),
+                                     p=weights[in_borough])
+    return zones
+
+
+def _pickup_times(rng, rows, month_start):
+    """Pickup timestamps following the hourly and weekday demand profiles"""
+    days = pd.date_range(month_start, month_start + pd.offsets.MonthEnd(0), freq='D')
+    day_weights = WEEKDAY_FACTOR[days.dayofweek]
+    day = rng.choice(len(days), size=rows, p=day_weights / day_weights.sum())
+    hour = rng.choice(24, size=rows, p=HOURLY_SHARE / HOURLY_SHARE.sum())
+    seconds = day * 86400 + hour * 3600 + rng.integers(0, 3600, rows)
+    return np.datetime64(month_start, 's') + seconds.astype('timedelta64[s]'), hour
+
+
+def generate_chunk(rng, rows, month_start, dirty_fraction=0.02):
+    """One frame of synthetic raw trips"""
+    location_ids, borough_index, weights = _zone_weights()
+    pickup_share = np.array([b[2] for b in BOROUGHS])
+    dropoff_share = np.array([b[3] for b in BOROUGHS])
+
+    pickup, hour = _pickup_times(rng, rows, month_start)
+    pickup_dow = (pickup.astype('datetime64[D]').astype(np.int64) + 3) % 7
+
+    pickup_borough = rng.choice(len(BOROUGHS), size=rows, p=pickup_share / pickup_share.sum())
+    # Most trips stay in their borough; Manhattan even more so
+    stay = rng.random(rows) < np.where(pickup_borough == 3, 0.88, 0.75)
+    dropoff_borough = np.where(
+        stay, pickup_borough,
+        rng.choice(len(BOROUGHS), size=rows, p=dropoff_share / dropoff_share.sum()))
+    pu_location = _pick_zones(rng, pickup_borough, location_ids, borough_index, weights)
+    do_location = _pick_zones(rng, dropoff_borough, location_ids, borough_index, weights)
+    cross = pickup_borough != dropoff_borough
+
+    distance = np.where(cross, rng.lognormal(np.log(7.0), 0.5, rows),
+                        rng.lognormal(np.log(1.6), 0.75, rows))
+    distance = np.round(np.minimum(distance, 60.0), 2)
+    speed = rng.lognormal(np.log(11.0), 0.3, rows) * HOUR_SPEED[hour]
+    minutes = distance / speed * 60 + rng.exponential(1.5, rows)
+    dropoff = pickup + np.maximum(np.round(minutes * 60), 1).astype('timedelta64[s]')
+
+    rate_code = rng.choice([1, 2, 5], size=rows, p=[0.97, 0.02, 0.01])
+    metered = np.round((2.5 + 2.0 * distance + 0.35 * minutes) * 2) / 2
+    fare = np.where(rate_code == 2, 52.0,
+                    np.where(rate_code == 5, np.round(rng.uniform(10, 80, rows), 2), metered))
+
+    weekday = pickup_dow < 5
+    extra = np.where(weekday & (hour >= 16) & (hour < 20), 1.0,
+                     np.where((hour >= 20) | (hour < 6), 0.5, 0.0))
+    tolls = np.where(cross & (rng.random(rows) < 0.3), 5.76, 0.0)
+    payment = rng.choice(PAYMENTS[0], size=rows, p=PAYMENTS[1])
+    tip = np.where(payment == 1,
+                   np.round(fare * rng.choice(TIP_RATES[0], size=rows, p=TIP_RATES[1]), 2),
+                   0.0)
+    if month_start >= pd.Timestamp('2019-02-01'):
+        congestion = np.where((pickup_borough == 3) | (dropoff_borough == 3), 2.5, 0.0)
+    else:
+        # Introduced in February 2019; the January file leaves it empty
+        congestion = np.full(rows, np.nan)
+
+    df = pd.DataFrame({
+        'VendorID': rng.choice([1, 2], size=rows, p=[0.4, 0.6]),
+        'tpep_pickup_datetime': pickup,
+        'tpep_dropoff_datetime': dropoff,
+        'passenger_count': rng.choice(PASSENGERS[0], size=rows, p=PASSENGERS[1]),
+        'trip_distance': distance,
+        'RatecodeID': rate_code,
+        'store_and_fwd_flag': np.where(rng.random(rows) < 0.01, 'Y', 'N'),
+        'PULocationID': pu_location,
+        'DOLocationID': do_location,
+        'payment_type': payment,
+        'fare_amount': fare,
+        'extra': extra,
+        'mta_tax': 0.5,
+        'tip_amount': tip,
+        'tolls_amount': tolls,
+        'improvement_surcharge': 0.3,
+        'total_amount': 0.0,
+        'congestion_surcharge': congestion
+    }, columns=TRIP_COLUMNS)
+    df['total_amount'] = np.round(
+        df['fare_amount'] + df['extra'] + df['mta_tax'] + df['tip_amount']
+        + df['tolls_amount'] + df['improvement_surcharge']
+        + df['congestion_surcharge'].fillna(0), 2)
+
+    _add_dirty_rows(rng, df, dirty_fraction)
+    return df
+
+
+def _add_dirty_rows(rng, df, dirty_fraction):
+    """Corrupt a fraction of rows the way real TLC files are corrupted"""
+    dirty = np.flatnonzero(rng.random(len(df)) < dirty_fraction)
+    kinds = rng.integers(0, len(DIRTY_KINDS), len(dirty))
+    for index, kind in enumerate(DIRTY_KINDS):
+        rows = df.index[dirty[kinds == index]]
+        if kind == 'reversed_times':
+            df.loc[rows, 'tpep_dropoff_datetime'] = (
+                df.loc[rows, 'tpep_pickup_datetime'] - pd.Timedelta(minutes=5))
+        elif kind == 'zero_distance':
+            df.loc[rows, 'trip_distance'] = 0.0
+        elif kind == 'negative_fare':
+            df.loc[rows, ['fare_amount', 'total_amount']] *= -1
+        elif kind == 'missing_total':
+            df.loc[rows, 'total_amount'] = np.nan
+        elif kind == 'extreme_distance':
+            df.loc[rows, 'trip_distance'] = 150.0
+        elif kind == 'extreme_fare':
+            df.loc[rows, 'total_amount'] = 750.0
+        else:
+            df.loc[rows, 'passenger_count'] = 9
+
+
+def generate_chunks(rows, seed=42, month='2019-01', dirty_fraction=0.02,
+                    chunk_rows=CHUNK_ROWS):
+    """Yield frames of synthetic trips totalling `rows`, reproducible per seed"""
+    month_start = pd.Timestamp(f"{month}-01")
+    for index, start in enumerate(range(0, rows, chunk_rows)):
+        rng = np.random.default_rng([seed, index])
+        yield generate_chunk(rng, min(chunk_rows, rows - start), month_start,
+                             dirty_fraction)
+
+
+def write_trips(path, rows, seed=42, month='2019-01', dirty_fraction=0.02):
+    """Write synthetic trips to a CSV or Parquet file; returns the path"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    chunks = generate_chunks(rows, seed, month, dirty_fraction)
+
+    if path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        writer = None
+        try:
+            for df in chunks:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        for index, df in enumerate(chunks):
+            df.to_csv(path, mode='w' if index == 0 else 'a', header=index == 0,
+                      index=False)
+    return path
+
+
+def generate_dataset(output_dir, rows, seed=42, file_format='csv',
+                     month='2019-01', dirty_fraction=0.02):
+    """Write a trip file and taxi_zone_lookup.csv; returns both paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    zones_path = os.path.join(output_dir, 'taxi_zone_lookup.csv')
+    zone_lookup().to_csv(zones_path, index=False)
+    trips_path = os.path.join(
+        output_dir, f"yellow_tripdata_synthetic_{scale_label(rows)}_seed{seed}.{file_format}")
+    write_trips(trips_path, rows, seed, month, dirty_fraction)
+    return trips_path, zones_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--rows', type=parse_rows, default='100k',
+                        help="Trips to generate: 100k, 1m, 10m or a number "
+                             "(default: 100k)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    parser.add_argument('--output-dir', default=os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'synthetic'))
+    parser.add_argument('--month', default='2019-01',
+                        help="Month the pickups fall in, YYYY-MM (default: 2019-01)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--dirty-fraction', type=float, default=0.02,
+                        help="Share of rows corrupted for the cleaner to reject "
+                             "(default: 0.02)")
+    args = parser.parse_args()
+
+    trips_path, zones_path = generate_dataset(
+        args.output_dir, args.rows, args.seed, args.format, args.month,
+        args.dirty_fraction)
+    print(f"Wrote {args.rows:,} trips to {trips_path}")
+    print(f"Wrote zone lookup to {zones_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
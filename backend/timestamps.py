@@ -0,0 +1,68 @@
+"""
+Timestamp Storage for NYC Taxi Data Explorer
+Pickup/dropoff times stored as ISO text or as INTEGER epoch seconds
+"""
+
+from datetime import datetime, timezone
+
+import pandas as pd
+
+TIMESTAMP_COLUMNS = ['pickup_datetime', 'dropoff_datetime']
+ISO_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Epoch values are seconds since 1970-01-01 00:00:00 on the trip's own clock
+# (no timezone shift), so SQLite's datetime(x, 'unixepoch') gives back the
+# original text exactly.
+
+
+def uses_epoch_timestamps(conn):
+    """True when trips stores pickup/dropoff times as epoch seconds"""
+    for row in conn.execute("PRAGMA table_info(trips)").fetchall():
+        if row[1] == 'pickup_datetime':
+            return row[2].upper() == 'INTEGER'
+    return False
+
+
+def parse_timestamp(value):
+    """Parse an ISO date or date-time string; raises ValueError if invalid"""
+    return datetime.fromisoformat(value.strip())
+
+
+def to_storage(value, epoch):
+    """Convert an ISO timestamp string to the value stored in trips"""
+    parsed = parse_timestamp(value)
+    if epoch:
+        return int(parsed.replace(tzinfo=timezone.utc).timestamp())
+    return parsed.strftime(ISO_FORMAT)
+
+
+def iso_from_epoch(seconds):
+    """ISO text for epoch seconds"""
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).strftime(ISO_FORMAT)
+
+
+def epoch_series(values):
+    """Epoch seconds for a Series of datetimes or ISO strings"""
+    parsed = pd.to_datetime(values)
+    return (parsed - pd.Timestamp('1970-01-01')) // pd.Timedelta(seconds=1)
+
+
+def trip_to_iso(trip):
+    """Rewrite a trip dict's epoch timestamps as ISO text, in place"""
+    for column in TIMESTAMP_COLUMNS:
+        if isinstance(trip.get(column), int):
+            trip[column] = iso_from_epoch(trip[column])
+    return trip
+
+
+def rows_to_iso(columns, rows):
+    """Trip rows as lists, with epoch timestamps rewritten as ISO text"""
+    positions = [i for i, column in enumerate(columns) if column in TIMESTAMP_COLUMNS]
+    trips = []
+    for row in rows:
+        trip = list(row)
+        for i in positions:
+            if isinstance(trip[i], int):
+                trip[i] = iso_from_epoch(trip[i])
+        trips.append(trip)
+    return trips
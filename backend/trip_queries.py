@@ -0,0 +1,220 @@
+"""
+Trip Queries for NYC Taxi Data Explorer
+Filtered trip listing with keyset pagination and streaming exports
+"""
+
+import base64
+import csv
+import io
+import json
+import math
+
+from timestamps import rows_to_iso, to_storage, trip_to_iso
+
+# Rows fetched from SQLite per round trip while streaming
+STREAM_BATCH_SIZE = 1000
+
+# {pickup_location} is t.pickup_location_id, or +t.pickup_location_id to
+# keep the planner from driving the query from the pickup borough
+TRIP_LIST_SQL = '''
+    SELECT
+        t.*,
+        z1.borough as pickup_borough,
+        z1.zone as pickup_zone,
+        z2.zone as dropoff_zone
+    FROM trips t
+    JOIN zones z1 ON {pickup_location} = z1.location_id
+    JOIN zones z2 ON t.dropoff_location_id = z2.location_id
+    WHERE 1=1
+'''
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(pickup_datetime, trip_id):
+    """Opaque cursor for the position after (pickup_datetime, trip_id)"""
+    raw = json.dumps([pickup_datetime, trip_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (pickup_datetime, trip_id) from a cursor token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        pickup_datetime, trip_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(pickup_datetime, str) or not isinstance(trip_id, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise InvalidCursor(f"Invalid cursor: {token}")
+    return pickup_datetime, trip_id
+
+
+def fare_filter(args):
+    """(SQL condition on column, params) for min_fare/max_fare, or None"""
+    conditions, params = [], []
+    for name, operator in (('min_fare', '>='), ('max_fare', '<=')):
+        value = args.get(name, type=float)
+        if value is not None:
+            conditions.append(f"{{column}} {operator} ?")
+            params.append(value)
+    return (' AND '.join(conditions), params) if conditions else None
+
+
+def choose_driver(cursor, args, limit):
+    """Filter whose index should drive a page query, or None
+
+    Walking idx_pickup_datetime in order reads about limit * trips / matches
+    rows before LIMIT stops it, which is cheap unless the filters match few
+    trips. Driving from the fare or pickup borough index instead reads and
+    sorts that filter's matches. Each candidate is counted with a probe
+    capped at sqrt(limit * trips), where the two costs meet, so probing
+    never reads more rows than the plan it rules out.
+    """
+    probes = []
+    fares = fare_filter(args)
+    if fares is not None:
+        condition, params = fares
+        probes.append(('fare', f"SELECT 1 FROM trips WHERE "
+                       f"{condition.format(column='total_amount')}", params))
+    if args.get('pickup_borough'):
+        probes.append(('borough', '''
+            SELECT 1 FROM zones z
+            JOIN trips t ON t.pickup_location_id = z.location_id
+            WHERE z.borough = ?
+        ''', [args.get('pickup_borough')]))
+    if not probes:
+        return None
+
+    cursor.execute("SELECT MAX(trip_id) FROM trips")
+    cap = math.isqrt(limit * (cursor.fetchone()[0] or 0)) + 1
+    driver, fewest = None, cap
+    for name, sql, params in probes:
+        cursor.execute(f"SELECT COUNT(*) FROM ({sql} LIMIT ?)", params + [cap])
+        matches = cursor.fetchone()[0]
+        if matches < fewest:
+            driver, fewest = name, matches
+    return driver
+
+
+def build_trip_query(args, after=None, limit=None, epoch=False, driver=None):
+    """Build the filtered trip query, ordered by (pickup_datetime, trip_id)
+
+    start/end and the cursor are ISO text; with epoch=True they are compared
+    as epoch seconds. A malformed start or end raises ValueError.
+
+    By default the query walks idx_pickup_datetime in order and stops at
+    LIMIT. driver ('fare' or 'borough', from choose_driver) drives it from
+    that filter's index and sorts the matches instead.
+    """
+    def term(column, drives):
+        # A unary + hides the column's indexes from the planner
+        return f"t.{column}" if drives else f"+t.{column}"
+
+    pickup_datetime = term('pickup_datetime', driver is None)
+    pickup_borough = args.get('pickup_borough')
+    payment_type = args.get('payment_type')
+    start = args.get('start')
+    end = args.get('end')
+
+    query = TRIP_LIST_SQL.format(
+        pickup_location=term('pickup_location_id', driver == 'borough'))
+    params = []
+
+    if start:
+        query += f' AND {pickup_datetime} >= ?'
+        params.append(to_storage(start, epoch))
+
+    if end:
+        query += f' AND {pickup_datetime} < ?'
+        params.append(to_storage(end, epoch))
+
+    fares = fare_filter(args)
+    if fares is not None:
+        condition, fare_params = fares
+        query += ' AND ' + condition.format(
+            column=term('total_amount', driver == 'fare'))
+        params.extend(fare_params)
+
+    if pickup_borough:
+        query += ' AND z1.borough = ?'
+        params.append(pickup_borough)
+
+    if payment_type:
+        if payment_type.lower() == 'cash':
+            query += ' AND +t.payment_type_id = 2'
+        elif payment_type.lower() == 'credit':
+            query += ' AND +t.payment_type_id = 1'
+
+    # Keyset condition: walks idx_pickup_datetime from the cursor onwards
+    if after is not None:
+        query += f' AND ({pickup_datetime}, t.trip_id) > (?, ?)'
+        params.extend([to_storage(after[0], epoch), after[1]])
+
+    query += f' ORDER BY {pickup_datetime}, t.trip_id'
+
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+
+    return query, params
+
+
+def fetch_trip_rows(cursor, args, after, limit, epoch=False):
+    """Return (columns, rows, next_cursor) with each row as a list
+
+    next_cursor is None on the last page.
+    """
+    driver = choose_driver(cursor, args, limit + 1)
+    query, params = build_trip_query(args, after, limit + 1, epoch, driver)
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    columns = [column[0] for column in cursor.description]
+
+    trips = rows_to_iso(columns, rows[:limit])
+    next_cursor = None
+    if len(rows) > limit:
+        last = dict(zip(columns, trips[-1]))
+        next_cursor = encode_cursor(last['pickup_datetime'], last['trip_id'])
+
+    return columns, trips, next_cursor
+
+
+def fetch_trip_page(cursor, args, after, limit, epoch=False):
+    """Return (trips, next_cursor); next_cursor is None on the last page"""
+    columns, rows, next_cursor = fetch_trip_rows(cursor, args, after, limit, epoch)
+    return [dict(zip(columns, row)) for row in rows], next_cursor
+
+
+def _batches(cursor):
+    while True:
+        rows = cursor.fetchmany(STREAM_BATCH_SIZE)
+        if not rows:
+            return
+        yield rows
+
+
+def stream_ndjson(cursor):
+    """Yield one JSON object per line, a batch of rows at a time"""
+    columns = [column[0] for column in cursor.description]
+    for rows in _batches(cursor):
+        yield ''.join(json.dumps(trip_to_iso(dict(zip(columns, row)))) + '\n'
+                      for row in rows)
+
+
+def stream_csv(cursor):
+    """Yield a CSV header and then the rows, a batch at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    columns = [column[0] for column in cursor.description]
+    writer.writerow(columns)
+    for rows in _batches(cursor):
+        writer.writerows([trip_to_iso(dict(zip(columns, row))).values()
+                          for row in rows])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    # Header only, when nothing matched
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -45,6 +45,8 @@ INSERT OR IGNORE INTO payment_types (payment_type_id, payment_name) VALUES
 (6, 'Voided trip');
 
 
+-- setup.py --epoch-timestamps declares pickup_datetime/dropoff_datetime as
+-- INTEGER epoch seconds and adds the trips_iso view showing them as ISO text
 CREATE TABLE IF NOT EXISTS trips (
     trip_id INTEGER PRIMARY KEY AUTOINCREMENT,
     vendor_id INTEGER NOT NULL,
@@ -72,20 +74,46 @@ CREATE TABLE IF NOT EXISTS trips (
     cost_per_mile REAL,
     pickup_hour INTEGER,
     pickup_date DATE,
+    pickup_dow INTEGER,
+    pickup_dom INTEGER,
+    week_of_month INTEGER,
+    date_id INTEGER,
     
     FOREIGN KEY (pickup_location_id) REFERENCES zones(location_id),
     FOREIGN KEY (dropoff_location_id) REFERENCES zones(location_id),
     FOREIGN KEY (rate_code_id) REFERENCES rate_codes(rate_code_id),
-    FOREIGN KEY (payment_type_id) REFERENCES payment_types(payment_type_id)
+    FOREIGN KEY (payment_type_id) REFERENCES payment_types(payment_type_id),
+    FOREIGN KEY (date_id) REFERENCES dates(date_id)
 );
 
 
-CREATE INDEX IF NOT EXISTS idx_trips_pickup_datetime ON trips(pickup_datetime);
-CREATE INDEX IF NOT EXISTS idx_trips_dropoff_datetime ON trips(dropoff_datetime);
-CREATE INDEX IF NOT EXISTS idx_trips_pickup_location ON trips(pickup_location_id);
-CREATE INDEX IF NOT EXISTS idx_trips_dropoff_location ON trips(dropoff_location_id);
-CREATE INDEX IF NOT EXISTS idx_trips_fare_amount ON trips(fare_amount);
-CREATE INDEX IF NOT EXISTS idx_trips_trip_distance ON trips(trip_distance);
-CREATE INDEX IF NOT EXISTS idx_trips_pickup_hour ON trips(pickup_hour);
-CREATE INDEX IF NOT EXISTS idx_trips_pickup_date ON trips(pickup_date);
-CREATE INDEX IF NOT EXISTS idx_zones_borough ON zones(borough);
\ No newline at end of file
+CREATE TABLE IF NOT EXISTS dataset_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version TEXT NOT NULL,
+    updated_at DATETIME NOT NULL
+);
+
+
+CREATE TABLE IF NOT EXISTS ingest_manifest (
+    source_file TEXT PRIMARY KEY,
+    source_path TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    file_mtime REAL NOT NULL,
+    row_start INTEGER NOT NULL,
+    row_end INTEGER NOT NULL,
+    rows_loaded INTEGER NOT NULL,
+    loaded_at DATETIME NOT NULL
+);
+
+
+-- Mirrors INDEXES in backend/database.py (checked by backend/index_advisor.py)
+CREATE INDEX IF NOT EXISTS idx_pickup_datetime ON trips(pickup_datetime);
+CREATE INDEX IF NOT EXISTS idx_route ON trips(pickup_location_id, dropoff_location_id, total_amount, trip_distance);
+CREATE INDEX IF NOT EXISTS idx_hour_measures ON trips(pickup_hour, total_amount, trip_distance, trip_duration_minutes, tip_percentage);
+CREATE INDEX IF NOT EXISTS idx_payment_amount ON trips(payment_type_id, total_amount);
+CREATE INDEX IF NOT EXISTS idx_insight_cube ON trips(pickup_hour, payment_type_id, pickup_location_id, total_amount, tip_percentage);
+CREATE INDEX IF NOT EXISTS idx_total_amount ON trips(total_amount);
+CREATE INDEX IF NOT EXISTS idx_trip_distance ON trips(trip_distance);
+CREATE INDEX IF NOT EXISTS idx_dow_amount ON trips(pickup_dow, total_amount);
+CREATE INDEX IF NOT EXISTS idx_week_amount ON trips(week_of_month, total_amount);
+CREATE INDEX IF NOT EXISTS idx_date_id ON trips(date_id);
@@ -16,6 +16,19 @@ const API = {
         }
     },
 
+    // ========================================================================
+    // DASHBOARD - Every chart dataset in one request
+    // ========================================================================
+    async getDashboard() {
+        try {
+            const response = await fetch(`${API_BASE_URL}/dashboard`);
+            return await response.json();
+        } catch (error) {
+            console.error('Error fetching dashboard:', error);
+            return { success: false, error: error.message };
+        }
+    },
+
     // ========================================================================
     // HOURLY STATS - For hourly charts
     // ========================================================================
@@ -136,7 +149,7 @@ const API = {
     // ========================================================================
     // TRIPS WITH FILTERS - For filtered trips table
     // ========================================================================
-    async getTrips(filters = {}, limit = 100) {
+    async getTrips(filters = {}, limit = 100, cursor = null) {
         try {
             const params = new URLSearchParams();
 
@@ -145,6 +158,7 @@ const API = {
             if (filters.pickup_borough) params.append('pickup_borough', filters.pickup_borough);
             if (filters.payment_type) params.append('payment_type', filters.payment_type);
             params.append('limit', limit);
+            if (cursor) params.append('cursor', cursor);
 
             const response = await fetch(`${API_BASE_URL}/trips?${params}`);
             return await response.json();
@@ -155,7 +169,7 @@ const API = {
     },
 
     // ========================================================================
-    // RANKED TRIPS - Using custom QuickSort algorithm
+    // RANKED TRIPS - Top-K over all trips (index or custom heap)
     // ========================================================================
     async getRankedTrips(rankBy = 'fare', order = 'desc', limit = 100) {
         try {
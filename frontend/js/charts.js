@@ -20,57 +20,26 @@ async function loadAllCharts() {
     console.log('Loading all charts from database...');
 
     try {
-        // Load all chart data in parallel from APIs
-        const [
-            hourlyData,
-            boroughData,
-            paymentData,
-            distanceData,
-            fareData,
-            dayOfWeekData,
-            weeklyTrendData,
-            routesData
-        ] = await Promise.all([
-            API.getHourlyStats(),
-            API.getBoroughStats(),
-            API.getPaymentStats(),
-            API.getDistanceDistribution(),
-            API.getFareDistribution(),
-            API.getDayOfWeekStats(),
-            API.getWeeklyTrend(),
+        // Load every chart dataset in one request, plus the top routes
+        const [dashboard, routesData] = await Promise.all([
+            API.getDashboard(),
             API.getTopRoutes(8)
         ]);
 
         // Create charts from real data
-        if (hourlyData?.success) {
-            createHourlyTripsChart(hourlyData.statistics);
-            createFareByHourChart(hourlyData.statistics);
-            createTipByHourChart(hourlyData.statistics);
-        }
-
-        if (boroughData?.success) {
-            createBoroughChart(boroughData.statistics);
-            createBoroughTable(boroughData.statistics);
-        }
-
-        if (paymentData?.success) {
-            createPaymentChart(paymentData.statistics);
-        }
-
-        if (distanceData?.success) {
-            createDistanceChart(distanceData.distribution);
-        }
-
-        if (fareData?.success) {
-            createFareDistributionChart(fareData.distribution);
-        }
-
-        if (dayOfWeekData?.success) {
-            createWeeklyPatternChart(dayOfWeekData.statistics);
-        }
-
-        if (weeklyTrendData?.success) {
-            createMonthlyTrendChart(weeklyTrendData.trend);
+        if (dashboard?.success) {
+            createHourlyTripsChart(dashboard.hourly);
+            createFareByHourChart(dashboard.hourly);
+            createTipByHourChart(dashboard.hourly);
+
+            createBoroughChart(dashboard.borough);
+            createBoroughTable(dashboard.borough);
+
+            createPaymentChart(dashboard.payment);
+            createDistanceChart(dashboard.distance_distribution);
+            createFareDistributionChart(dashboard.fare_distribution);
+            createWeeklyPatternChart(dashboard.day_of_week);
+            createMonthlyTrendChart(dashboard.weekly_trend);
         }
 
         if (routesData?.success) {
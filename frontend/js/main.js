@@ -173,7 +173,7 @@ function displayAlgorithmInfo(stats, rankBy, order) {
     const orderLabel = order === 'desc' ? 'Highest to Lowest' : 'Lowest to Highest';
 
     infoDiv.innerHTML = `
-        <strong>Custom QuickSort Algorithm Applied</strong> | 
+        <strong>${stats.algorithm}</strong> | 
         Ranked by: ${rankLabel} (${orderLabel}) | 
         Performance: ${formatNumber(stats.comparisons)} comparisons, ${formatNumber(stats.swaps)} swaps | 
         Complexity: ${stats.time_complexity}